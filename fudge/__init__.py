@@ -6,17 +6,29 @@ See :ref:`using-fudge` for common scenarios.
 """
 
 __version__ = '1.1.1'
+import itertools
+import mmap
 import os
 import re
 import sys
 import thread
 import warnings
+from fudge.arrays import ReturnArray
+from fudge.cache import ReturnLazy
+from fudge.copies import ReturnCopy
 from fudge.exc import FakeDeclarationError
+from fudge.history import (
+    Recordable, CallHistory, CallReservoir, ArgColumns, ArgCounter,
+    ArgSummary, CAPTURE_POLICIES)
+from fudge.inspector import ValueTest
+from fudge.journal import JournalRecorder
 from fudge.patcher import *
-from fudge.util import wraps, fmt_val, fmt_dict_vals
+from fudge.streams import ScriptedStream
+from fudge.util import (
+    wraps, fmt_val, fmt_dict_vals, fmt_args, call_key, mmap_lines)
 
 __all__ = ['Fake', 'patch', 'test', 'clear_calls', 'verify',
-           'clear_expectations']
+           'clear_expectations', 'expect_order']
 
 class Registry(object):
     """An internal, thread-safe registry of expected calls.
@@ -28,6 +40,12 @@ class Registry(object):
         self.expected_calls = {}
         self.expected_call_order = {}
         self.call_stacks = []
+        self.recorders = {}
+        self.return_sequences = []
+        self.lazy_fakes = {}
+        # thread -> thread that its declarations are registered for:
+        self.declaring_for = {}
+        self._call_sequence = itertools.count(1)
 
     def __contains__(self, obj):
         return obj in self.get_expected_calls()
@@ -49,6 +67,10 @@ class Registry(object):
         self.clear_actual_calls()
         for stack in self.call_stacks:
             stack.reset()
+        for recorder in self.get_recorders():
+            recorder.reset()
+        for sequence in self.return_sequences:
+            sequence.reset()
         for fake, call_order in self.get_expected_call_order().items():
             call_order.reset_calls()
 
@@ -57,6 +79,9 @@ class Registry(object):
         c[:] = []
         d = self.get_expected_call_order()
         d.clear()
+        self.get_recorders()[:] = []
+        self.return_sequences[:] = []
+        self.get_lazy_fakes()[:] = []
 
     def expect_call(self, expected_call):
         c = self.get_expected_calls()
@@ -66,13 +91,38 @@ class Registry(object):
             this_call_order = call_order[expected_call.fake]
             this_call_order.add_expected_call(expected_call)
 
+    def _thread_ident(self):
+        ident = thread.get_ident()
+        return self.declaring_for.get(ident, ident)
+
+    def declare_for(self, ident):
+        """Registers what this thread declares from now on as declared by
+        the thread *ident*, or by itself when *ident* is None.
+
+        Returns the thread it declared for until now.  You do not need to
+        use this directly, see :class:`fudge.LazyFake`
+        """
+        current = thread.get_ident()
+        previous = self.declaring_for.get(current)
+        if ident is None or ident == current:
+            self.declaring_for.pop(current, None)
+        else:
+            self.declaring_for[current] = ident
+        return previous
+
     def get_expected_calls(self):
-        self.expected_calls.setdefault(thread.get_ident(), [])
-        return self.expected_calls[thread.get_ident()]
+        return self.expected_calls.setdefault(self._thread_ident(), [])
 
     def get_expected_call_order(self):
-        self.expected_call_order.setdefault(thread.get_ident(), {})
-        return self.expected_call_order[thread.get_ident()]
+        return self.expected_call_order.setdefault(self._thread_ident(), {})
+
+    def get_recorders(self):
+        # like expected calls, recorders are verified by the thread that
+        # declared them
+        return self.recorders.setdefault(self._thread_ident(), [])
+
+    def get_lazy_fakes(self):
+        return self.lazy_fakes.setdefault(self._thread_ident(), [])
 
     def remember_expected_call_order(self, expected_call_order):
         ordered_fakes = self.get_expected_call_order()
@@ -81,9 +131,25 @@ class Registry(object):
         # Fake().remember_order().remember_order()
         ordered_fakes.setdefault(fake, expected_call_order)
 
+    def next_call_sequence(self):
+        """Returns the number of a new call made on any fake.
+
+        Numbers increase across all fakes and threads and are never reset.
+        """
+        return self._call_sequence.next()
+
     def register_call_stack(self, call_stack):
         self.call_stacks.append(call_stack)
 
+    def register_recorder(self, recorder):
+        self.get_recorders().append(recorder)
+
+    def register_lazy_fake(self, lazy_fake):
+        self.get_lazy_fakes().append(lazy_fake)
+
+    def register_return_sequence(self, sequence):
+        self.return_sequences.append(sequence)
+
     def verify(self):
         """Ensure all expected calls were called,
         raise AssertionError otherwise.
@@ -91,11 +157,16 @@ class Registry(object):
         You do not need to use this directly.  Use fudge.verify()
         """
         try:
+            for lazy_fake in self.get_lazy_fakes():
+                # so that the calls it expects are verified:
+                lazy_fake.materialize()
             for exp in self.get_expected_calls():
                 exp.assert_called()
                 exp.assert_times_called()
             for fake, call_order in self.get_expected_call_order().items():
                 call_order.assert_order_met(finalize=True)
+            for recorder in self.get_recorders():
+                recorder.verify()
         finally:
             self.clear_calls()
 
@@ -159,6 +230,60 @@ def clear_expectations():
     registry.clear_expectations()
 
 
+def expect_order(*calls):
+    """Expect that calls of several fakes are made in this order.
+
+    Each argument is a declared call, like ``db.write`` after
+    ``db.provides('write')``, or a callable fake.  Each call is checked
+    against its expected position as it is made, so that a long order
+    takes constant time per call.
+
+    .. doctest::
+
+        >>> import fudge
+        >>> lock = fudge.Fake('lock').provides('acquire').provides('release')
+        >>> db = fudge.Fake('db').provides('write')
+        >>> order = fudge.expect_order(lock.acquire, db.write, lock.release)
+        >>> lock.acquire()
+        >>> lock.release() # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        AssertionError: Call #2 was fake:lock.release() (call sequence ...); Expected: #1 fake:lock.acquire(), #2 fake:db.write(), #3 fake:lock.release(), end
+
+    .. doctest::
+        :hide:
+
+        >>> fudge.clear_expectations()
+
+    Calls that are not part of the order can be made at any time.  The
+    order is reset by :func:`fudge.clear_calls` and :func:`fudge.verify`
+    fails unless all calls were made.  Declare the order after all calls of
+    a fake, since :func:`fudge.Fake.next_call` makes a new call.
+    """
+    declared = []
+    for call in calls:
+        if isinstance(call, Fake):
+            if not call._callable:
+                raise FakeDeclarationError(
+                    "%s is not callable; expect_order() takes declared "
+                    "calls like fake.method" % call)
+            call = call._callable
+        elif not isinstance(call, (Call, CallStack)):
+            raise FakeDeclarationError(
+                "expect_order() takes declared calls like fake.method, "
+                "not %r" % (call,))
+        declared.append(call)
+    order = ExpectedCallSequence(declared)
+    stepped = set()
+    for call in declared:
+        # one step per call, however many times it is expected:
+        if id(call) not in stepped:
+            stepped.add(id(call))
+            call.add_recorder(_CallSequenceStep(order, call))
+    registry.register_recorder(order)
+    return order
+
+
 def with_fakes(method):
     """Decorator that calls :func:`fudge.clear_calls` before method() and :func:`fudge.verify` afterwards.
     """
@@ -211,7 +336,7 @@ def test(method):
     return clear_and_verify
 test.__test__ = False # Nose: do not collect
 
-class Call(object):
+class Call(Recordable):
     """A call that can be made on a Fake object.
 
     You do not need to use this directly, use Fake.provides(...), etc
@@ -243,16 +368,33 @@ class Call(object):
         self.unexpected_kwargs = None
         self.index = index
         self.exception_to_raise = None
+        self.keep_traceback = True
         self.return_val = None
         self.was_called = False
         self.expected_times_called = None
         self.actual_times_called = 0
         self.callable = callable
         self.call_order = call_order
+        self.routes = None
+        self.return_source = None # supplies a return value per call
+        self.last_sequence = None # see Registry.next_call_sequence()
+
+    def set_return(self, value=None, routes=None, source=None):
+        """Declares what the call returns, replacing what was declared before.
+
+        You do not need to use this directly, use Fake.returns(...), etc
+        """
+        self.return_val = value
+        self.routes = routes
+        self.return_source = source
 
     def __call__(self, *args, **kwargs):
         self.was_called = True
         self.actual_times_called += 1
+        self.last_sequence = registry.next_call_sequence()
+        if self.recorders:
+            for recorder in self.recorders:
+                recorder.record(args, kwargs)
         if self.call_order:
             self.call_order.add_actual_call(self)
             self.call_order.assert_order_met(finalize=False)
@@ -260,7 +402,7 @@ class Call(object):
         # make sure call count doesn't go over :
         if self.expected_times_called is not None and \
                 self.actual_times_called > self.expected_times_called:
-            raise AssertionError(
+            raise self._assertion_error(
                 '%s was called %s time(s). Expected %s.' % (
                     self, self.actual_times_called,
                     self.expected_times_called))
@@ -270,13 +412,6 @@ class Call(object):
 
         if self.call_replacement:
             replacement_return = self.call_replacement(*args, **kwargs)
-        if self.return_val is not None:
-            # this wins:
-            return_value = self.return_val
-        else:
-            # but it is intuitive to otherwise
-            # return the replacement's return:
-            return_value = replacement_return
 
         # determine whether we should inspect arguments or not:
         with_args = (self.expected_args or self.expected_kwargs)
@@ -286,7 +421,7 @@ class Call(object):
             if self.expected_kwargs is None:
                 self.expected_kwargs = {} # empty **kw
             if self.expected_kwargs != kwargs:
-                raise AssertionError(
+                raise self._assertion_error(
                     "%s was called unexpectedly with args %s" % (
                             self,
                             self._repr_call(args, kwargs,
@@ -295,7 +430,7 @@ class Call(object):
             if self.expected_args is None:
                 self.expected_args = tuple([]) # empty *args
             if self.expected_args != args:
-                raise AssertionError(
+                raise self._assertion_error(
                     "%s was called unexpectedly with args %s" % (
                             self,
                             self._repr_call(args, kwargs,
@@ -308,7 +443,7 @@ class Call(object):
                                 self.expected_matching_kwargs.items():
                 if expected_arg in kwargs:
                     if expected_value != kwargs[expected_arg]:
-                        raise AssertionError(
+                        raise self._assertion_error(
                             "%s was called unexpectedly with args %s" % (
                                     self,
                                     self._repr_call(args,
@@ -320,7 +455,7 @@ class Call(object):
         # i.e. args that are only checked if the call provided them
         if self.expected_matching_args:
             if self.expected_matching_args != args:
-                raise AssertionError(
+                raise self._assertion_error(
                     "%s was called unexpectedly with args %s" % (
                             self,
                             self._repr_call(args, kwargs,
@@ -334,21 +469,21 @@ class Call(object):
             if self.expected_arg_count is None:
                 self.expected_arg_count = 0
             if len(args) != self.expected_arg_count:
-                raise AssertionError(
+                raise self._assertion_error(
                     "%s was called with %s arg(s) but expected %s" % (
                         self, len(args), self.expected_arg_count))
 
             if self.expected_kwarg_count is None:
                 self.expected_kwarg_count = 0
             if len(kwargs.keys()) != self.expected_kwarg_count:
-                raise AssertionError(
+                raise self._assertion_error(
                     "%s was called with %s keyword arg(s) but expected %s" % (
                         self, len(kwargs.keys()), self.expected_kwarg_count))
 
         if self.unexpected_kwargs:
             for un_key, un_val in self.unexpected_kwargs.items():
                 if un_key in kwargs and kwargs[un_key] == un_val:
-                    raise AssertionError(
+                    raise self._assertion_error(
                         "%s was called unexpectedly with kwarg %s=%s" %
                         (self, un_key, un_val)
                     )
@@ -356,16 +491,40 @@ class Call(object):
         if self.unexpected_args:
             for un_arg in self.unexpected_args:
                 if un_arg in args:
-                    raise AssertionError(
+                    raise self._assertion_error(
                         "%s was called unexpectedly with arg %s" %
                         (self, un_arg)
                     )
 
         if self.exception_to_raise is not None:
-            raise self.exception_to_raise
+            raise self._exception()
+
+        # only once the call passed all checks, so that a call that failed
+        # does not use up a value of a sequence, etc:
+        if self.return_val is not None:
+            # this wins:
+            return_value = self.return_val
+        elif self.routes is not None:
+            return_value = self.routes.route(self, args, kwargs)
+        elif self.return_source is not None:
+            return_value = self.return_source.next_value(self)
+        else:
+            # but it is intuitive to otherwise
+            # return the replacement's return:
+            return_value = replacement_return
 
         return return_value
 
+    def _exception(self):
+        exc = self.exception_to_raise
+        if not isinstance(exc, BaseException):
+            # a class or a factory makes a new exception per call:
+            return exc()
+        if not self.keep_traceback and hasattr(exc, '__traceback__'):
+            # raising the same instance again would add to its traceback
+            exc.__traceback__ = None
+        return exc
+
     ## hmmm, arg diffing (for Call().__call__()) needs more thought
 
     # def _arg_diff(self, actual_args, expected_args):
@@ -400,16 +559,7 @@ class Call(object):
     #     return (True, "")
 
     def _repr_call(self, expected_args, expected_kwargs, shorten_long_vals=True):
-        args = []
-        if expected_args:
-            args.extend([fmt_val(a, shorten=shorten_long_vals) for a in expected_args])
-        if expected_kwargs:
-            args.extend(fmt_dict_vals(expected_kwargs, shorten=shorten_long_vals))
-        if args:
-            call = "(%s)" % ", ".join(args)
-        else:
-            call = "()"
-        return call
+        return fmt_args(expected_args, expected_kwargs, shorten=shorten_long_vals)
 
     def __repr__(self):
         cls_name = repr(self.fake)
@@ -432,7 +582,7 @@ class Call(object):
     def assert_times_called(self):
         if self.expected_times_called is not None and \
                 self.actual_times_called != self.expected_times_called:
-            raise AssertionError(
+            raise self._assertion_error(
                 '%s was called %s time(s). Expected %s.' % (
                     self, self.actual_times_called, self.expected_times_called))
 
@@ -450,15 +600,20 @@ class ExpectedCall(Call):
 
     def assert_called(self):
         if not self.was_called:
-            raise AssertionError("%s was not called" % (self))
+            raise self._assertion_error("%s was not called" % (self))
 
 class ExpectedCallOrder(object):
-    """An expectation that calls should be called in a specific order."""
+    """An expectation that calls should be called in a specific order.
+
+    Each actual call is checked against the expected position as it
+    happens so that the order is validated in constant time per call.
+    """
 
     def __init__(self, fake):
         self.fake = fake
         self._call_order = []
-        self._actual_calls = []
+        self._pointer = 0 # position of next expected call (can be reset)
+        self._error = None # first ordering error seen (can be reset)
 
     def __repr__(self):
         return "%r(%r)" % (self.fake, self._call_order)
@@ -477,44 +632,32 @@ class ExpectedCallOrder(object):
         self._call_order.append(call)
 
     def add_actual_call(self, call):
-        self._actual_calls.append(call)
+        position = self._pointer
+        self._pointer += 1
+        if self._error is not None:
+            # only the first error is reported, like a walk of all calls would
+            return
+        if position < len(self._call_order):
+            if self._call_order[position] is not call:
+                self._error = "Call #%s was %r" % (position+1, call)
+        else:
+            # only show the first extra call since this
+            # will be triggered before all calls are finished:
+            self._error = "#%s %s was unexpected" % (position+1, call)
 
     def assert_order_met(self, finalize=False):
         """assert that calls have been made in the right order."""
-        error = None
-        actual_call_len = len(self._actual_calls)
-        expected_call_len = len(self._call_order)
+        error = self._error
+        calls_made = self._pointer
 
-        if actual_call_len == 0:
+        if calls_made == 0:
             error = "Not enough calls were made"
-        else:
-            for i,call in enumerate(self._call_order):
-                if actual_call_len < i+1:
-                    if not finalize:
-                        # we're not done asserting calls so
-                        # forget about not having enough calls
-                        continue
-
-                    calls_made = len(self._actual_calls)
-                    if calls_made == 1:
-                        error = "Only 1 call was made"
-                    else:
-                        error = "Only %s calls were made" % calls_made
-                    break
-
-                ac_call = self._actual_calls[i]
-                if ac_call is not call:
-                    error = "Call #%s was %r" % (i+1, ac_call)
-                    break
-
-            if not error:
-                if actual_call_len > expected_call_len:
-                    # only show the first extra call since this
-                    # will be triggered before all calls are finished:
-                    error = "#%s %s was unexpected" % (
-                        expected_call_len+1,
-                        self._actual_calls[expected_call_len]
-                    )
+        elif error is None and finalize:
+            if calls_made < len(self._call_order):
+                if calls_made == 1:
+                    error = "Only 1 call was made"
+                else:
+                    error = "Only %s calls were made" % calls_made
 
         if error:
             msg = "%s; Expected: %s" % (
@@ -522,9 +665,191 @@ class ExpectedCallOrder(object):
             raise AssertionError(msg)
 
     def reset_calls(self):
-        self._actual_calls[:] = []
+        self._pointer = 0
+        self._error = None
+
+class ExpectedCallSequence(ExpectedCallOrder):
+    """An expectation that calls of several fakes are made in a specific order.
+
+    You do not need to use this directly, use fudge.expect_order(...)
+
+    This is registered like a recorder (see :mod:`fudge.history`) so that
+    it is reset by fudge.clear_calls() and checked by fudge.verify().
+    """
+
+    declared_by = "fudge.expect_order()"
+
+    def __init__(self, calls):
+        super(ExpectedCallSequence, self).__init__(None)
+        for call in calls:
+            self.add_expected_call(call)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__,
+                            self._repr_call_list(self._call_order))
+
+    __str__ = __repr__
+
+    def add_actual_call(self, call):
+        had_error = self._error is not None
+        super(ExpectedCallSequence, self).add_actual_call(call)
+        if not had_error and self._error is not None:
+            self._error = "%s (call sequence %s)" % (
+                                        self._error, call.last_sequence)
+
+    def record(self, args, kwargs):
+        pass
+
+    def reset(self):
+        self.reset_calls()
+
+    def describe(self):
+        return None
+
+    def verify(self):
+        self.assert_order_met(finalize=True)
+
+class _CallSequenceStep(object):
+    # checks the calls of one declared call against an ExpectedCallSequence
+
+    declared_by = ExpectedCallSequence.declared_by
+
+    def __init__(self, order, call):
+        self.order = order
+        self.call = call
 
-class CallStack(object):
+    def record(self, args, kwargs):
+        self.order.add_actual_call(self.call)
+        self.order.assert_order_met(finalize=False)
+
+    def reset(self):
+        pass
+
+    def describe(self):
+        return None
+
+    def verify(self):
+        pass
+
+# marks a route default that was not declared:
+_no_default = object()
+
+class CallRoutes(object):
+    """Return values chosen by the arguments of a call.
+
+    You do not need to use this directly, use Fake.routes(...)
+
+    routes
+        A dict mapping a tuple of positional arguments to a return value
+        or an iterable of (args, kwargs, return value) rows.
+
+    default
+        Value to return when no route matches.  When not given, an
+        unmatched call raises AssertionError.
+
+    Routes are found by hashing the arguments of a call.  Routes declared
+    with :mod:`fudge.inspector` values (or with unhashable values) cannot
+    be hashed so they are compared one by one, in the order they were
+    declared, only when no hashed route matches.
+    """
+
+    def __init__(self, routes, default=_no_default):
+        self.default = default
+        self._hashed_routes = {}
+        self._scanned_routes = []
+        if hasattr(routes, 'items'):
+            routes = [(args, None, val) for args, val in routes.items()]
+        for args, kwargs, val in routes:
+            self.add_route(args, kwargs, val)
+
+    def __len__(self):
+        return len(self._hashed_routes) + len(self._scanned_routes)
+
+    def add_route(self, args, kwargs, val):
+        if not isinstance(args, tuple):
+            # a single positional argument:
+            args = (args,)
+        if not kwargs:
+            kwargs = {}
+        values = list(args) + list(kwargs.values())
+        if not [v for v in values if isinstance(v, ValueTest)]:
+            try:
+                self._hashed_routes[call_key(args, kwargs)] = val
+                return
+            except TypeError:
+                # unhashable, fall through to comparing values:
+                pass
+        self._scanned_routes.append((args, kwargs, val))
+
+    def route(self, call, args, kwargs):
+        try:
+            return self._hashed_routes[call_key(args, kwargs)]
+        except (KeyError, TypeError):
+            pass
+        for route_args, route_kwargs, val in self._scanned_routes:
+            # check keyword args first because of python arg coercion...
+            if route_kwargs == kwargs and route_args == args:
+                return val
+        if self.default is not _no_default:
+            return self.default
+        raise call._assertion_error(
+            "%s was called with args %s but no route was declared for them" % (
+                call, call._repr_call(args, kwargs, shorten_long_vals=False)))
+
+class ReturnSequence(object):
+    """Return values of successive calls, taken from an iterable.
+
+    You do not need to use this directly, use Fake.returns_sequence(...)
+
+    Values are only taken from the iterable as calls are made.  Resetting
+    starts over from the first value, unless the iterable is an iterator
+    (a generator, a file, etc) that cannot be iterated again.
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self._values = iter(values)
+        self.resettable = self._values is not values
+        self.returned = 0
+
+    def reset(self):
+        if self.resettable:
+            self._values = iter(self.values)
+            self.returned = 0
+
+    def next_value(self, call):
+        try:
+            value = self._values.next()
+        except StopIteration:
+            raise call._assertion_error(
+                "%s was called after all %s value(s) of its sequence "
+                "were returned" % (call, self.returned))
+        self.returned += 1
+        return value
+
+class ReturnCycle(object):
+    """Return values of successive calls, repeated over and over.
+
+    You do not need to use this directly, use Fake.returns_cycle(...)
+    """
+
+    def __init__(self, values):
+        self.values = list(values)
+        if not self.values:
+            raise FakeDeclarationError("Cannot cycle through no values")
+        self._index = 0
+
+    def reset(self):
+        self._index = 0
+
+    def next_value(self, call):
+        value = self.values[self._index]
+        self._index += 1
+        if self._index == len(self.values):
+            self._index = 0
+        return value
+
+class CallStack(Recordable):
     """A stack of :class:`Call` objects
 
     Calling this object behaves just like Call except
@@ -563,6 +888,18 @@ class CallStack(object):
     def add_call(self, call):
         self._calls.append(call)
         call.index = len(self._calls)-1
+        # all calls on the stack share recorders:
+        if self.recorders is None:
+            self.recorders = call.recorders
+        else:
+            call.recorders = self.recorders
+
+    def add_recorder(self, recorder):
+        if self.recorders is None:
+            self.recorders = []
+            for call in self._calls:
+                call.recorders = self.recorders
+        self.recorders.append(recorder)
 
     def get_call_object(self):
         """returns the last *added* call object.
@@ -571,6 +908,13 @@ class CallStack(object):
         """
         return self._calls[len(self._calls)-1]
 
+    @property
+    def last_sequence(self):
+        """Sequence number of the last call made, see Registry."""
+        if not self._pointer:
+            return None
+        return self._calls[self._pointer - 1].last_sequence
+
     def reset(self):
         self._pointer = 0
 
@@ -578,7 +922,7 @@ class CallStack(object):
         try:
             current_call = self._calls[self._pointer]
         except IndexError:
-            raise AssertionError(
+            raise self._assertion_error(
                 "This attribute of %s can only be called %s time(s).  "
                 "Call reset() if necessary or fudge.clear_calls()." % (
                                                 self.fake, len(self._calls)))
@@ -632,36 +976,44 @@ class Fake(object):
         else:
             self._callable = None
         self._expected_call_order = None
+        self._capture = 'reference'
+        self._sample_every = 1
+        self._reservoir = None
+        self._iter_source = None
 
     def __getattribute__(self, name):
         """Favors stubbed out attributes, falls back to real attributes
 
         """
-        # this getter circumvents infinite loops:
-        def g(n):
-            return object.__getattribute__(self, n)
+        # this getter circumvents infinite loops.
+        # It is not wrapped in a closure so that no function object is
+        # created per lookup.
+        g = object.__getattribute__
 
-        if name in g('_declared_calls'):
+        declared_calls = g(self, '_declared_calls')
+        if name in declared_calls:
             # if it's a call that has been declared
             # as that of the real object then hand it over:
-            return g('_declared_calls')[name]
-        elif name in g('_attributes'):
+            return declared_calls[name]
+        attributes = g(self, '_attributes')
+        if name in attributes:
             # return attribute declared on real object
-            return g('_attributes')[name]
-        elif name in g('_properties'):
+            return attributes[name]
+        properties = g(self, '_properties')
+        if name in properties:
             # execute function and return result
-            return g('_properties')[name]()
+            return properties[name]()
         else:
             # otherwise, first check if it's a call
             # of Fake itself (i.e. returns(),  with_args(), etc)
             try:
-                self_call = g(name)
+                self_call = g(self, name)
             except AttributeError:
                 pass
             else:
                 return self_call
 
-            if g('_is_a_stub'):
+            if g(self, '_is_a_stub'):
                 # Lazily create a attribute (which might later get called):
                 stub = Fake(name=self._endpoint_name(name)).is_a_stub()
                 self.has_attr(**{name: stub})
@@ -768,6 +1120,20 @@ class Fake(object):
         exp = self._declared_calls[self._last_declared_call_name].get_call_object()
         return exp
 
+    def _get_current_declaration(self):
+        # like _get_current_call() but returns a CallStack as a whole:
+        if not self._last_declared_call_name:
+            if not self._callable:
+                raise FakeDeclarationError(
+                    "Call to a method that expects a predefined call but no such call exists.  "
+                    "Maybe you forgot expects('method') or provides('method') ?")
+            return self._callable
+        return self._declared_calls[self._last_declared_call_name]
+
+    def _add_recorder(self, recorder):
+        self._get_current_declaration().add_recorder(recorder)
+        registry.register_recorder(recorder)
+
     def _endpoint_name(self, endpoint):
         p = [self._name or 'unnamed']
         if endpoint != self._name:
@@ -829,6 +1195,37 @@ class Fake(object):
         self._is_a_stub = True
         return self
 
+    def iterates_over(self, source):
+        """The fake can be iterated over, yielding the items of *source*.
+
+        Items are taken from *source* as the fake is iterated, so a
+        generator or a file can stream any number of them.  I.E.::
+
+            >>> def rows():
+            ...     for i in range(3):
+            ...         yield (i, 'row %s' % i)
+            ...
+            >>> cursor = Fake('cursor').iterates_over(rows())
+            >>> for row in cursor:
+            ...     print(row)
+            ...
+            (0, 'row 0')
+            (1, 'row 1')
+            (2, 'row 2')
+
+        An iterator, like the generator above or a file, can only be
+        iterated over once.  A list (or anything else that can be iterated
+        again) starts over for each iteration, as does a function that
+        returns a new iterator each time, like ``rows`` itself.  A
+        :class:`mmap.mmap` yields its lines without reading the whole file
+        into memory.
+        """
+        self._iter_source = source
+        cls = self.__class__
+        if '__iter__' not in cls.__dict__:
+            self.__class__ = _iterable_class(cls)
+        return self
+
     def calls(self, call):
         """Redefine a call.
 
@@ -843,6 +1240,128 @@ class Fake(object):
         exp.call_replacement = call
         return self
 
+    def captures(self, policy):
+        """Set how :func:`fudge.Fake.records` keeps the arguments of calls.
+
+        This applies to calls of this fake recorded from now on that do
+        not declare their own policy.  The policies are:
+
+        **'reference'**
+            The default.  Cheap but the recorded arguments change if the
+            caller mutates them later on.
+        **'shallow'**, **'deep'**
+            Copies of the arguments.
+        **'digest'**
+            Only a digest of the content and the size of each argument,
+            see :class:`fudge.history.ArgDigest`.
+
+        I.E.::
+
+            >>> queue = Fake('queue').captures('deep').provides('put').records()
+            >>> job = {'status': 'new'}
+            >>> queue.put(job)
+            >>> job['status'] = 'done'
+            >>> queue.put.recorded_calls()
+            [(({'status': 'new'},), {})]
+
+        """
+        if policy not in CAPTURE_POLICIES:
+            raise FakeDeclarationError(
+                "Unknown capture policy %r; use one of %s" % (
+                    policy, ", ".join(sorted(CAPTURE_POLICIES))))
+        self._capture = policy
+        return self
+
+    _declaration_row_keys = frozenset(['name', 'args', 'kwargs', 'returns',
+                                       'raises', 'expected', 'times'])
+
+    def declare_many(self, rows):
+        """Declare many calls at once from an iterable of rows.
+
+        This is useful for table driven fakes with many declarations.  Each
+        row is a dict that may contain:
+
+        **name**
+            Name of the call (required)
+        **args**, **kwargs**
+            Like :func:`fudge.Fake.with_args`; *args* is a tuple, anything
+            else is taken as a single argument
+        **returns**
+            Like :func:`fudge.Fake.returns`
+        **raises**
+            Like :func:`fudge.Fake.raises`
+        **expected**
+            When True, like :func:`fudge.Fake.expects` instead of :func:`fudge.Fake.provides`
+        **times**
+            Like :func:`fudge.Fake.times_called`
+
+        I.E.::
+
+            >>> weather = Fake('weather').declare_many([
+            ...     {'name': 'temp', 'args': ('Chicago',), 'returns': 12},
+            ...     {'name': 'temp', 'args': ('Lisbon',), 'returns': 24},
+            ...     {'name': 'close', 'times': 1}])
+            >>> weather.temp('Chicago')
+            12
+            >>> weather.temp('Lisbon')
+            24
+
+        Declaring the same name more than once is the same as
+        declaring :func:`fudge.Fake.next_call`.  The rows are declared
+        in one pass without the overhead of chained method calls.
+        """
+        declared_calls = self._declared_calls
+        call_order = self._expected_call_order
+        row_keys = self._declaration_row_keys
+        call_name = None
+        for row in rows:
+            if not row_keys.issuperset(row):
+                raise FakeDeclarationError(
+                    "Unknown declaration(s) %s in row %r" % (
+                        ", ".join(sorted(set(row) - row_keys)), row))
+            try:
+                call_name = row['name']
+            except KeyError:
+                raise FakeDeclarationError(
+                    "Declaration row %r must have a 'name'" % row)
+            if row.get('expected'):
+                call = ExpectedCall(self, call_name, call_order=call_order)
+            else:
+                call = Call(self, call_name)
+            args = row.get('args', ())
+            if not isinstance(args, tuple):
+                args = (args,)
+            if args:
+                call.expected_args = args
+            kwargs = row.get('kwargs')
+            if kwargs:
+                call.expected_kwargs = kwargs
+            if 'returns' in row:
+                call.set_return(row['returns'])
+            if 'raises' in row:
+                call.exception_to_raise = row['raises']
+            times = row.get('times')
+
+            existing = declared_calls.get(call_name)
+            if existing is None:
+                call.expected_times_called = times
+                declared_calls[call_name] = call
+                continue
+            if (times is not None or
+                    getattr(existing, 'expected_times_called', None) is not None):
+                raise FakeDeclarationError(
+                    "Cannot use next_call() in combination with times_called()")
+            if not isinstance(existing, CallStack):
+                existing = CallStack(self, initial_calls=[existing],
+                                     expected=isinstance(existing, ExpectedCall),
+                                     call_name=call_name)
+                declared_calls[call_name] = existing
+            existing.add_call(call)
+
+        if call_name is not None:
+            self._last_declared_call_name = call_name
+        return self
+
     def expects(self, call_name):
         """Expect a call.
 
@@ -878,6 +1397,40 @@ class Fake(object):
         self._declare_call(call_name, c)
         return self
 
+    @classmethod
+    def from_dict(cls, mapping, name='dict'):
+        """Returns a new Fake with the keys of *mapping* as attributes.
+
+        Nested dicts become fakes too, as do the dicts in lists, which is
+        handy for API responses or configuration kept as JSON::
+
+            >>> response = Fake.from_dict({'user': {'name': 'Joe'},
+            ...                            'groups': [{'id': 1}, {'id': 2}]},
+            ...                           name='response')
+            >>> response.user.name
+            'Joe'
+            >>> [group.id for group in response.groups]
+            [1, 2]
+
+        The mapping is not copied; each value is looked up when it is
+        first accessed, so a fixture of any size is wrapped at once.  Once
+        accessed, a dict or list is kept as it was first converted.  Lists
+        become a :class:`fudge.DictFakeList`, which converts each item when
+        it is first read.
+
+        The mapping is only consulted when the fake has no other attribute
+        of that name, so attributes and calls declared on the fake as well
+        as the methods of Fake take precedence.  Index the fake to read
+        such keys::
+
+            >>> response = Fake.from_dict({'returns': 5})
+            >>> response['returns']
+            5
+
+        See :class:`fudge.DictFake`
+        """
+        return DictFake(mapping, name=name)
+
     def has_attr(self, **attributes):
         """Sets available attributes.
 
@@ -1039,7 +1592,7 @@ class Fake(object):
         self._declare_call(call_name, c)
         return self
 
-    def raises(self, exc):
+    def raises(self, exc, traceback=True):
         """Set last call to raise an exception class or instance.
 
         For example::
@@ -1051,9 +1604,230 @@ class Fake(object):
             ...
             ValueError: not enough parameters for insert
 
+        An instance is raised again on every call.  A class, or any other
+        callable returning an exception, makes a new one per call
+        instead::
+
+            >>> db = fudge.Fake('db').provides('insert').raises(
+            ...                     lambda: RuntimeError("connection reset"))
+            >>> db.insert()
+            Traceback (most recent call last):
+            ...
+            RuntimeError: connection reset
+
+        On Python 3 an exception keeps the traceback of each time it was
+        raised, and the frames in it.  When a test makes many failing
+        calls, declare a class or factory, or declare *traceback* as False
+        to drop the traceback of earlier calls from an instance.
+
         """
         exp = self._get_current_call()
         exp.exception_to_raise = exc
+        exp.keep_traceback = traceback
+        return self
+
+    def reads_from(self, source, chunks=None):
+        """Provide read(), readinto() and readline() reading from *source*.
+
+        The source is bytes, a bytearray or an mmap and is not copied; a
+        memoryview is copied to bytes.
+        Each read takes the next item of *chunks*, if any: a number is the
+        most bytes returned, to script short reads like those of a socket,
+        and anything else is an exception to raise.  I.E.::
+
+            >>> sock = Fake('sock').reads_from('HTTP/1.0 200 OK\\r\\n',
+            ...                                chunks=[4, 4])
+            >>> sock.read(100)
+            'HTTP'
+            >>> sock.read(100)
+            '/1.0'
+            >>> sock.readline()
+            ' 200 OK\\r\\n'
+
+        readinto() copies straight from the source into the given buffer,
+        like a bytearray.
+        The three calls replace any declared before, so declaring this
+        again starts reading the new source.
+        See :class:`fudge.streams.ScriptedStream`.
+        """
+        stream = ScriptedStream(source, chunks=chunks)
+        for call_name in ('read', 'readinto', 'readline'):
+            call = Call(self, call_name)
+            call.call_replacement = getattr(stream, call_name)
+            self._declare_call(call_name, call)
+        return self
+
+    def recorded_calls(self, call_name=None):
+        """Returns (args, kwargs) of the calls recorded by :func:`fudge.Fake.records`.
+
+        This is the same as ``fake.call_name.recorded_calls()``.  Without
+        a *call_name* it returns the calls made on the fake itself::
+
+            >>> remove = Fake('os.remove').is_callable().records()
+            >>> remove('/tmp/one')
+            >>> remove.recorded_calls()
+            [(('/tmp/one',), {})]
+
+        """
+        if call_name is None:
+            if not self._callable:
+                raise FakeDeclarationError(
+                    "recorded_calls() without a call name requires "
+                    "is_callable() or expects_call()")
+            return self._callable.recorded_calls()
+        if call_name not in self._declared_calls:
+            raise FakeDeclarationError(
+                "recorded_calls(%r) is not possible; "
+                "declare expects(%r) or provides(%r) first" % (
+                                        call_name, call_name, call_name))
+        return self._declared_calls[call_name].recorded_calls()
+
+    def records(self, maxlen=1000, capture=None):
+        """Record the arguments of the last declared call.
+
+        Up to *maxlen* of the most recent calls are kept.  Memory for them is
+        allocated up front so it stays the same no matter how many calls
+        are made.  Recorded calls are reset by :func:`fudge.clear_calls`::
+
+            >>> session = Fake('session').provides('get').records(maxlen=100)
+            >>> session.get('user', id=1)
+            >>> session.get.recorded_calls()
+            [(('user',), {'id': 1})]
+
+        Recorded calls are shown in error messages about the call::
+
+            >>> auth = Fake('auth').provides('login').times_called(1).records()
+            >>> auth.login('joe')
+            >>> auth.login('frank')
+            Traceback (most recent call last):
+            ...
+            AssertionError: fake:auth.login() was called 2 time(s). Expected 1.; Recorded calls (by reference): #1 ('joe'), #2 ('frank'), end
+
+        Arguments are kept by reference unless another *capture* policy
+        is given here or by :func:`fudge.Fake.captures`.  To record only
+        some of the calls, see :func:`fudge.Fake.samples`.
+
+        When using :func:`fudge.Fake.next_call`, all calls to the method share
+        the same recorded calls.
+        """
+        if capture is None:
+            capture = self._capture
+        if self._reservoir is not None:
+            size, seed = self._reservoir
+            recorder = CallReservoir(size=size, seed=seed, capture=capture)
+        else:
+            recorder = CallHistory(maxlen=maxlen, capture=capture,
+                                   every=self._sample_every)
+        self._add_recorder(recorder)
+        return self
+
+    def records_counts(self):
+        """Count the calls of the last declared call by their arguments.
+
+        This keeps one count per distinct combination of arguments, which
+        takes much less memory than :func:`fudge.Fake.records` when the
+        same arguments are used over and over::
+
+            >>> cache = Fake('cache').provides('get').records_counts()
+            >>> for key in ['x', 'y', 'x', 'x']:
+            ...     cache.get(key)
+            >>> cache.get.count_for('x')
+            3
+            >>> cache.get.count_for('z')
+            0
+
+        See :class:`fudge.history.ArgCounter` for details.
+        """
+        self._add_recorder(ArgCounter())
+        return self
+
+    def records_columns(self, **columns):
+        """Record selected arguments of the last declared call in typed columns.
+
+        This is much lighter than :func:`fudge.Fake.records` for calls that
+        are made a great many times.  Each keyword names a column and
+        declares ``(arg, typecode)``, where *arg* is a position or keyword
+        name and *typecode* is an :mod:`array` typecode (or ``str`` to
+        store each distinct value once)::
+
+            >>> statsd = Fake('statsd').provides('gauge').records_columns(
+            ...                             name=(0, str), value=(1, 'd'))
+            >>> statsd.gauge('latency', 0.25)
+            >>> statsd.gauge('latency', 0.75)
+            >>> columns = statsd.gauge.recorded_columns()
+            >>> sum(columns['value']) / len(columns)
+            0.5
+            >>> [columns.names('name')[i] for i in columns['name']]
+            ['latency', 'latency']
+
+        See :class:`fudge.history.ArgColumns` for details.
+        """
+        self._add_recorder(ArgColumns(**columns))
+        return self
+
+    def records_journal(self, journal):
+        """Write the calls of the last declared call to a journal file.
+
+        Nothing is kept in memory so this suits runs of any length.  Calls
+        of all fakes that share the *journal* are numbered in the order
+        they were made, which helps to debug call order failures after
+        the fact::
+
+            >>> import os, tempfile
+            >>> from fudge.journal import CallJournal, JournalReader
+            >>> path = os.path.join(tempfile.mkdtemp(), 'calls.journal')
+            >>> journal = CallJournal(path)
+            >>> db = Fake('db').provides('insert').records_journal(journal)
+            >>> db = db.provides('commit').records_journal(journal)
+            >>> db.insert('users', name='Joe')
+            >>> db.commit()
+            >>> journal.close()
+            >>> with JournalReader(path) as reader:
+            ...     for record in reader.where(fake_name='db'):
+            ...         print("#%s %s%s" % (record.sequence, record.call_name,
+            ...                             record.args_repr))
+            #1 insert('users', name='Joe')
+            #2 commit()
+
+        See :mod:`fudge.journal` for details.
+        """
+        self._add_recorder(JournalRecorder(
+                journal, self._name, self._last_declared_call_name))
+        return self
+
+    def records_summary(self, top=10, precision=10, max_per_args=None):
+        """Summarize the arguments of the last declared call in fixed memory.
+
+        This is for calls made so many times that even
+        :func:`fudge.Fake.records_counts` would use too much memory.  The
+        *top* most frequent arguments are tracked approximately and
+        distinct arguments are estimated.  Declare *max_per_args* to have
+        :func:`fudge.verify` fail when any arguments were used more often
+        than that::
+
+            >>> import fudge
+            >>> cache = fudge.Fake('cache').provides('get').records_summary(
+            ...                                             max_per_args=2)
+            >>> for key in ['x', 'y', 'x', 'x']:
+            ...     cache.get(key)
+            >>> cache.get.recorded_summary().distinct()
+            2
+            >>> fudge.verify()
+            Traceback (most recent call last):
+            ...
+            AssertionError: fake:cache.get() was called at least 3 time(s) with args ('x'). Expected at most 2.; Summary of 4 call(s) with about 2 distinct args: ('x') x3, ('y') x1
+
+        .. doctest::
+            :hide:
+
+            >>> fudge.clear_expectations()
+
+        See :class:`fudge.history.ArgSummary` for details.
+        """
+        declaration = self._get_current_declaration()
+        self._add_recorder(ArgSummary(top=top, precision=precision,
+                                      max_per_args=max_per_args,
+                                      call=declaration))
         return self
 
     def remember_order(self):
@@ -1095,7 +1869,7 @@ class Fake(object):
         registry.remember_expected_call_order(self._expected_call_order)
         return self
 
-    def returns(self, val):
+    def returns(self, val, copy=None):
         """Set the last call to return a value.
 
         Set a static value to return when a method is called.  I.E.::
@@ -1104,9 +1878,85 @@ class Fake(object):
             >>> f.get_number()
             64
 
+        Every call returns the very same value, so code that changes it
+        changes it for the next call too.  Declare *copy* to return a copy
+        on each call instead:
+
+        ``'shallow'``
+            A shallow copy.
+
+        ``'deep'``
+            A deep copy.
+
+        ``'cow'``
+            A copy-on-write proxy of a dict or list.  Nothing is copied
+            until the value is changed and then only the changed
+            containers are, which is much cheaper for big fixtures that
+            are mostly read.  The proxy is not a dict or list, so
+            ``isinstance()`` checks and :mod:`json` fail on it; use
+            ``'deep'`` for such code.  See :mod:`fudge.copies`.
+
+        I.E.::
+
+            >>> f = Fake().provides('get_config').returns({'debug': False},
+            ...                                           copy='cow')
+            >>> config = f.get_config()
+            >>> config['debug'] = True
+            >>> f.get_config()['debug']
+            False
+
+        This, :func:`fudge.Fake.routes` and the ``returns_*()`` methods
+        replace whatever an earlier one declared for the same call.
+
+        """
+        exp = self._get_current_call()
+        if copy is None:
+            exp.set_return(val)
+        else:
+            exp.set_return(source=ReturnCopy(val, copy))
+        return self
+
+    def returns_array(self, path, mmap=True, key=None, writable=False):
+        """Set the last call to return the NumPy array stored at *path*.
+
+        The file is only loaded on the first call and then shared by all
+        fakes (in all threads) that return it, until the file changes.  A
+        .npy file is memory-mapped unless *mmap* is False, so that large
+        arrays cost neither load time nor memory until their data is used.
+        For an .npz file, declare the *key* of the array to return unless
+        it holds only one; its arrays are read into memory.
+
+        The shared array is read-only.  Declare *writable* to get a
+        private, writable copy on each call; when memory-mapped, the copy
+        is a copy-on-write mapping.
+
+        NumPy is needed to declare this but fudge does not depend on it.
+        See :mod:`fudge.arrays` for details.
+        """
+        exp = self._get_current_call()
+        exp.set_return(source=ReturnArray(path, key=key, mmap=mmap,
+                                          writable=writable))
+        return self
+
+    def returns_cycle(self, values):
+        """Set the last call to return each of the values in turn, forever.
+
+        Unlike declaring a :func:`fudge.Fake.next_call` per value, the
+        call can be made any number of times.  I.E.::
+
+            >>> api = Fake('api').provides('status').returns_cycle(
+            ...                                     ['ok', 'ok', 'timeout'])
+            >>> [api.status() for i in range(7)]
+            ['ok', 'ok', 'timeout', 'ok', 'ok', 'timeout', 'ok']
+
+        :func:`fudge.clear_calls` starts over from the first value.  This
+        can be combined with :func:`fudge.Fake.times_called` and
+        :func:`fudge.Fake.records` like any other return value.
+
         """
         exp = self._get_current_call()
-        exp.return_val = val
+        exp.set_return(source=ReturnCycle(values))
+        registry.register_return_sequence(exp.return_source)
         return self
 
     def returns_fake(self, *args, **kwargs):
@@ -1129,15 +1979,195 @@ class Fake(object):
             >>> session.query().one()
             ['object']
 
+        Declare *lazy* as True to only create the new Fake when the call is
+        first made.  Until then a :class:`fudge.LazyFake` keeps what is
+        declared on it and fakes returned from it are lazy too, so a deep
+        graph of fakes only costs the paths a test makes calls on::
+
+            >>> session = Fake('session')
+            >>> query = session.provides('query').returns_fake(lazy=True)
+            >>> rows = query.provides('filter').returns_fake(lazy=True)
+            >>> rows = rows.provides('all').returns(['row'])
+            >>> unused = query.provides('count').returns_fake(lazy=True)
+
+            >>> session.query().filter().all()
+            ['row']
+
+        Calls expected on a lazy fake are verified like any other.  Note
+        that the call returns the created :class:`fudge.Fake`, not the
+        :class:`fudge.LazyFake` declared, and that mistakes in declarations
+        are only reported once the fake is created.
+
         """
+        lazy = kwargs.pop('lazy', False)
+        if lazy:
+            lazy_fake = LazyFake(_child_class(self.__class__), args, kwargs)
+            self._returns_lazy_fake(lazy_fake)
+            return lazy_fake
         exp = self._get_current_call()
         endpoint = kwargs.get('name', exp.call_name)
         name = self._endpoint_name(endpoint)
         kwargs['name'] = '%s()' % name
-        fake = self.__class__(*args, **kwargs)
-        exp.return_val = fake
+        fake = _child_class(self.__class__)(*args, **kwargs)
+        exp.set_return(fake)
         return fake
 
+    def _returns_lazy_fake(self, lazy_fake):
+        exp = self._get_current_call()
+        endpoint = lazy_fake._kwargs.get('name', exp.call_name)
+        lazy_fake._kwargs['name'] = '%s()' % self._endpoint_name(endpoint)
+        exp.set_return(source=lazy_fake)
+        return self
+
+    def returns_lazy(self, loader, cache_key=None, size=None):
+        """Set the last call to return what loader() returns.
+
+        The loader only runs when the call is first made, so a test that
+        never makes the call does not pay for it.  Its value is kept in a
+        process-wide cache under *cache_key* (the loader itself by default)
+        and reused by later calls and by other fakes and tests declaring
+        the same key::
+
+            >>> import json
+            >>> def load_user():
+            ...     print("loading")
+            ...     return json.loads('{"name": "Joe"}')
+            ...
+            >>> api = Fake('api').provides('user').returns_lazy(
+            ...                     load_user, cache_key='fixtures/joe.json')
+            >>> print(api.user()['name'])
+            loading
+            Joe
+            >>> print(api.user()['name'])
+            Joe
+
+        The least recently used values are evicted when the cache has too
+        many or they take too many bytes, see :mod:`fudge.cache`.  The
+        bytes a value takes are estimated once it is loaded, unless you
+        declare its *size*.  A value too big for the cache is still only
+        loaded once, for this call.  Since values are shared, treat them
+        as read-only.
+        """
+        exp = self._get_current_call()
+        exp.set_return(source=ReturnLazy(loader, cache_key=cache_key,
+                                         size=size))
+        return self
+
+    def returns_sequence(self, values):
+        """Set the last call to return the next value of an iterable.
+
+        Values are taken one at a time, so *values* can be a generator
+        that produces any number of them.  I.E.::
+
+            >>> def rows():
+            ...     for i in range(3):
+            ...         yield {'id': i}
+            ...
+            >>> db = Fake('db').provides('fetch').returns_sequence(rows())
+            >>> db.fetch()
+            {'id': 0}
+            >>> db.fetch()
+            {'id': 1}
+            >>> db.fetch()
+            {'id': 2}
+            >>> db.fetch()
+            Traceback (most recent call last):
+            ...
+            AssertionError: fake:db.fetch() was called after all 3 value(s) of its sequence were returned
+
+        :func:`fudge.clear_calls` starts over from the first value when
+        *values* can be iterated again, like a list.  An iterator, like
+        the generator above, is not reset.
+
+        """
+        exp = self._get_current_call()
+        exp.set_return(source=ReturnSequence(values))
+        registry.register_return_sequence(exp.return_source)
+        return self
+
+    def routes(self, routes, default=_no_default):
+        """Set the last call to return a value chosen by its arguments.
+
+        This is useful for when a method is called with many different
+        arguments, like a lookup service.  Each key is a tuple of
+        positional arguments::
+
+            >>> cache = Fake('cache').provides('get').routes({('a',): 1, ('b',): 2})
+            >>> cache.get('a')
+            1
+            >>> cache.get('b')
+            2
+            >>> cache.get('c')
+            Traceback (most recent call last):
+            ...
+            AssertionError: fake:cache.get() was called with args ('c') but no route was declared for them
+
+        Routes are found in constant time by hashing the arguments.  Use a
+        *default* to return a value when no route matches::
+
+            >>> cache = Fake('cache').provides('get').routes({('a',): 1}, default=0)
+            >>> cache.get('z')
+            0
+
+        To route by keyword arguments, pass an iterable of
+        ``(args, kwargs, return value)`` rows instead of a dict.  Rows may
+        contain :mod:`fudge.inspector` values; these are compared in the
+        order they were declared when no other route matches::
+
+            >>> from fudge.inspector import arg
+            >>> db = Fake('db').provides('get').routes([
+            ...     (('users',), {'id': 1}, 'Joe'),
+            ...     (('users',), {'id': arg.any()}, 'Somebody')])
+            >>> db.get('users', id=1)
+            'Joe'
+            >>> db.get('users', id=2)
+            'Somebody'
+
+        """
+        exp = self._get_current_call()
+        exp.set_return(routes=CallRoutes(routes, default=default))
+        return self
+
+    def samples(self, every=None, reservoir=None, seed=None):
+        """Set which calls :func:`fudge.Fake.records` keeps for this fake.
+
+        This applies to calls of this fake recorded from now on, for fakes
+        called too often to record every call.  Record *every* Nth call::
+
+            >>> feed = Fake('feed').samples(every=100).provides('push').records()
+            >>> for i in range(1000):
+            ...     feed.push(i)
+            >>> feed.push.recorded_calls()[:2]
+            [((0,), {}), ((100,), {})]
+
+        Or keep a *reservoir* of that many calls chosen at random, with
+        an optional *seed*, so that each call has the same chance to be
+        kept.  Either way, all calls are still counted by
+        :func:`fudge.Fake.times_called` and the like.  Error messages and
+        exports show the sampled calls.
+
+        See :class:`fudge.history.CallReservoir` for details.
+        """
+        if (every is None) == (reservoir is None):
+            raise FakeDeclarationError(
+                "samples() needs either every=... or reservoir=...")
+        if seed is not None and reservoir is None:
+            raise FakeDeclarationError(
+                "seed=... only applies to samples(reservoir=...)")
+        if every is not None:
+            if every < 1:
+                raise FakeDeclarationError(
+                    "Cannot record every %r call(s)" % every)
+            self._sample_every = every
+            self._reservoir = None
+        else:
+            if reservoir < 1:
+                raise FakeDeclarationError(
+                    "Cannot sample less than 1 call (size=%r)" % reservoir)
+            self._sample_every = 1
+            self._reservoir = (reservoir, seed)
+        return self
+
     def times_called(self, n):
         """Set the number of times an object can be called.
 
@@ -1387,3 +2417,229 @@ class Fake(object):
         exp = self._get_current_call()
         exp.expected_kwarg_count = count
         return self
+
+
+def _iterate_fake(fake):
+    source = fake._iter_source
+    if source is None:
+        raise TypeError(
+            "%s object is not iterable (maybe you want "
+            "%s.iterates_over() ?)" % (fake, fake.__class__.__name__))
+    if isinstance(source, mmap.mmap):
+        return mmap_lines(source)
+    if callable(source) and not hasattr(source, '__iter__'):
+        return iter(source())
+    return iter(source)
+
+_iterable_classes = {}
+
+def _iterable_class(cls):
+    # special methods are looked up on the type, so a fake that iterates
+    # gets a subclass with __iter__ and other fakes are not iterable at all
+    try:
+        return _iterable_classes[cls]
+    except KeyError:
+        iterable = type(cls.__name__, (cls,), {
+            '__iter__': _iterate_fake, '__module__': cls.__module__,
+            '_child_class': cls})
+        _iterable_classes[cls] = iterable
+        return iterable
+
+def _child_class(cls):
+    # the class of the fakes that returns_fake() makes on a fake of cls
+    while '_child_class' in cls.__dict__:
+        cls = cls.__dict__['_child_class']
+    return cls
+
+class DictFake(Fake):
+    """A :class:`fudge.Fake` with the keys of a mapping as attributes.
+
+    You do not need to use this directly, use Fake.from_dict(mapping)
+    """
+    _child_class = Fake # it has no mapping to wrap
+
+    def __init__(self, mapping, name='dict'):
+        Fake.__init__(self, name=name)
+        self._wrapped = {} # key -> converted dict or list
+        # set last, so that the mapping is never used for the attributes
+        # of the fake itself:
+        self._data = mapping
+
+    def __getattr__(self, name):
+        # only called when the normal lookup failed
+        try:
+            data = object.__getattribute__(self, '_data')
+        except AttributeError:
+            raise AttributeError(name)
+        if name not in data:
+            raise AttributeError(
+                "%s object has no call, attribute or key '%s'" % (self, name))
+        return self[name]
+
+    def __getitem__(self, key):
+        wrapped = self._wrapped
+        if key in wrapped:
+            return wrapped[key]
+        value = self._data[key]
+        if isinstance(value, (dict, list)):
+            value = wrapped[key] = self._wrap(key, value)
+        return value
+
+    def _wrap(self, name, value):
+        if isinstance(value, dict):
+            return DictFake(value, name=self._endpoint_name(name))
+        if isinstance(value, list):
+            return DictFakeList(self, name, value)
+        return value
+
+class DictFakeList(object):
+    """A list of a :class:`fudge.DictFake` mapping, whose dicts and lists
+    are converted when they are first read.
+
+    You do not need to use this directly, use Fake.from_dict(mapping)
+    """
+
+    __hash__ = None
+
+    def __init__(self, owner, name, items):
+        self._owner = owner
+        self._name = name
+        self._items = items
+        self._wrapped = {} # index -> converted dict or list
+
+    def __repr__(self):
+        return "<list fake:%s of %s item(s)>" % (
+            self._owner._endpoint_name(self._name), len(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._items)))]
+        value = self._items[index]
+        if index < 0:
+            index += len(self._items)
+        wrapped = self._wrapped
+        if index in wrapped:
+            return wrapped[index]
+        if isinstance(value, (dict, list)):
+            value = wrapped[index] = self._owner._wrap(
+                '%s[%s]' % (self._name, index), value)
+        return value
+
+    def __iter__(self):
+        for index in range(len(self._items)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+class LazyFake(object):
+    """What is declared on a :class:`fudge.Fake` that is not created yet.
+
+    The fake is created when a call returns it, when it is verified or when
+    anything else than a declaration is used on it.  The declarations are
+    then made on the fake, in order, and registered for the thread that
+    declared them, whichever thread creates the fake.
+
+    You do not need to use this directly, use
+    Fake.returns_fake(lazy=True)
+    """
+    # what is kept to be declared later, anything else creates the fake:
+    _declarations = frozenset([
+        'calls', 'captures', 'declare_many', 'expects', 'expects_call',
+        'has_attr', 'has_property', 'is_a_stub', 'is_callable',
+        'iterates_over', 'next_call', 'provides', 'raises', 'reads_from',
+        'records',
+        'records_columns', 'records_counts', 'records_journal',
+        'records_summary', 'remember_order', 'returns', 'returns_array',
+        'returns_cycle', 'returns_lazy', 'returns_sequence', 'routes',
+        'samples', 'times_called', 'with_arg_count', 'with_args',
+        'with_kwarg_count', 'with_matching_args', 'without_args'])
+    # declarations registering expectations that need to be verified:
+    _expectations = frozenset(['expects', 'expects_call', 'remember_order'])
+
+    _lock = thread.allocate_lock()
+
+    def __init__(self, fake_class, args, kwargs, parent=None):
+        self._fake_class = fake_class
+        self._args = args
+        self._kwargs = kwargs
+        self._parent = parent
+        self._thread = thread.get_ident() # the declaring thread
+        self._fake = None
+        self._declared = [] # (method name, args, kwargs)
+        self._registered = False
+        if kwargs.get('expect_call'):
+            self._register()
+
+    def __repr__(self):
+        if self._fake is not None:
+            return repr(self._fake)
+        return "<lazy fake:%s>" % self._kwargs.get('name', 'unnamed')
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._fake is None and name in self._declarations:
+            def declare(*args, **kwargs):
+                if self._fake is not None:
+                    return getattr(self._fake, name)(*args, **kwargs)
+                if name in self._expectations:
+                    self._register()
+                self._declared.append((name, args, kwargs))
+                return self
+            return declare
+        return getattr(self.materialize(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.materialize()(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def _register(self):
+        if not self._registered:
+            self._registered = True
+            registry.register_lazy_fake(self)
+
+    def returns_fake(self, *args, **kwargs):
+        """Declares Fake.returns_fake(lazy=True) on the fake."""
+        if self._fake is not None:
+            return self._fake.returns_fake(*args, **kwargs)
+        kwargs.pop('lazy', None)
+        lazy_fake = LazyFake(self._fake_class, args, kwargs, parent=self)
+        self._declared.append(('_returns_lazy_fake', (lazy_fake,), {}))
+        return lazy_fake
+
+    def materialize(self):
+        """Returns the fake, creating it if needed."""
+        if self._fake is None:
+            self._lock.acquire()
+            try:
+                self._materialize()
+            finally:
+                self._lock.release()
+        return self._fake
+
+    def _materialize(self):
+        if self._fake is not None:
+            return
+        if self._parent is not None:
+            self._parent._materialize()
+        previous = registry.declare_for(self._thread)
+        try:
+            fake = self._fake_class(*self._args, **self._kwargs)
+            for name, args, kwargs in self._declared:
+                getattr(fake, name)(*args, **kwargs)
+        finally:
+            registry.declare_for(previous)
+        self._declared = None
+        self._fake = fake
+
+    def next_value(self, call):
+        return self.materialize()
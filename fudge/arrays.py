@@ -0,0 +1,93 @@
+"""Arrays loaded from NumPy files, see :func:`fudge.Fake.returns_array`.
+
+NumPy is optional; it is only imported when an array is declared.
+"""
+import os
+import thread
+
+__all__ = ['load_array', 'ReturnArray']
+
+# (path, key, mmap) -> ((mtime, size), array), shared by all fakes:
+_arrays = {}
+_arrays_lock = thread.allocate_lock()
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("returns_array() needs NumPy, which is not "
+                          "installed")
+    return numpy
+
+def _load(path, key, mmap):
+    numpy = _numpy()
+    loaded = numpy.load(path, mmap_mode=mmap and 'r' or None)
+    if hasattr(loaded, 'files'):
+        # an .npz file, whose members cannot be memory-mapped:
+        try:
+            if key is None:
+                if len(loaded.files) != 1:
+                    raise ValueError(
+                        "%s has arrays %s; declare which one with key=..."
+                        % (path, ", ".join(loaded.files)))
+                key = loaded.files[0]
+            array = loaded[key]
+        finally:
+            loaded.close()
+    else:
+        if key is not None:
+            raise ValueError("%s holds a single array; key=%r does not "
+                             "apply" % (path, key))
+        array = loaded
+    array.flags.writeable = False
+    return array
+
+def load_array(path, key=None, mmap=True):
+    """Returns the read-only array of a .npy or .npz file.
+
+    Arrays are loaded once per process and shared by all callers until
+    the file changes.  Each array of an .npz file is read into memory;
+    a .npy file is memory-mapped unless *mmap* is False.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime, stat.st_size)
+    cache_key = (path, key, mmap)
+    _arrays_lock.acquire()
+    try:
+        cached = _arrays.get(cache_key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        array = _load(path, key, mmap)
+        _arrays[cache_key] = (stamp, array)
+        return array
+    finally:
+        _arrays_lock.release()
+
+class ReturnArray(object):
+    """Returns an array loaded from a file on the first call.
+
+    You do not need to use this directly, use Fake.returns_array(...)
+
+    The shared array is read-only.  With *writable*, each call returns
+    its own writable copy instead (a copy-on-write mapping when
+    memory-mapped), so that changes do not leak into other calls.
+    """
+
+    def __init__(self, path, key=None, mmap=True, writable=False):
+        _numpy() # fail early when NumPy is missing
+        self.path = path
+        self.key = key
+        self.mmap = mmap
+        self.writable = writable
+
+    def next_value(self, call):
+        if self.writable:
+            if self.mmap and self.key is None:
+                loaded = _numpy().load(self.path, mmap_mode='c')
+                if not hasattr(loaded, 'files'):
+                    return loaded
+                loaded.close()
+            return load_array(self.path, key=self.key, mmap=False).copy()
+        # checks the file on each call, so that a changed file is reloaded
+        return load_array(self.path, key=self.key, mmap=self.mmap)
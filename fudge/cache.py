@@ -0,0 +1,176 @@
+"""A process-wide cache of lazily loaded return values.
+
+See :func:`fudge.Fake.returns_lazy`.  Loaded values are kept in
+:data:`loader_cache` across tests, so that an expensive fixture is only
+built once, and the least recently used ones are evicted when there are
+too many or they take too much memory.  To change its limits::
+
+    from fudge.cache import loader_cache
+    loader_cache.configure(max_entries=100, max_bytes=64 * 1024 * 1024)
+
+"""
+import itertools
+import sys
+import thread
+
+__all__ = ['LoaderCache', 'loader_cache', 'ReturnLazy', 'deep_sizeof']
+
+def deep_sizeof(value):
+    """Estimates the bytes taken by *value* and the objects it contains.
+
+    Containers, strings and the attributes of objects are counted; objects
+    reachable more than once are counted once.
+    """
+    seen = set()
+    size = 0
+    todo = [value]
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            todo.extend(obj.keys())
+            todo.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            todo.extend(obj)
+        elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+            todo.append(obj.__dict__)
+    return size
+
+class LoaderCache(object):
+    """A thread-safe LRU cache of loaded values.
+
+    max_entries=256
+        How many values to keep.
+
+    max_bytes=256MB
+        How many bytes the values may take, as estimated by *sizeof*.  A
+        value bigger than that on its own is returned but not kept.
+
+    sizeof=deep_sizeof
+        Estimates the bytes taken by a value.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024,
+                 sizeof=deep_sizeof):
+        self._lock = thread.allocate_lock()
+        self._entries = {} # key -> [value, size, last use]
+        self._uses = itertools.count()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.configure(max_entries=max_entries, max_bytes=max_bytes,
+                       sizeof=sizeof)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "<%s %s values, %s bytes>" % (
+            self.__class__.__name__, len(self), self.bytes)
+
+    def configure(self, max_entries=None, max_bytes=None, sizeof=None):
+        """Changes the limits, evicting values that are over them."""
+        self._lock.acquire()
+        try:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if sizeof is not None:
+                self.sizeof = sizeof
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Forgets all values and resets the hit and miss counts."""
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+        finally:
+            self._lock.release()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 self.bytes > self.max_bytes):
+            # the cache is small, finding the least recently used is cheap
+            key = min(self._entries, key=lambda k: self._entries[k][2])
+            self.bytes -= self._entries.pop(key)[1]
+
+    def get(self, key, loader, size=None):
+        """Returns the value kept for *key*, calling loader() if there is none.
+
+        The loader runs outside of the lock so that it can use the cache
+        too; threads that miss at the same time may both run it.  Pass the
+        *size* of the value in bytes, if known, to skip estimating it.
+        """
+        return self.load(key, loader, size=size)[0]
+
+    def load(self, key, loader, size=None):
+        """Like :meth:`get` but returns ``(value, kept)``.
+
+        *kept* is False when the value was too big to be kept.
+        """
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[2] = self._uses.next()
+                self.hits += 1
+                return entry[0], True
+            self.misses += 1
+        finally:
+            self._lock.release()
+
+        value = loader()
+        if size is None:
+            size = self.sizeof(value)
+        self._lock.acquire()
+        try:
+            if size > self.max_bytes:
+                return value, False
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = [value, size, self._uses.next()]
+            self.bytes += size
+            self._evict()
+        finally:
+            self._lock.release()
+        return value, True
+
+loader_cache = LoaderCache()
+
+class ReturnLazy(object):
+    """Returns the value of a loader, which only runs when needed.
+
+    A value too big for the cache is kept by this object instead, so
+    that it is not loaded again on each call.
+
+    You do not need to use this directly, use Fake.returns_lazy(...)
+    """
+
+    def __init__(self, loader, cache_key=None, cache=None, size=None):
+        self.loader = loader
+        if cache_key is None:
+            cache_key = loader
+        self.cache_key = cache_key
+        if cache is None:
+            cache = loader_cache
+        self.cache = cache
+        self.size = size
+        self._uncached = None
+
+    def next_value(self, call):
+        if self._uncached is not None:
+            return self._uncached[0]
+        value, kept = self.cache.load(self.cache_key, self.loader,
+                                      size=self.size)
+        if not kept:
+            self._uncached = (value,)
+        return value
@@ -0,0 +1,346 @@
+"""Copies of return values, see :func:`fudge.Fake.returns`.
+
+The ``'cow'`` (copy-on-write) strategy returns a proxy of a dict or a
+list instead of a copy.  Reading goes to the original value and only the
+containers that are changed get copied, shallowly, along with the
+containers above them::
+
+    >>> from fudge.copies import cow
+    >>> fixture = {'users': [{'name': 'Joe'}], 'groups': [{'name': 'admins'}]}
+    >>> users = cow(fixture)['users']
+    >>> users.append({'name': 'Frank'})
+    >>> len(users)
+    2
+    >>> len(fixture['users'])
+    1
+
+Values in the containers that are neither dicts, lists nor immutable are
+deep-copied the first time they are read.
+
+The proxies have the methods of dicts and lists, including the Python 2
+ones like ``iteritems()`` and ``has_key()``, but they are not dicts or
+lists themselves.  Type checks like ``isinstance(value, dict)`` fail on
+them and so does serializing them with :mod:`json` or :mod:`pickle`; use
+``'deep'`` for such code.
+"""
+import copy
+
+from fudge.util import b
+
+__all__ = ['cow', 'CowDict', 'CowList', 'ReturnCopy']
+
+_immutable = (int, long, float, complex, bool, str, unicode, type(b('')),
+              type(None), frozenset)
+
+def _is_immutable(value):
+    if isinstance(value, tuple):
+        for item in value:
+            if not _is_immutable(item):
+                return False
+        return True
+    return isinstance(value, _immutable)
+
+def cow(value, parent=None):
+    """Returns a copy-on-write proxy of a dict or list.
+
+    Immutable values are returned as they are and other values are
+    deep-copied.
+    """
+    if isinstance(value, dict):
+        return CowDict(value, parent)
+    if isinstance(value, list):
+        return CowList(value, parent)
+    if _is_immutable(value):
+        return value
+    return copy.deepcopy(value)
+
+class _Cow(object):
+    # Until it is changed the proxy reads the original container, whose
+    # values are all shared.  Once changed it holds a shallow copy with
+    # shared values, values that are private to the copy (set, or copied
+    # when read) and the proxies of shared containers that were changed.
+
+    __hash__ = None
+
+    def __init__(self, value, parent=None, own=False, shared=None):
+        self._value = value
+        self._parent = parent
+        self._own = own # when True, _value is a copy
+        # the shared values of the copy by id; keeping them here means
+        # that their ids cannot be reused by other values:
+        self._shared = shared
+        self._proxies = {} # id of a shared container -> its proxy
+
+    def __repr__(self):
+        return repr(self._value)
+
+    def __len__(self):
+        return len(self._value)
+
+    def __eq__(self, other):
+        if isinstance(other, _Cow):
+            other = other._value
+        return self._value == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        if isinstance(other, _Cow):
+            other = other._value
+        return self._value < other
+
+    def __gt__(self, other):
+        if isinstance(other, _Cow):
+            other = other._value
+        return self._value > other
+
+    def __le__(self, other):
+        return not self > other
+
+    def __ge__(self, other):
+        return not self < other
+
+    def _shared_values(self):
+        if self._own:
+            return self._shared
+        return dict([(id(v), v) for v in self._values()])
+
+    def _is_shared(self, value):
+        if not self._own:
+            return True
+        return self._shared.get(id(value)) is value
+
+    def _materialize(self):
+        if self._own:
+            return
+        original = self._value
+        self._shared = self._shared_values()
+        self._value = copy.copy(original)
+        self._own = True
+        if self._parent is not None:
+            self._parent._adopt(original, self)
+
+    def _adopt(self, original, proxy):
+        # a contained proxy was changed, so hold the proxy instead:
+        self._materialize()
+        for key in self._keys():
+            if self._value[key] is original:
+                self._value[key] = proxy
+                return
+
+    def _read(self, key):
+        value = self._value[key]
+        if isinstance(value, _Cow) or _is_immutable(value):
+            return value
+        if not self._is_shared(value):
+            return value
+        if isinstance(value, (dict, list)):
+            proxy = self._proxies.get(id(value))
+            if proxy is None:
+                proxy = self._proxies[id(value)] = cow(value, parent=self)
+            return proxy
+        # anything else could change without us knowing:
+        self._materialize()
+        value = self._value[key] = copy.deepcopy(value)
+        return value
+
+    def _set(self, key, value):
+        self._materialize()
+        self._value[key] = value
+
+    def _detach(self, value):
+        # a value removed from this container
+        if isinstance(value, _Cow):
+            value._parent = None
+            return value
+        if self._is_shared(value):
+            return cow(value)
+        return value
+
+    def copy(self):
+        """Returns a copy-on-write proxy of a shallow copy."""
+        return self._duplicate(copy.copy(self._value))
+
+    def _duplicate(self, value):
+        return self.__class__(value, own=True, shared=self._shared_values())
+
+class CowDict(_Cow):
+    """A copy-on-write proxy of a dict."""
+
+    def _keys(self):
+        return list(self._value.keys())
+
+    def _values(self):
+        return self._value.values()
+
+    def __getitem__(self, key):
+        return self._read(key)
+
+    def __setitem__(self, key, value):
+        self._set(key, value)
+
+    def __delitem__(self, key):
+        self._materialize()
+        del self._value[key]
+
+    def __contains__(self, key):
+        return key in self._value
+
+    def __iter__(self):
+        return iter(list(self._value.keys()))
+
+    def get(self, key, default=None):
+        if key in self._value:
+            return self._read(key)
+        return default
+
+    def keys(self):
+        return list(self._value.keys())
+
+    def values(self):
+        return [self._read(key) for key in self.keys()]
+
+    def items(self):
+        return [(key, self._read(key)) for key in self.keys()]
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        for key in self.keys():
+            yield self._read(key)
+
+    def iteritems(self):
+        for key in self.keys():
+            yield key, self._read(key)
+
+    def has_key(self, key):
+        return key in self._value
+
+    def pop(self, key, *default):
+        if key not in self._value:
+            return self._value.pop(key, *default)
+        self._materialize()
+        return self._detach(self._value.pop(key))
+
+    def popitem(self):
+        self._materialize()
+        key, value = self._value.popitem()
+        return key, self._detach(value)
+
+    def setdefault(self, key, default=None):
+        if key not in self._value:
+            self._set(key, default)
+        return self._read(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self._set(key, value)
+
+    def clear(self):
+        self._materialize()
+        self._value.clear()
+
+class CowList(_Cow):
+    """A copy-on-write proxy of a list."""
+
+    def _keys(self):
+        return range(len(self._value))
+
+    def _values(self):
+        return self._value
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._duplicate(self._value[index])
+        return self._read(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self._materialize()
+            self._value[index] = list(value)
+        else:
+            self._set(index, value)
+
+    def __delitem__(self, index):
+        self._materialize()
+        del self._value[index]
+
+    def __contains__(self, value):
+        return value in self._value
+
+    def __iter__(self):
+        for index in range(len(self._value)):
+            yield self._read(index)
+
+    def __add__(self, values):
+        return self._duplicate(self._value + list(values))
+
+    def __radd__(self, values):
+        return self._duplicate(list(values) + self._value)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def append(self, value):
+        self._materialize()
+        self._value.append(value)
+
+    def extend(self, values):
+        values = list(values)
+        self._materialize()
+        self._value.extend(values)
+
+    def insert(self, index, value):
+        self._materialize()
+        self._value.insert(index, value)
+
+    def pop(self, index=-1):
+        self._materialize()
+        return self._detach(self._value.pop(index))
+
+    def remove(self, value):
+        self._materialize()
+        self._value.remove(value)
+
+    def index(self, value, *args):
+        return self._value.index(value, *args)
+
+    def count(self, value):
+        return self._value.count(value)
+
+    def reverse(self):
+        self._materialize()
+        self._value.reverse()
+
+    def sort(self, *args, **kwargs):
+        self._materialize()
+        self._value.sort(*args, **kwargs)
+
+# copy strategy -> function returning a copy of the value
+COPY_STRATEGIES = {
+    'shallow': copy.copy,
+    'deep': copy.deepcopy,
+    'cow': cow,
+}
+
+class ReturnCopy(object):
+    """Returns a copy of a value on each call.
+
+    You do not need to use this directly, use Fake.returns(val, copy=...)
+    """
+
+    def __init__(self, value, strategy):
+        if strategy not in COPY_STRATEGIES:
+            from fudge.exc import FakeDeclarationError
+            raise FakeDeclarationError(
+                "Unknown copy strategy %r; use one of %s" % (
+                    strategy, ", ".join(sorted(COPY_STRATEGIES))))
+        self.value = value
+        self.strategy = strategy
+        self._copy = COPY_STRATEGIES[strategy]
+
+    def next_value(self, call):
+        return self._copy(self.value)
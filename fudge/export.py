@@ -0,0 +1,206 @@
+"""Export recorded calls for analysis outside of a test run.
+
+Calls are written one at a time so the history is never copied in
+memory.  Export the calls kept by :func:`fudge.Fake.records` or the
+records of a :class:`fudge.journal.JournalReader`.
+
+.. doctest::
+
+    >>> import sys
+    >>> import fudge
+    >>> from fudge.export import write_jsonl
+    >>> db = fudge.Fake('db').provides('insert').records()
+    >>> db.insert('users', name='Joe')
+    >>> write_jsonl(db.insert.query_calls(), sys.stdout, fields=['number'])
+    {"number": 1, "args": ["users"], "kwargs": {"name": "Joe"}}
+    1
+
+.. doctest::
+    :hide:
+
+    >>> fudge.clear_expectations()
+
+"""
+try:
+    import json
+except ImportError:
+    # Python 2.5
+    import simplejson as json
+import os
+import re
+import sys
+from array import array
+
+from fudge.journal import JournalRecord
+
+__all__ = ['write_jsonl', 'write_columns']
+
+# name, typecode of binary columns or None for JSON
+CALL_FIELDS = [('number', 'l'), ('time', 'd'), ('thread', 'L')]
+JOURNAL_FIELDS = [('sequence', 'l'), ('time', 'd'), ('thread', 'L'),
+                  ('fake_name', None), ('call_name', None)]
+
+# values of binary columns are written in chunks of:
+CHUNK_SIZE = 4096
+
+def _dumps(value):
+    try:
+        return json.dumps(value, default=repr, sort_keys=True)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        # non-string keys, circular references or undecodable bytes
+        return json.dumps(repr(value))
+
+def _dumps_args(args, kwargs):
+    # each argument falls back to its repr on its own
+    return ('"args": [%s], "kwargs": {%s}' % (
+        ", ".join([_dumps(a) for a in args]),
+        ", ".join(['%s: %s' % (json.dumps(k), _dumps(kwargs[k]))
+                   for k in sorted(kwargs)])))
+
+def _fields_of(record):
+    if isinstance(record, JournalRecord):
+        return JOURNAL_FIELDS
+    return CALL_FIELDS
+
+def write_jsonl(records, out, fields=None):
+    """Writes each record as a line of JSON to the file-like *out*.
+
+    Each line has the fields of the record, ``args`` and ``kwargs``.  Pass
+    a list of *fields* to only write some of them.  Values that JSON
+    cannot represent are written as their repr.  Journal records of
+    arguments that could not be pickled have ``args_repr`` instead of
+    ``args`` and ``kwargs``.  Returns the number of records written.
+    """
+    written = 0
+    for record in records:
+        if fields is None:
+            names = [name for name, typecode in _fields_of(record)]
+        else:
+            names = fields
+        items = ['%s: %s' % (json.dumps(name), _dumps(getattr(record, name)))
+                 for name in names]
+        if record.args is None:
+            # a journal record of arguments that could not be pickled
+            items.append('"args_repr": %s' % _dumps(record.args_repr))
+        else:
+            items.append(_dumps_args(record.args, record.kwargs))
+        out.write('{%s}\n' % ', '.join(items))
+        written += 1
+    return written
+
+class _BinaryColumn(object):
+
+    def __init__(self, path, typecode):
+        self.file = open(path, 'wb')
+        self.typecode = typecode
+        self.chunk = array(typecode)
+
+    @property
+    def type(self):
+        itemsize = self.chunk.itemsize * 8
+        if self.typecode == 'd':
+            return 'float%s' % itemsize
+        if self.typecode == 'L':
+            return 'uint%s' % itemsize
+        return 'int%s' % itemsize
+
+    def write(self, value):
+        self.chunk.append(value)
+        if len(self.chunk) >= CHUNK_SIZE:
+            self.chunk.tofile(self.file)
+            self.chunk = array(self.typecode)
+
+    def close(self):
+        self.chunk.tofile(self.file)
+        self.file.close()
+
+class _JSONColumn(object):
+    type = 'json'
+
+    def __init__(self, path, rows_before):
+        self.file = open(path, 'w')
+        self.rows = 0
+        self.pad(rows_before)
+
+    def pad(self, rows):
+        # an empty line is a value that was not passed
+        self.file.write('\n' * (rows - self.rows))
+        self.rows = rows
+
+    def write(self, value):
+        self.file.write(_dumps(value))
+        self.file.write('\n')
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
+
+def _file_name(name):
+    return re.sub(r'[^\w.]', '_', name)
+
+def write_columns(records, directory):
+    """Writes the records to *directory*, one file per column.
+
+    The fields of the records are binary columns of native byte order
+    (floats, signed or unsigned integers) that, for example,
+    ``numpy.fromfile()`` can read.  Names and arguments are JSON columns of
+    one value per line.  Each argument gets its own column, ``args.0``,
+    ``args.1``, etc and ``kwargs.<name>``.  Where an argument was not passed
+    its line is empty.  Journal records of arguments that could not be
+    pickled fill the ``args_repr`` column instead.
+
+    The column names, files and types are written to ``columns.json``
+    along with the number of rows and the byte order.  Returns the number
+    of records written.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    columns = {}
+    order = []
+    def column(name, typecode=None):
+        if name not in columns:
+            path = os.path.join(directory, _file_name(name))
+            if typecode is None:
+                columns[name] = _JSONColumn(path + '.jsonl', written)
+            else:
+                columns[name] = _BinaryColumn(path + '.bin', typecode)
+            order.append(name)
+        return columns[name]
+
+    written = 0
+    try:
+        for record in records:
+            for name, typecode in _fields_of(record):
+                column(name, typecode).write(getattr(record, name))
+            if record.args is None:
+                values = [('args_repr', record.args_repr)]
+            else:
+                values = [('args.%s' % position, value)
+                          for position, value in enumerate(record.args)]
+                values.extend([('kwargs.%s' % key, value)
+                               for key, value in record.kwargs.items()])
+            for name, value in values:
+                c = column(name)
+                c.pad(written)
+                c.write(value)
+            written += 1
+        for name in order:
+            if columns[name].type == 'json':
+                columns[name].pad(written)
+    finally:
+        for c in columns.values():
+            c.close()
+
+    manifest = {
+        'rows': written,
+        'byteorder': sys.byteorder,
+        'columns': [{'name': name,
+                     'file': os.path.basename(columns[name].file.name),
+                     'type': columns[name].type} for name in order],
+    }
+    f = open(os.path.join(directory, 'columns.json'), 'w')
+    try:
+        f.write(json.dumps(manifest, indent=2, sort_keys=True))
+    finally:
+        f.close()
+    return written
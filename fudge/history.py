@@ -0,0 +1,1105 @@
+"""Recorders that keep track of the calls made on a :class:`fudge.Fake`.
+
+Recording is opt-in, see :func:`fudge.Fake.records`.
+
+.. doctest::
+
+    >>> import fudge
+    >>> db = fudge.Fake('db').provides('insert').records(maxlen=2)
+    >>> db.insert('users', name='Joe')
+    >>> db.insert('users', name='Frank')
+    >>> db.insert('groups', name='admins')
+    >>> db.insert.recorded_calls()
+    [(('users',), {'name': 'Frank'}), (('groups',), {'name': 'admins'})]
+
+"""
+import array
+import copy
+import cPickle as pickle
+import hashlib
+import math
+import random
+import thread
+import time
+
+from fudge.exc import FakeDeclarationError
+from fudge.inspector import ValueTest
+from fudge.util import b, call_key, fmt_args, fmt_val
+
+try:
+    memoryview
+except NameError:
+    memoryview = None # Python < 2.7
+
+__all__ = ['CallHistory', 'CallReservoir', 'CallQuery', 'RecordedCall', 'ArgDigest',
+           'ArgColumns', 'ArgCounter', 'ArgSummary']
+
+# special field of a call:
+THREAD = object()
+# value of an argument that was not passed:
+NOT_PASSED = object()
+# marks normalized unhashable values:
+LIST, DICT, SET, DIGEST = object(), object(), object(), object()
+
+class Recordable(object):
+    """Lets recorders be added to a call.
+
+    You do not need to use this directly, use Fake.records(...), etc
+
+    Calls in the same :class:`fudge.CallStack` share their recorders.
+    """
+
+    recorders = None
+
+    def add_recorder(self, recorder):
+        if self.recorders is None:
+            self.recorders = []
+        self.recorders.append(recorder)
+
+    def get_recorder(self, recorder_class):
+        for recorder in self.recorders or []:
+            if isinstance(recorder, recorder_class):
+                return recorder
+        raise FakeDeclarationError(
+            "No calls of %s are recorded; maybe you want %s ?" % (
+                self, recorder_class.declared_by))
+
+    def _assertion_error(self, msg):
+        # tell what was recorded, if anything:
+        if self.recorders:
+            for recorder in self.recorders:
+                description = recorder.describe()
+                if description:
+                    msg = "%s; %s" % (msg, description)
+        return AssertionError(msg)
+
+    def recorded_calls(self):
+        """Returns (args, kwargs) of the recorded calls, oldest first.
+
+        See :func:`fudge.Fake.records`
+        """
+        return self.get_recorder(CallHistory).entries()
+
+    def query_calls(self):
+        """Returns a :class:`CallQuery` of the recorded calls.
+
+        See :func:`fudge.Fake.records`
+        """
+        return self.get_recorder(CallHistory).query()
+
+    def export_jsonl(self, out, fields=None):
+        """Writes the recorded calls to *out* as JSON Lines.
+
+        See :func:`fudge.export.write_jsonl`
+        """
+        # imported when used, json is not in the Python 2.5 stdlib
+        from fudge.export import write_jsonl
+        return write_jsonl(self.get_recorder(CallHistory).iter_calls(), out,
+                           fields=fields)
+
+    def export_columns(self, directory):
+        """Writes the recorded calls to *directory*, a file per column.
+
+        See :func:`fudge.export.write_columns`
+        """
+        from fudge.export import write_columns
+        return write_columns(self.get_recorder(CallHistory).iter_calls(),
+                             directory)
+
+    def count_for(self, *args, **kwargs):
+        """Returns how many times the call was made with these arguments.
+
+        See :func:`fudge.Fake.records_counts`
+        """
+        return self.get_recorder(ArgCounter).count_for(*args, **kwargs)
+
+    def recorded_summary(self):
+        """Returns the :class:`ArgSummary` of the calls.
+
+        See :func:`fudge.Fake.records_summary`
+        """
+        return self.get_recorder(ArgSummary)
+
+    def recorded_columns(self):
+        """Returns the :class:`ArgColumns` of the recorded calls.
+
+        See :func:`fudge.Fake.records_columns`
+        """
+        return self.get_recorder(ArgColumns)
+
+def _chunk(h, tag, data):
+    # tagged and length-prefixed so that different values never run together
+    h.update(('%s:%s:' % (tag, len(data))).encode('utf-8'))
+    h.update(data)
+
+def _digest_into(h, value, active):
+    if isinstance(value, unicode):
+        _chunk(h, 'text', value.encode('utf-8'))
+    elif isinstance(value, bool) or value is None:
+        _chunk(h, 'const', repr(value).encode('utf-8'))
+    elif isinstance(value, (int, long)):
+        _chunk(h, 'int', str(value).encode('utf-8'))
+    elif isinstance(value, (float, complex)):
+        _chunk(h, type(value).__name__, repr(value).encode('utf-8'))
+    elif isinstance(value, (list, tuple, dict, set, frozenset)):
+        if id(value) in active:
+            # recursive container:
+            _chunk(h, 'recursion', b(''))
+            return
+        active.add(id(value))
+        try:
+            if isinstance(value, (list, tuple)):
+                _chunk(h, type(value).__name__, str(len(value)).encode('utf-8'))
+                for item in value:
+                    _digest_into(h, item, active)
+            else:
+                # unordered, so the digests of the items are sorted:
+                if isinstance(value, dict):
+                    items = [_digest_of((k, v), active)
+                             for k, v in value.items()]
+                else:
+                    items = [_digest_of(item, active) for item in value]
+                items.sort()
+                _chunk(h, type(value).__name__, b('').join(items))
+        finally:
+            active.discard(id(value))
+    else:
+        view = None
+        if memoryview is not None:
+            try:
+                view = memoryview(value)
+            except TypeError:
+                pass
+        if view is not None:
+            # bytes and arrays (i.e. of NumPy) are read without a copy
+            shape = ",".join([str(int(n)) for n in view.shape or ()])
+            _chunk(h, 'buffer', ('%s %s' % (view.format, shape)).encode('utf-8'))
+            try:
+                h.update(view)
+            except (TypeError, ValueError, BufferError):
+                # not contiguous
+                h.update(view.tobytes())
+            return
+        try:
+            data = pickle.dumps(value, 2)
+        except Exception:
+            # anything can go wrong while pickling an arbitrary object
+            raise TypeError("Cannot make a digest of %s object %s" % (
+                type(value).__name__, fmt_val(value)))
+        _chunk(h, 'pickle', data)
+
+def _digest_of(value, active):
+    h = hashlib.sha1()
+    _digest_into(h, value, active)
+    return h.digest()
+
+class ArgDigest(object):
+    """Stands in for an argument recorded by digest.
+
+    Only a stable digest of the value and its size (its length, if it
+    has one) are kept.  Compare it to the digest of a value::
+
+        >>> ArgDigest('some payload') == ArgDigest('some payload')
+        True
+
+    The digest is made from the content of the value: the bytes of
+    strings and of objects supporting the buffer protocol, like NumPy
+    arrays, the items of lists, tuples, dicts and sets, or the pickle of
+    any other object.  A value that cannot be pickled, like a lock, only
+    gets a digest of its type and identity; it is marked unstable, since
+    it only equals the digest of the very same object.
+    """
+
+    def __init__(self, value):
+        h = hashlib.sha1()
+        try:
+            _digest_into(h, value, set())
+            self.stable = True
+        except TypeError:
+            h = hashlib.sha1()
+            _chunk(h, 'identity', ('%s %s' % (
+                type(value).__name__, id(value))).encode('utf-8'))
+            self.stable = False
+        self.digest = h.hexdigest()
+        try:
+            self.size = len(value)
+        except TypeError:
+            self.size = None
+
+    def __repr__(self):
+        if self.stable:
+            return "<digest %s size=%s>" % (self.digest[:12], self.size)
+        return "<unstable digest %s size=%s>" % (self.digest[:12], self.size)
+
+    def __eq__(self, other):
+        return (isinstance(other, ArgDigest) and
+                self.digest == other.digest and self.size == other.size)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.digest)
+
+def _shallow_copy(value):
+    try:
+        return copy.copy(value)
+    except (TypeError, copy.Error):
+        # not copyable, keep the reference
+        return value
+
+def _deep_copy(value, memo):
+    try:
+        return copy.deepcopy(value, memo)
+    except (TypeError, copy.Error):
+        # not copyable, keep the reference
+        return value
+
+def capture_shallow(args, kwargs):
+    return (tuple([_shallow_copy(a) for a in args]),
+            dict([(k, _shallow_copy(v)) for k, v in kwargs.items()]))
+
+def capture_deep(args, kwargs):
+    memo = {} # keeps references between args shared
+    return (tuple([_deep_copy(a, memo) for a in args]),
+            dict([(k, _deep_copy(v, memo)) for k, v in kwargs.items()]))
+
+def capture_digest(args, kwargs):
+    return (tuple([ArgDigest(a) for a in args]),
+            dict([(k, ArgDigest(v)) for k, v in kwargs.items()]))
+
+# capture policy -> (function, description)
+CAPTURE_POLICIES = {
+    'reference': (None, "by reference"),
+    'shallow': (capture_shallow, "shallow copies"),
+    'deep': (capture_deep, "deep copies"),
+    'digest': (capture_digest, "digests"),
+}
+
+class CallHistory(object):
+    """A fixed size history of the most recent calls made on a fake.
+
+    maxlen=1000
+        How many calls to keep.  Room for all of them is allocated up front
+        and the oldest call is overwritten by the newest one.
+
+    capture='reference'
+        How arguments are kept.  By ``'reference'`` is cheapest but the
+        history changes if the caller mutates an argument later on.
+        ``'shallow'`` and ``'deep'`` keep copies; arguments that cannot be
+        copied are kept by reference.  ``'digest'`` keeps an
+        :class:`ArgDigest` per argument, which is small even for
+        large payloads.
+
+    every=1
+        Only record every Nth call, starting with the first one.  All calls
+        are still counted and keep their number.
+
+    Recorders record (args, kwargs) of each call, can be reset, can
+    describe what they recorded for an error message and can be verified
+    by :func:`fudge.verify`.  This one also
+    keeps the time and thread of each call.
+    """
+
+    declared_by = "records()"
+    max_described_calls = 10
+
+    def __init__(self, maxlen=1000, capture='reference', every=1):
+        if maxlen < 1:
+            raise FakeDeclarationError(
+                "Cannot record less than 1 call (maxlen=%r)" % maxlen)
+        if every < 1:
+            raise FakeDeclarationError(
+                "Cannot record every %r call(s)" % every)
+        if capture not in CAPTURE_POLICIES:
+            raise FakeDeclarationError(
+                "Unknown capture policy %r; use one of %s" % (
+                    capture, ", ".join(sorted(CAPTURE_POLICIES))))
+        self.maxlen = maxlen
+        self.every = every
+        self.capture = capture
+        self._capture, self._capture_description = CAPTURE_POLICIES[capture]
+        self.reset()
+
+    def __len__(self):
+        return min(self.recorded, self.maxlen)
+
+    def __repr__(self):
+        return "<%s %s of %s calls>" % (
+            self.__class__.__name__, len(self), self.calls_made)
+
+    def record(self, args, kwargs):
+        self.calls_made += 1
+        if self.every > 1 and (self.calls_made - 1) % self.every:
+            return
+        if self._capture is not None:
+            args, kwargs = self._capture(args, kwargs)
+        self._entries[self.recorded % self.maxlen] = (
+            args, kwargs, time.time(), thread.get_ident())
+        self.recorded += 1
+
+    def _ordered_entries(self):
+        if self.recorded <= self.maxlen:
+            return self._entries[:self.recorded]
+        start = self.recorded % self.maxlen
+        return self._entries[start:] + self._entries[:start]
+
+    def entries(self):
+        """Returns recorded (args, kwargs), oldest first."""
+        return [(args, kwargs)
+                for args, kwargs, t, ident in self._ordered_entries()]
+
+    # Recorded calls have positions, numbered from 1 and counting calls
+    # that were overwritten.  Unless only every Nth call is recorded, the
+    # position of a call is its number.
+
+    @property
+    def first_position(self):
+        return self.recorded - len(self) + 1
+
+    def number_at(self, position):
+        return (position - 1) * self.every + 1
+
+    @property
+    def first_number(self):
+        """Number of the oldest recorded call.
+
+        Calls are numbered from 1, counting calls that were overwritten
+        or not sampled.
+        """
+        return self.number_at(self.first_position)
+
+    def numbered_entries(self):
+        """Returns recorded (call number, args, kwargs), oldest first."""
+        first = self.first_position
+        return [(self.number_at(first + i), args, kwargs)
+                for i, (args, kwargs) in enumerate(self.entries())]
+
+    def iter_calls(self):
+        """Yields a :class:`RecordedCall` per recorded call, oldest first."""
+        for position in range(self.first_position, self.recorded + 1):
+            yield self.at(position)
+
+    def get(self, number):
+        """Returns the :class:`RecordedCall` with this number.
+
+        Returns None if the call was overwritten, not sampled or never made.
+        """
+        if (number - 1) % self.every:
+            return None
+        return self.at((number - 1) // self.every + 1)
+
+    def at(self, position):
+        """Returns the :class:`RecordedCall` at this position or None."""
+        if position < self.first_position or position > self.recorded:
+            return None
+        args, kwargs, t, ident = self._entries[(position - 1) % self.maxlen]
+        return RecordedCall(self.number_at(position), args, kwargs, t, ident)
+
+    def field_value(self, position, field):
+        args, kwargs, t, ident = self._entries[(position - 1) % self.maxlen]
+        if field is THREAD:
+            return ident
+        if isinstance(field, int):
+            if field < len(args):
+                return args[field]
+        elif field in kwargs:
+            return kwargs[field]
+        return NOT_PASSED
+
+    def index(self, field):
+        """Returns a dict of field value to call positions.
+
+        The index is built the first time a field is queried and
+        is brought up to date with newer calls when queried again.
+        Raises TypeError when a value of the field is unhashable.
+        """
+        first = self.first_position
+        index = self._indexes.get(field)
+        if (index is None or index.calls_indexed < first - 1 or
+                index.size > 2 * self.maxlen):
+            # new or too stale to update:
+            index = self._indexes[field] = FieldIndex()
+            index.calls_indexed = first - 1
+        if index.unhashable:
+            raise TypeError("%r has unhashable values" % field)
+        buckets = index.buckets
+        for position in range(index.calls_indexed + 1, self.recorded + 1):
+            value = self.field_value(position, field)
+            try:
+                buckets.setdefault(value, []).append(position)
+            except TypeError:
+                index.unhashable = True
+                raise
+            index.size += 1
+        index.calls_indexed = self.recorded
+        return buckets
+
+    def positions_between(self, start, end):
+        """Returns positions of the calls made from time *start* up to *end*."""
+        first = self.first_position
+        def time_of(position):
+            return self._entries[(position - 1) % self.maxlen][2]
+        def bisect(t, after):
+            lo, hi = first, self.recorded + 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if time_of(mid) < t or (after and time_of(mid) == t):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+        return range(bisect(start, False), bisect(end, True))
+
+    def query(self):
+        """Returns a :class:`CallQuery` of all recorded calls."""
+        return CallQuery(self)
+
+    def _describe_policy(self):
+        if self.every > 1:
+            return "%s, 1 in %s of %s calls" % (
+                self._capture_description, self.every, self.calls_made)
+        return self._capture_description
+
+    def describe(self):
+        entries = self.numbered_entries()[-self.max_described_calls:]
+        if not entries:
+            return None
+        calls = ["#%s %s" % (n, fmt_args(args, kwargs))
+                 for n, args, kwargs in entries]
+        calls.append("end")
+        return "Recorded calls (%s): %s" % (
+            self._describe_policy(), ", ".join(calls))
+
+    def verify(self):
+        pass
+
+    def reset(self):
+        self._entries = [None] * self.maxlen
+        self._indexes = {}
+        self.calls_made = 0 # includes calls that were not sampled
+        self.recorded = 0 # includes calls that were overwritten
+
+def _random(rng):
+    # a random float in (0, 1), so that it has a log
+    while True:
+        r = rng.random()
+        if r:
+            return r
+
+class CallReservoir(CallHistory):
+    """A uniform random sample of all calls made on a fake.
+
+    size=100
+        How many calls to keep.  Each call has the same chance of being
+        kept, however many calls are made.
+
+    seed=None
+        Seed of the random choice of calls, for samples that are the same
+        from run to run.
+
+    capture='reference'
+        How arguments are kept, as in :class:`CallHistory`.
+
+    Calls that are not sampled only cost a counter increment, since the
+    number of calls to skip is drawn in advance (Li's algorithm L).  The
+    sampled calls cannot be queried.
+    """
+
+    def __init__(self, size=100, seed=None, capture='reference'):
+        if size < 1:
+            raise FakeDeclarationError(
+                "Cannot sample less than 1 call (size=%r)" % size)
+        self.seed = seed
+        CallHistory.__init__(self, maxlen=size, capture=capture)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, args, kwargs):
+        self.calls_made += 1
+        if self.calls_made < self._next:
+            return
+        if self._capture is not None:
+            args, kwargs = self._capture(args, kwargs)
+        entry = (self.calls_made, args, kwargs, time.time(),
+                 thread.get_ident())
+        rng = self._rng
+        if len(self._entries) < self.maxlen:
+            self._entries.append(entry)
+            self._next += 1
+            if len(self._entries) < self.maxlen:
+                return
+        else:
+            self._entries[rng.randrange(self.maxlen)] = entry
+        self._w *= math.exp(math.log(_random(rng)) / self.maxlen)
+        self._next = self.calls_made + 1 + int(
+            math.log(_random(rng)) / math.log(1 - self._w))
+
+    def _sorted_entries(self):
+        return sorted(self._entries, key=lambda entry: entry[0])
+
+    def entries(self):
+        """Returns sampled (args, kwargs), oldest first."""
+        return [(args, kwargs)
+                for n, args, kwargs, t, ident in self._sorted_entries()]
+
+    @property
+    def first_number(self):
+        """Number of the oldest sampled call."""
+        if not self._entries:
+            return None
+        return min([entry[0] for entry in self._entries])
+
+    def numbered_entries(self):
+        """Returns sampled (call number, args, kwargs), oldest first."""
+        return [(n, args, kwargs)
+                for n, args, kwargs, t, ident in self._sorted_entries()]
+
+    def iter_calls(self):
+        """Yields a :class:`RecordedCall` per sampled call, oldest first."""
+        for n, args, kwargs, t, ident in self._sorted_entries():
+            yield RecordedCall(n, args, kwargs, t, ident)
+
+    def get(self, number):
+        """Returns the sampled :class:`RecordedCall` with this number or None.
+        """
+        for n, args, kwargs, t, ident in self._entries:
+            if n == number:
+                return RecordedCall(n, args, kwargs, t, ident)
+        return None
+
+    def query(self):
+        raise FakeDeclarationError(
+            "Calls sampled by a reservoir cannot be queried; "
+            "use samples(every=...) instead")
+
+    def _describe_policy(self):
+        return "%s, %s sampled of %s calls" % (
+            self._capture_description, len(self), self.calls_made)
+
+    def reset(self):
+        self._entries = []
+        self.calls_made = 0
+        self._rng = random.Random(self.seed)
+        self._next = 1 # number of the next call to sample
+        self._w = 1.0
+
+class RecordedCall(object):
+    """A call recorded by :class:`CallHistory`."""
+
+    def __init__(self, number, args, kwargs, time, thread):
+        self.number = number
+        self.args = args
+        self.kwargs = kwargs
+        self.time = time
+        self.thread = thread
+
+    def __repr__(self):
+        return "<%s #%s %s>" % (self.__class__.__name__, self.number,
+                                fmt_args(self.args, self.kwargs))
+
+    def __eq__(self, other):
+        return (isinstance(other, RecordedCall) and
+                self.number == other.number and
+                self.args == other.args and self.kwargs == other.kwargs)
+
+    def __ne__(self, other):
+        return not self == other
+
+class FieldIndex(object):
+    """Call numbers by field value, see :meth:`CallHistory.index`"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.calls_indexed = 0
+        self.size = 0
+        self.unhashable = False
+
+class CallQuery(object):
+    """Finds recorded calls.
+
+    Filters can be chained and each returns a new query.  Iterating a
+    query yields :class:`RecordedCall` objects, oldest first::
+
+        >>> import fudge
+        >>> from fudge.inspector import arg
+        >>> db = fudge.Fake('db').provides('insert').records()
+        >>> db.insert('users', name='Joe')
+        >>> db.insert('groups', name='admins')
+        >>> db.insert('users', name='Frank')
+        >>> users = db.insert.query_calls().where(0, 'users')
+        >>> len(users)
+        2
+        >>> [c.kwargs['name'] for c in users.where('name', arg.startswith('F'))]
+        ['Frank']
+
+    A field is a position or a keyword name.  Filtering by a field builds
+    a hash index of its values the first time, so that repeated queries do
+    not scan every call.  Values from :mod:`fudge.inspector` and
+    unhashable values are compared with each call instead.
+    """
+
+    def __init__(self, history, numbers=None):
+        self.history = history
+        self._numbers = numbers # None means all recorded calls
+
+    def __repr__(self):
+        return "<%s of %s calls>" % (self.__class__.__name__, len(self))
+
+    def _all_numbers(self):
+        # these are positions in the history, see CallHistory.at()
+        if self._numbers is None:
+            return range(self.history.first_position,
+                         self.history.recorded + 1)
+        first = self.history.first_position
+        # skip calls that have since been overwritten:
+        return [n for n in self._numbers if n >= first]
+
+    def __iter__(self):
+        for number in self._all_numbers():
+            yield self.history.at(number)
+
+    def __len__(self):
+        return len(self._all_numbers())
+
+    def calls(self):
+        """Returns a list of the :class:`RecordedCall` objects found."""
+        return list(self)
+
+    def _narrow(self, numbers):
+        if self._numbers is None:
+            first = self.history.first_position
+            return CallQuery(self.history, [n for n in numbers if n >= first])
+        found = set(numbers)
+        return CallQuery(self.history,
+                         [n for n in self._numbers if n in found])
+
+    def _scan(self, field, value):
+        found = []
+        for number in self._all_numbers():
+            call_value = self.history.field_value(number, field)
+            if call_value is not NOT_PASSED and value == call_value:
+                found.append(number)
+        return self._narrow(found)
+
+    def where(self, field, value):
+        """Calls where the argument *field* equals *value*."""
+        if isinstance(value, ValueTest):
+            return self._scan(field, value)
+        try:
+            return self._narrow(self.history.index(field).get(value, []))
+        except TypeError:
+            # unhashable
+            return self._scan(field, value)
+
+    def from_thread(self, ident):
+        """Calls made from the thread *ident*, as in thread.get_ident()"""
+        return self.where(THREAD, ident)
+
+    def between(self, start, end):
+        """Calls made from time *start* up to time *end*, as in time.time()"""
+        return self._narrow(self.history.positions_between(start, end))
+
+class ArgColumns(object):
+    """Selected arguments of each call, stored in typed columns.
+
+    Each keyword names a column and declares which argument goes in it, as
+    ``(arg, typecode)``.  *arg* is a position or a keyword name, *typecode*
+    is an :mod:`array` typecode.  A bare *arg* stores floats, as
+    typecode ``'d'``.  With the typecode ``str``, each distinct value
+    (such as a metric name) is stored once and the column holds its id.
+
+    Each column is an :class:`array.array` so it can be wrapped without a
+    copy, i.e. by ``numpy.frombuffer(columns['value'])``.  An array that is
+    wrapped cannot grow, so wrap it once the calls are made.  Arguments
+    that were not passed are stored as NaN, 0 or the id -1.  A call
+    passing a value that its column cannot hold fails with an
+    AssertionError and none of its arguments are recorded.
+    """
+
+    declared_by = "records_columns()"
+
+    def __init__(self, **columns):
+        if not columns:
+            raise FakeDeclarationError(
+                "records_columns() needs at least one column")
+        self._specs = []
+        for column, spec in sorted(columns.items()):
+            if isinstance(spec, tuple):
+                arg, typecode = spec
+            else:
+                arg, typecode = spec, 'd'
+            if typecode is not str:
+                try:
+                    array.array(typecode)
+                except (TypeError, ValueError):
+                    raise FakeDeclarationError(
+                        "Column %r has an unknown typecode %r" % (
+                                                        column, typecode))
+            self._specs.append((column, arg, typecode))
+        self.reset()
+
+    def __len__(self):
+        return self.calls_made
+
+    def __getitem__(self, column):
+        return self._columns[column]
+
+    def __repr__(self):
+        return "<%s %s of %s calls>" % (
+            self.__class__.__name__, ", ".join(self.keys()), self.calls_made)
+
+    def keys(self):
+        return [column for column, arg, typecode in self._specs]
+
+    def names(self, column):
+        """Returns the distinct values of a ``str`` column in id order."""
+        return self._names[column]
+
+    def record(self, args, kwargs):
+        # a row is recorded in full or not at all, so columns stay in step
+        appended = []
+        try:
+            for column, arg, append, ids, names, missing in self._appenders:
+                if isinstance(arg, int):
+                    if arg >= len(args):
+                        append(missing)
+                        appended.append((column, None))
+                        continue
+                    value = args[arg]
+                elif arg in kwargs:
+                    value = kwargs[arg]
+                else:
+                    append(missing)
+                    appended.append((column, None))
+                    continue
+                added = None
+                if ids is not None:
+                    if value not in ids:
+                        ids[value] = len(names)
+                        names.append(value)
+                        added = value
+                    append(ids[value])
+                else:
+                    append(value)
+                appended.append((column, added))
+        except (TypeError, OverflowError), exc:
+            for done, added in appended:
+                self._columns[done].pop()
+                if added is not None:
+                    del self._ids[done][added]
+                    self._names[done].pop()
+            raise AssertionError(
+                "Cannot record %r in column %r of typecode %r: %s" % (
+                    value, column, self._typecodes[column], exc))
+        self.calls_made += 1
+
+    def describe(self):
+        if not self.calls_made:
+            return None
+        return "Recorded columns %s of %s call(s)" % (
+            ", ".join(self.keys()), self.calls_made)
+
+    def verify(self):
+        pass
+
+    def reset(self):
+        self._columns = {}
+        self._names = {}
+        self._ids = {}
+        self._typecodes = {}
+        self._appenders = []
+        for column, arg, typecode in self._specs:
+            self._typecodes[column] = typecode
+            if typecode is str:
+                values = array.array('l')
+                names = self._names[column] = []
+                ids = self._ids[column] = {}
+                missing = -1
+            else:
+                values = array.array(typecode)
+                names = ids = None
+                if typecode in ('f', 'd'):
+                    missing = float('nan')
+                else:
+                    missing = 0
+            self._columns[column] = values
+            self._appenders.append(
+                (column, arg, values.append, ids, names, missing))
+        self.calls_made = 0
+
+def hashable(value):
+    """Returns value or, if it is unhashable, a hashable equivalent.
+
+    Lists, dicts and sets are converted item by item.  Any other
+    unhashable value is converted to a digest of its content, see
+    :class:`ArgDigest`, or of its repr if it has no digest.
+    """
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    if isinstance(value, (list, tuple)):
+        return (LIST, type(value) is tuple, tuple([hashable(v) for v in value]))
+    if isinstance(value, dict):
+        return (DICT, frozenset([(hashable(k), hashable(v))
+                                 for k, v in value.items()]))
+    if isinstance(value, (set, frozenset)):
+        return (SET, frozenset([hashable(v) for v in value]))
+    try:
+        return (DIGEST, _digest_of(value, set()))
+    except TypeError:
+        return (DIGEST, hashlib.sha1(repr(value).encode('utf-8')).digest())
+
+def hashable_call_key(args, kwargs):
+    """Like :func:`fudge.util.call_key` but for unhashable args too."""
+    try:
+        key = call_key(args, kwargs)
+        hash(key)
+        return key
+    except TypeError:
+        return call_key(hashable(args), dict([(k, hashable(v))
+                                             for k, v in kwargs.items()]))
+
+class ArgCounter(object):
+    """How many times a call was made with each distinct set of arguments.
+
+    Only a count and the first (args, kwargs) are kept per distinct set
+    of arguments.  Unhashable arguments are counted by a hashable
+    equivalent, see :func:`hashable`.
+    """
+
+    declared_by = "records_counts()"
+    max_described_counts = 10
+
+    def __init__(self):
+        self.reset()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __repr__(self):
+        return "<%s %s distinct of %s calls>" % (
+            self.__class__.__name__, len(self), self.calls_made)
+
+    def record(self, args, kwargs):
+        try:
+            key = call_key(args, kwargs)
+            count = self._counts.get(key, 0)
+        except TypeError:
+            key = hashable_call_key(args, kwargs)
+            count = self._counts.get(key, 0)
+        if not count:
+            self._first_calls[key] = (args, kwargs)
+        self._counts[key] = count + 1
+        self.calls_made += 1
+
+    def count_for(self, *args, **kwargs):
+        """Returns how many calls were made with these arguments."""
+        return self._counts.get(hashable_call_key(args, kwargs), 0)
+
+    def most_common(self, n=None):
+        """Returns (args, kwargs, count) of the most made calls, most first."""
+        counted = sorted(self._counts.items(),
+                         key=lambda item: item[1], reverse=True)
+        if n is not None:
+            counted = counted[:n]
+        return [self._first_calls[key] + (count,) for key, count in counted]
+
+    def describe(self):
+        if not self.calls_made:
+            return None
+        counts = ["%s x%s" % (fmt_args(args, kwargs), count)
+                  for args, kwargs, count in
+                  self.most_common(self.max_described_counts)]
+        if len(self) > self.max_described_counts:
+            counts.append("...")
+        return "Counted calls: %s" % ", ".join(counts)
+
+    def verify(self):
+        pass
+
+    def reset(self):
+        self._counts = {}
+        self._first_calls = {}
+        self.calls_made = 0
+
+def _mix64(h):
+    # spreads the bits of a hash, since hash(int) is the int itself
+    h &= 0xFFFFFFFFFFFFFFFF
+    h ^= h >> 33
+    h = (h * 0xFF51AFD7ED558CCD) & 0xFFFFFFFFFFFFFFFF
+    h ^= h >> 33
+    h = (h * 0xC4CEB9FE1A85EC53) & 0xFFFFFFFFFFFFFFFF
+    h ^= h >> 33
+    return h
+
+class ArgSummary(object):
+    """A fixed size summary of the arguments of a great many calls.
+
+    top=10
+        How many of the most frequent arguments to keep track of, using the
+        space-saving algorithm.  Any arguments used in more than 1/top of
+        all calls are sure to be tracked.  A tracked count may be too high
+        by at most its error, never too low.
+
+    precision=10
+        Distinct arguments are estimated with a HyperLogLog of
+        2**precision registers; the typical error is 1.04/sqrt(2**precision).
+        The estimate may differ between runs, like hash() of strings does
+        on Python 3, but it is exact until more than *top* distinct
+        arguments were used.
+
+    max_per_args=None
+        When set, :func:`fudge.verify` fails if any arguments were
+        certainly used more than this many times.
+
+    call=None
+        The call that is summarized, used in error messages.
+    """
+
+    declared_by = "records_summary()"
+
+    def __init__(self, top=10, precision=10, max_per_args=None, call=None):
+        if top < 1:
+            raise FakeDeclarationError(
+                "Cannot summarize less than 1 top call (top=%r)" % top)
+        if not 4 <= precision <= 16:
+            raise FakeDeclarationError(
+                "precision must be from 4 to 16, not %r" % precision)
+        self.top_size = top
+        self.precision = precision
+        self.max_per_args = max_per_args
+        self.call = call
+        self._registers_len = 1 << precision
+        self.reset()
+
+    def __repr__(self):
+        return "<%s ~%s distinct of %s calls>" % (
+            self.__class__.__name__, self.distinct(), self.calls_made)
+
+    def record(self, args, kwargs):
+        self.calls_made += 1
+        try:
+            key = call_key(args, kwargs)
+            entry = self._entries.get(key)
+        except TypeError:
+            key = hashable_call_key(args, kwargs)
+            entry = self._entries.get(key)
+
+        # HyperLogLog
+        h = _mix64(hash(key))
+        register = h & (self._registers_len - 1)
+        h >>= self.precision
+        rank = 1
+        while not h & 1 and rank <= 64 - self.precision:
+            h >>= 1
+            rank += 1
+        if rank > self._registers[register]:
+            self._registers[register] = rank
+
+        # space-saving
+        if entry is not None:
+            count = entry[0]
+            self._move(key, count, count + 1)
+            entry[0] = count + 1
+        elif len(self._entries) < self.top_size:
+            self._entries[key] = [1, 0, args, kwargs]
+            self._add(key, 1)
+        else:
+            # replace a least counted entry:
+            self._evicted = True
+            min_count = self._min_count
+            old_key = self._buckets[min_count].pop()
+            if not self._buckets[min_count]:
+                del self._buckets[min_count]
+            del self._entries[old_key]
+            self._entries[key] = [min_count + 1, min_count, args, kwargs]
+            self._add(key, min_count + 1)
+
+    def _add(self, key, count):
+        self._buckets.setdefault(count, set()).add(key)
+        if self._min_count is None or count < self._min_count:
+            self._min_count = count
+        elif count - 1 == self._min_count and \
+                self._min_count not in self._buckets:
+            self._min_count = count
+
+    def _move(self, key, old_count, new_count):
+        bucket = self._buckets[old_count]
+        bucket.discard(key)
+        if not bucket:
+            del self._buckets[old_count]
+        self._buckets.setdefault(new_count, set()).add(key)
+        if old_count == self._min_count and old_count not in self._buckets:
+            self._min_count = new_count
+
+    def top(self, n=None):
+        """Returns (args, kwargs, count, error) of the most made calls.
+
+        The true count is from count - error to count.
+        """
+        entries = sorted(self._entries.values(),
+                         key=lambda e: e[0], reverse=True)
+        if n is not None:
+            entries = entries[:n]
+        return [(args, kwargs, count, error)
+                for count, error, args, kwargs in entries]
+
+    def distinct(self):
+        """Returns an estimate of how many distinct arguments were used.
+
+        This is exact until more than *top* distinct arguments were used.
+        """
+        if not self._evicted:
+            return len(self._entries)
+        m = self._registers_len
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        elif m >= 64:
+            alpha = 0.709
+        elif m >= 32:
+            alpha = 0.697
+        else:
+            alpha = 0.673
+        estimate = alpha * m * m / sum([2.0 ** -r for r in self._registers])
+        zeros = list(self._registers).count(0)
+        if estimate <= 2.5 * m and zeros:
+            # small range correction:
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def describe(self):
+        if not self.calls_made:
+            return None
+        calls = []
+        for args, kwargs, count, error in self.top(self.top_size):
+            if error:
+                calls.append("%s x%s-%s" % (
+                    fmt_args(args, kwargs), count - error, count))
+            else:
+                calls.append("%s x%s" % (fmt_args(args, kwargs), count))
+        return "Summary of %s call(s) with about %s distinct args: %s" % (
+            self.calls_made, self.distinct(), ", ".join(calls))
+
+    def verify(self):
+        if self.max_per_args is None:
+            return
+        for args, kwargs, count, error in self.top():
+            if count - error > self.max_per_args:
+                raise AssertionError(
+                    "%s was called at least %s time(s) with args %s. "
+                    "Expected at most %s.; %s" % (
+                        self.call, count - error, fmt_args(args, kwargs),
+                        self.max_per_args, self.describe()))
+
+    def reset(self):
+        self._entries = {} # key -> [count, error, args, kwargs]
+        self._buckets = {} # count -> keys
+        self._min_count = None
+        # until then every distinct key has its own entry:
+        self._evicted = False
+        self._registers = array.array('B', [0]) * self._registers_len
+        self.calls_made = 0
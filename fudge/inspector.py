@@ -573,7 +573,7 @@ class PassesTest(ValueTest):
         return self.test(other)
 
     def _repr_argspec(self):
-        return self._make_argspec(repr(self.test))
+        return self._make_argspec(fmt_val(self.test, shorten=False))
 
 class IsInstance(ValueTest):
     arg_method = "isinstance"
@@ -0,0 +1,324 @@
+"""An append-only file of the calls made on fakes.
+
+This is for long runs where keeping calls in memory is not an option.
+Every call is written to the journal as it is made and a
+:class:`JournalReader` reads them back after the run, see
+:func:`fudge.Fake.records_journal`.
+
+.. doctest::
+
+    >>> import os, tempfile
+    >>> import fudge
+    >>> from fudge.journal import CallJournal, JournalReader
+    >>> path = os.path.join(tempfile.mkdtemp(), 'calls.journal')
+    >>> journal = CallJournal(path)
+    >>> db = fudge.Fake('db').provides('insert').records_journal(journal)
+    >>> db.insert('users', name='Joe')
+    >>> journal.close()
+    >>> reader = JournalReader(path)
+    >>> record = reader[0]
+    >>> print("#%s %s.%s" % (record.sequence, record.fake_name,
+    ...                        record.call_name))
+    #1 db.insert
+    >>> record.args, record.kwargs
+    (('users',), {'name': 'Joe'})
+    >>> reader.close()
+
+.. doctest::
+    :hide:
+
+    >>> fudge.clear_expectations()
+
+"""
+import cPickle as pickle
+import mmap
+import os
+import struct
+import thread
+import time
+from array import array
+
+from fudge.exc import FakeDeclarationError
+from fudge.util import b, fmt_args
+
+__all__ = ['CallJournal', 'JournalReader', 'JournalRecord']
+
+MAGIC = b('FUDGEJ1\n')
+
+# length, sequence, time, thread, len(fake_name), len(call_name),
+# len(encoded args), encoding
+RECORD = struct.Struct('<IQdQHHIB')
+
+# how the arguments of a record are encoded:
+PICKLED, REPR = 0, 1
+
+def _encode_args(args, kwargs):
+    try:
+        return PICKLED, pickle.dumps((args, kwargs), 2)
+    except Exception:
+        # anything can go wrong while pickling an arbitrary object
+        return REPR, fmt_args(args, kwargs, shorten=False).encode('utf-8')
+
+def _encode_name(name):
+    name = (name or '').encode('utf-8')
+    if len(name) > 0xFFFF:
+        raise FakeDeclarationError("Name is too long for a journal: %r..."
+                                   % name[:50])
+    return name
+
+def _thread_key(ident):
+    return ident & 0xFFFFFFFFFFFFFFFF
+
+class CallJournal(object):
+    """Appends calls to the journal file at *path*.
+
+    Records are written in the order calls are made, from any thread,
+    and are numbered by a sequence that spans all fakes writing to the
+    journal.  Appending to an existing journal continues its sequence.
+
+    Arguments are pickled, or kept as their repr if they cannot be.
+    Writes are buffered; call :meth:`flush` before reading a journal that
+    is still being written to and :meth:`close` when done.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = thread.allocate_lock()
+        self.sequence = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            reader = JournalReader(path)
+            try:
+                if len(reader):
+                    self.sequence = reader[-1].sequence
+                end = reader.end
+            finally:
+                reader.close()
+            self._file = open(path, 'r+b')
+            # drops a record that was only partially written:
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(MAGIC)
+
+    def __repr__(self):
+        return "<%s %r>" % (self.__class__.__name__, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, fake_name, call_name, args, kwargs):
+        """Writes a call and returns its sequence number."""
+        fake_name = _encode_name(fake_name)
+        call_name = _encode_name(call_name)
+        encoding, data = _encode_args(args, kwargs)
+        length = RECORD.size + len(fake_name) + len(call_name) + len(data)
+        self._lock.acquire()
+        try:
+            self.sequence += 1
+            self._file.write(RECORD.pack(
+                length, self.sequence, time.time(),
+                _thread_key(thread.get_ident()),
+                len(fake_name), len(call_name), len(data), encoding))
+            self._file.write(fake_name)
+            self._file.write(call_name)
+            self._file.write(data)
+            return self.sequence
+        finally:
+            self._lock.release()
+
+    def flush(self):
+        self._lock.acquire()
+        try:
+            self._file.flush()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._file.close()
+        finally:
+            self._lock.release()
+
+class JournalRecorder(object):
+    """Writes the calls of a declared call to a :class:`CallJournal`.
+
+    You do not need to use this directly, use
+    :func:`fudge.Fake.records_journal`.
+    """
+    declared_by = 'records_journal()'
+
+    def __init__(self, journal, fake_name, call_name):
+        self.journal = journal
+        self.fake_name = fake_name
+        self.call_name = call_name
+        self.reset()
+
+    def record(self, args, kwargs):
+        self.last_sequence = self.journal.append(
+            self.fake_name, self.call_name, args, kwargs)
+        self.calls_made += 1
+
+    def reset(self):
+        # the journal itself is append-only
+        self.calls_made = 0
+        self.last_sequence = None
+
+    def describe(self):
+        if not self.calls_made:
+            return None
+        return "Journaled %s call(s) to %s, last one is #%s" % (
+            self.calls_made, self.journal.path, self.last_sequence)
+
+    def verify(self):
+        pass
+
+class JournalRecord(object):
+    """A call read from a journal.
+
+    The arguments are decoded when first accessed.  Arguments that could
+    not be pickled are only available as :attr:`args_repr`; their
+    :attr:`args` and :attr:`kwargs` are None.
+    """
+
+    def __init__(self, sequence, time, thread, fake_name, call_name,
+                 encoding, data):
+        self.sequence = sequence
+        self.time = time
+        self.thread = thread
+        self.fake_name = fake_name
+        self.call_name = call_name
+        self._encoding = encoding
+        self._data = data
+        self._decoded = None
+
+    def __repr__(self):
+        return "<%s #%s %s.%s%s>" % (
+            self.__class__.__name__, self.sequence, self.fake_name,
+            self.call_name, self.args_repr)
+
+    def _decode(self):
+        if self._decoded is None:
+            if self._encoding == PICKLED:
+                self._decoded = pickle.loads(self._data)
+            else:
+                self._decoded = (None, None)
+        return self._decoded
+
+    @property
+    def args(self):
+        return self._decode()[0]
+
+    @property
+    def kwargs(self):
+        return self._decode()[1]
+
+    @property
+    def args_repr(self):
+        if self._encoding == PICKLED:
+            return fmt_args(self.args, self.kwargs)
+        return self._data.decode('utf-8')
+
+class JournalReader(object):
+    """Reads a journal written by :class:`CallJournal`.
+
+    The file is memory-mapped and indexed when opened, which only reads
+    the fixed size part of each record.  Records can then be accessed
+    by position, iterated or filtered with :meth:`where`.  A record that
+    was only partially written, by a run that crashed, is ignored.
+
+    Only read journals you trust; arguments are unpickled.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._offsets = array('L')
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            # an empty file cannot be mapped
+            self._map = b('')
+        else:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%r is not a call journal" % path)
+        pos = len(MAGIC)
+        while pos + RECORD.size <= size:
+            (length, sequence, time, thread, fake_len, call_len, data_len,
+             encoding) = RECORD.unpack_from(self._map, pos)
+            if (length != RECORD.size + fake_len + call_len + data_len or
+                    encoding not in (PICKLED, REPR) or pos + length > size):
+                # a record that was only partially written, or zeroes
+                # left at the end of the file by a crash
+                break
+            self._offsets.append(pos)
+            pos += length
+        # where the last complete record ends:
+        self.end = pos
+
+    def __repr__(self):
+        return "<%s %r>" % (self.__class__.__name__, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        return self._read(self._offsets[index])
+
+    def __iter__(self):
+        for offset in self._offsets:
+            yield self._read(offset)
+
+    def _read_header(self, offset):
+        (length, sequence, time, thread, fake_len, call_len, data_len,
+         encoding) = RECORD.unpack_from(self._map, offset)
+        pos = offset + RECORD.size
+        fake_name = self._map[pos:pos+fake_len].decode('utf-8')
+        pos += fake_len
+        call_name = self._map[pos:pos+call_len].decode('utf-8')
+        pos += call_len
+        return (sequence, time, thread, fake_name, call_name, encoding,
+                pos, data_len)
+
+    def _read(self, offset):
+        (sequence, time, thread, fake_name, call_name, encoding,
+         pos, data_len) = self._read_header(offset)
+        return JournalRecord(sequence, time, thread, fake_name, call_name,
+                             encoding, self._map[pos:pos+data_len])
+
+    def where(self, fake_name=None, call_name=None, thread=None):
+        """Yields the records matching all the given fields.
+
+        Arguments are only read for matching records.
+        """
+        if thread is not None:
+            thread = _thread_key(thread)
+        for offset in self._offsets:
+            (sequence, time, rec_thread, rec_fake_name, rec_call_name,
+             encoding, pos, data_len) = self._read_header(offset)
+            if fake_name is not None and rec_fake_name != fake_name:
+                continue
+            if call_name is not None and rec_call_name != call_name:
+                continue
+            if thread is not None and rec_thread != thread:
+                continue
+            yield JournalRecord(sequence, time, rec_thread, rec_fake_name,
+                                rec_call_name, encoding,
+                                self._map[pos:pos+data_len])
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
@@ -0,0 +1,110 @@
+"""Streams of bytes to read from, see :func:`fudge.Fake.reads_from`.
+
+A :class:`ScriptedStream` reads from bytes, a bytearray or an mmap and
+can be scripted to return short reads or raise errors, like a socket or a
+pipe would::
+
+    >>> from fudge.streams import ScriptedStream
+    >>> stream = ScriptedStream('HEADbody',
+    ...                         chunks=[2, RuntimeError('reset'), 4])
+    >>> stream.read(4)
+    'HE'
+    >>> stream.read(4)
+    Traceback (most recent call last):
+    ...
+    RuntimeError: reset
+    >>> stream.read()
+    'ADbo'
+    >>> stream.read()
+    'dy'
+    >>> stream.read()
+    ''
+
+"""
+from fudge.util import b
+
+try:
+    memoryview
+except NameError:
+    memoryview = None # Python < 2.7
+
+__all__ = ['ScriptedStream']
+
+class ScriptedStream(object):
+    """Reads the bytes of *source*, a bytes, bytearray or mmap object.
+
+    Each read, of any kind, takes the next item of *chunks*: a number is
+    the most bytes that read returns and anything else is an exception to
+    raise.  Once all are taken reads are only limited by their size.
+
+    The source is not copied; a bytearray may be extended between reads
+    to stream more data.  A memoryview is copied to bytes though, since
+    its length and slices count items, which need not be bytes.
+    """
+
+    def __init__(self, source, chunks=None):
+        if memoryview is not None and isinstance(source, memoryview):
+            source = source.tobytes()
+        self.source = source
+        self.chunks = list(chunks or [])
+        self.position = 0
+        self._next_chunk = 0
+
+    def __repr__(self):
+        return "<%s at %s of %s bytes>" % (
+            self.__class__.__name__, self.position, len(self.source))
+
+    def _limit(self, size):
+        # the number of bytes the next read returns
+        available = len(self.source) - self.position
+        if size is None or size < 0 or size > available:
+            size = available
+        if self._next_chunk < len(self.chunks):
+            chunk = self.chunks[self._next_chunk]
+            self._next_chunk += 1
+            if not isinstance(chunk, (int, long)):
+                raise chunk
+            size = min(size, chunk)
+        return max(size, 0)
+
+    def _view(self, start, end):
+        if memoryview is not None:
+            try:
+                return memoryview(self.source)[start:end]
+            except TypeError:
+                # an mmap on Python 2 has no memoryview
+                pass
+        return self.source[start:end]
+
+    def _take(self, size):
+        start = self.position
+        self.position += size
+        view = self._view(start, self.position)
+        if memoryview is not None and isinstance(view, memoryview):
+            return view.tobytes()
+        return view
+
+    def read(self, size=-1):
+        """Returns up to *size* bytes, all the bytes left by default."""
+        return self._take(self._limit(size))
+
+    def readinto(self, buffer):
+        """Reads bytes into the writable *buffer* and returns how many.
+
+        Bytes are copied straight from the source into the buffer.
+        """
+        if memoryview is not None:
+            buffer = memoryview(buffer)
+        size = self._limit(len(buffer))
+        start = self.position
+        self.position += size
+        buffer[:size] = self._view(start, self.position)
+        return size
+
+    def readline(self, size=-1):
+        """Returns bytes up to and including the next newline."""
+        end = self.source.find(b('\n'), self.position)
+        if end != -1 and (size is None or size < 0 or
+                          end + 1 - self.position < size):
+            size = end + 1 - self.position
+        return self._take(self._limit(size))
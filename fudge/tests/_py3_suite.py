@@ -5,9 +5,17 @@
 
 # FIXME: this is dumb
 
+from fudge.tests.test_arrays import *
+from fudge.tests.test_cache import *
+from fudge.tests.test_copies import *
+from fudge.tests.test_export import *
 from fudge.tests.test_fudge import *
+from fudge.tests.test_history import *
 from fudge.tests.test_import_all import *
 from fudge.tests.test_inspector import *
 from fudge.tests.test_inspector_import_all import *
+from fudge.tests.test_journal import *
 from fudge.tests.test_patcher import *
-from fudge.tests.test_registry import *
\ No newline at end of file
+from fudge.tests.test_registry import *
+from fudge.tests.test_streams import *
+from fudge.tests.test_util import *
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from nose.exc import SkipTest
+from nose.tools import eq_, raises
+
+import fudge
+from fudge import Fake
+from fudge.arrays import load_array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class TestWithoutNumpy(unittest.TestCase):
+
+    def setUp(self):
+        if numpy is not None:
+            raise SkipTest("NumPy is installed")
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    @raises(ImportError)
+    def test_declaring_needs_numpy(self):
+        Fake('loader').provides('load').returns_array('x.npy')
+
+class TestReturnsArray(unittest.TestCase):
+
+    def setUp(self):
+        if numpy is None:
+            raise SkipTest("NumPy is not installed")
+        self.dir = tempfile.mkdtemp()
+        self.npy = os.path.join(self.dir, 'x.npy')
+        numpy.save(self.npy, numpy.arange(10))
+        self.npz = os.path.join(self.dir, 'x.npz')
+        numpy.savez(self.npz, a=numpy.arange(3), b=numpy.ones(2))
+
+    def tearDown(self):
+        fudge.clear_expectations()
+        shutil.rmtree(self.dir)
+
+    def test_memory_mapped(self):
+        fake = Fake('loader').provides('load').returns_array(self.npy)
+        array = fake.load()
+        assert isinstance(array, numpy.memmap)
+        eq_(list(array), list(range(10)))
+
+    def test_not_loaded_until_called(self):
+        Fake('loader').provides('load').returns_array(
+                                    os.path.join(self.dir, 'missing.npy'))
+
+    def test_read_only(self):
+        fake = Fake('loader').provides('load').returns_array(self.npy)
+        array = fake.load()
+        self.assertRaises(ValueError, array.__setitem__, 0, 1)
+
+    def test_shared(self):
+        one = Fake('one').provides('load').returns_array(self.npy)
+        two = Fake('two').provides('load').returns_array(self.npy)
+        assert one.load() is two.load()
+
+    def test_reloaded_when_changed(self):
+        first = load_array(self.npy)
+        # replace the file, rather than overwrite the mapped one:
+        new = os.path.join(self.dir, 'new.npy')
+        numpy.save(new, numpy.arange(20))
+        os.rename(new, self.npy)
+        eq_(len(load_array(self.npy)), 20)
+        eq_(len(first), 10)
+
+    def test_fake_sees_the_file_change(self):
+        fake = Fake('loader').provides('load').returns_array(self.npy)
+        eq_(len(fake.load()), 10)
+        new = os.path.join(self.dir, 'new.npy')
+        numpy.save(new, numpy.arange(20))
+        os.rename(new, self.npy)
+        eq_(len(fake.load()), 20)
+
+    def test_not_memory_mapped(self):
+        fake = Fake('loader').provides('load').returns_array(self.npy,
+                                                             mmap=False)
+        array = fake.load()
+        assert not isinstance(array, numpy.memmap)
+        assert not array.flags.writeable
+
+    def test_writable(self):
+        fake = Fake('loader').provides('load').returns_array(self.npy,
+                                                             writable=True)
+        array = fake.load()
+        array[0] = 5
+        eq_(fake.load()[0], 0)
+        eq_(load_array(self.npy)[0], 0)
+
+    def test_npz(self):
+        fake = Fake('loader').provides('load').returns_array(self.npz,
+                                                             key='b')
+        eq_(list(fake.load()), [1.0, 1.0])
+        assert not fake.load().flags.writeable
+
+    def test_npz_writable(self):
+        fake = Fake('loader').provides('load').returns_array(
+                                        self.npz, key='a', writable=True)
+        fake.load()[0] = 9
+        eq_(fake.load()[0], 0)
+
+    @raises(ValueError)
+    def test_npz_needs_a_key(self):
+        load_array(self.npz)
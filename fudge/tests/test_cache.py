@@ -0,0 +1,152 @@
+import sys
+import unittest
+
+from nose.tools import eq_
+
+import fudge
+from fudge import Fake
+from fudge.cache import LoaderCache, loader_cache, deep_sizeof
+
+class Loader(object):
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+class TestLoaderCache(unittest.TestCase):
+
+    def test_loads_once(self):
+        cache = LoaderCache()
+        load = Loader([1, 2])
+        eq_(cache.get('a', load), [1, 2])
+        assert cache.get('a', load) is load.value
+        eq_(load.calls, 1)
+        eq_((cache.hits, cache.misses), (1, 1))
+
+    def test_max_entries_evicts_least_recently_used(self):
+        cache = LoaderCache(max_entries=2)
+        cache.get('a', Loader(1))
+        cache.get('b', Loader(2))
+        cache.get('a', Loader(1)) # a is now used more recently than b
+        cache.get('c', Loader(3))
+        eq_(len(cache), 2)
+        load_b = Loader(2)
+        cache.get('b', load_b)
+        eq_(load_b.calls, 1)
+        load_a = Loader(1)
+        cache.get('c', Loader(3))
+        cache.get('a', load_a)
+        eq_(load_a.calls, 1)
+
+    def test_max_bytes(self):
+        cache = LoaderCache(max_bytes=100, sizeof=lambda value: value)
+        cache.get('a', Loader(60))
+        cache.get('b', Loader(30))
+        eq_(cache.bytes, 90)
+        cache.get('c', Loader(30))
+        eq_(cache.bytes, 60)
+        eq_(len(cache), 2)
+
+    def test_too_big_is_not_kept(self):
+        cache = LoaderCache(max_bytes=100, sizeof=lambda value: value)
+        load = Loader(200)
+        eq_(cache.get('a', load), 200)
+        eq_(cache.get('a', load), 200)
+        eq_(load.calls, 2)
+        eq_(cache.bytes, 0)
+
+    def test_size_is_not_estimated_when_given(self):
+        sized = []
+        def sizeof(value):
+            sized.append(value)
+            return 1
+        cache = LoaderCache(sizeof=sizeof)
+        cache.get('a', Loader(1), size=10)
+        eq_(sized, [])
+        eq_(cache.bytes, 10)
+        cache.get('b', Loader(2))
+        eq_(sized, [2])
+
+    def test_load_tells_if_kept(self):
+        cache = LoaderCache(max_bytes=100, sizeof=lambda value: value)
+        eq_(cache.load('a', Loader(200)), (200, False))
+        eq_(cache.load('b', Loader(20)), (20, True))
+        eq_(cache.load('b', Loader(20)), (20, True))
+
+    def test_configure_evicts(self):
+        cache = LoaderCache()
+        for key in range(5):
+            cache.get(key, Loader(key))
+        cache.configure(max_entries=2)
+        eq_(len(cache), 2)
+
+    def test_clear(self):
+        cache = LoaderCache()
+        cache.get('a', Loader(1))
+        cache.clear()
+        eq_((len(cache), cache.bytes, cache.hits, cache.misses), (0, 0, 0, 0))
+
+    def test_loader_errors_are_not_kept(self):
+        cache = LoaderCache()
+        def fail():
+            raise ValueError
+        self.assertRaises(ValueError, cache.get, 'a', fail)
+        eq_(cache.get('a', Loader(1)), 1)
+
+    def test_loader_can_use_the_cache(self):
+        cache = LoaderCache()
+        def outer():
+            return cache.get('inner', Loader(1)) + 1
+        eq_(cache.get('outer', outer), 2)
+
+    def test_deep_sizeof(self):
+        shared = 'x' * 1000
+        eq_(deep_sizeof([shared, shared]),
+            sys.getsizeof([shared, shared]) + sys.getsizeof(shared))
+        assert deep_sizeof({'a': [shared]}) > 1000
+        class Obj(object):
+            pass
+        obj = Obj()
+        obj.data = shared
+        assert deep_sizeof(obj) > 1000
+
+class TestReturnsLazy(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+        loader_cache.clear()
+
+    def test_not_loaded_until_called(self):
+        load = Loader({'name': 'Joe'})
+        api = Fake('api').provides('user').returns_lazy(load)
+        eq_(load.calls, 0)
+        eq_(api.user(), {'name': 'Joe'})
+        eq_(api.user(), {'name': 'Joe'})
+        eq_(load.calls, 1)
+
+    def test_shared_across_fakes_and_tests(self):
+        load = Loader(1)
+        one = Fake('one').provides('get').returns_lazy(load, cache_key='k')
+        fudge.clear_expectations()
+        two = Fake('two').provides('get').returns_lazy(Loader(2),
+                                                       cache_key='k')
+        one.get()
+        eq_(two.get(), 1)
+
+    def test_too_big_for_the_cache_is_loaded_once(self):
+        load = Loader('x' * 1000)
+        api = Fake('api').provides('user').returns_lazy(load, size=10 ** 12)
+        for i in range(3):
+            eq_(api.user(), load.value)
+        eq_(load.calls, 1)
+        eq_(len(loader_cache), 0)
+
+    def test_returns_wins(self):
+        load = Loader(1)
+        api = Fake('api').provides('user').returns_lazy(load).returns(2)
+        eq_(api.user(), 2)
+        eq_(load.calls, 0)
@@ -0,0 +1,208 @@
+import unittest
+
+from nose.tools import eq_, raises
+
+import fudge
+from fudge import Fake
+from fudge.copies import cow, CowDict, CowList
+from fudge.exc import FakeDeclarationError
+
+class Thing(object):
+
+    def __init__(self):
+        self.items = []
+
+class TestCow(unittest.TestCase):
+
+    def setUp(self):
+        self.fixture = {'users': [{'name': 'Joe', 'tags': ['a']}],
+                        'groups': [{'name': 'admins'}],
+                        'count': 1}
+
+    def test_reads(self):
+        value = cow(self.fixture)
+        assert isinstance(value, CowDict)
+        eq_(value['users'][0]['name'], 'Joe')
+        eq_(value['count'], 1)
+        eq_(len(value), 3)
+        assert 'users' in value
+        eq_(sorted(value), ['count', 'groups', 'users'])
+        eq_(value, self.fixture)
+        eq_(value.get('missing', 2), 2)
+
+    def test_nothing_is_copied_when_reading(self):
+        value = cow(self.fixture)
+        assert value['users']._value is self.fixture['users']
+        assert value._value is self.fixture
+
+    def test_immutables_are_returned_as_they_are(self):
+        eq_(cow(1), 1)
+        eq_(cow((1, 'a')), (1, 'a'))
+
+    def test_set_item(self):
+        value = cow(self.fixture)
+        value['count'] = 2
+        eq_(value['count'], 2)
+        eq_(self.fixture['count'], 1)
+
+    def test_nested_change_copies_the_path(self):
+        value = cow(self.fixture)
+        value['users'][0]['tags'].append('b')
+        eq_(value['users'][0]['tags'], ['a', 'b'])
+        eq_(self.fixture['users'][0]['tags'], ['a'])
+        # containers that were not changed are still shared:
+        assert value._value['groups'] is self.fixture['groups']
+        assert value._value['users'] is not self.fixture['users']
+
+    def test_changed_container_is_still_a_proxy(self):
+        value = cow(self.fixture)
+        users = value['users']
+        users.append({'name': 'Frank'})
+        assert value['users'] is users
+        value['users'][0]['name'] = 'Joseph'
+        eq_(self.fixture['users'][0]['name'], 'Joe')
+        eq_(value['users'][0]['name'], 'Joseph')
+
+    def test_values_set_are_not_copied(self):
+        value = cow(self.fixture)
+        mine = []
+        value['mine'] = mine
+        value['mine'].append(1)
+        eq_(mine, [1])
+
+    def test_other_objects_are_copied_when_read(self):
+        thing = Thing()
+        value = cow({'thing': thing})
+        value['thing'].items.append(1)
+        eq_(thing.items, [])
+        eq_(value['thing'].items, [1])
+
+    def test_pop(self):
+        value = cow(self.fixture)
+        users = value.pop('users')
+        users[0]['name'] = 'Frank'
+        eq_(self.fixture['users'][0]['name'], 'Joe')
+        assert 'users' in self.fixture
+        assert 'users' not in value
+
+    def test_dict_methods(self):
+        value = cow(self.fixture)
+        value.update(count=3)
+        value.setdefault('other', []).append(1)
+        del value['groups']
+        eq_(value, {'users': self.fixture['users'], 'count': 3,
+                    'other': [1]})
+        value.clear()
+        eq_(len(value), 0)
+        eq_(len(self.fixture), 3)
+
+    def test_list(self):
+        fixture = [[1], [2], [3]]
+        value = cow(fixture)
+        assert isinstance(value, CowList)
+        eq_([list(v) for v in value], fixture)
+        value[1].append(4)
+        value.insert(0, [0])
+        value.reverse()
+        eq_(value, [[3], [2, 4], [1], [0]])
+        eq_(fixture, [[1], [2], [3]])
+
+    def test_slice(self):
+        fixture = [[1], [2], [3]]
+        value = cow(fixture)
+        part = value[1:]
+        part[0].append(4)
+        eq_(part, [[2, 4], [3]])
+        eq_(fixture, [[1], [2], [3]])
+
+    def test_copy(self):
+        value = cow(self.fixture)
+        duplicate = value.copy()
+        duplicate['users'].append(1)
+        eq_(len(value['users']), 1)
+        eq_(len(self.fixture['users']), 1)
+
+    def test_py2_dict_methods(self):
+        value = cow(self.fixture)
+        assert value.has_key('users')
+        assert not value.has_key('missing')
+        eq_(sorted(value.iterkeys()), ['count', 'groups', 'users'])
+        eq_(sorted(value.iteritems())[0], ('count', 1))
+        for users in value.itervalues():
+            if isinstance(users, CowList) and len(users[0]) == 2:
+                users.append({'name': 'Frank'})
+        eq_(len(value['users']), 2)
+        eq_(len(self.fixture['users']), 1)
+
+    def test_add(self):
+        fixture = [[1], [2]]
+        value = cow(fixture)
+        eq_(value + [[3]], [[1], [2], [3]])
+        eq_([[0]] + value, [[0], [1], [2]])
+        added = value + [[3]]
+        assert isinstance(added, CowList)
+        added[0].append(5)
+        added[2].append(6)
+        eq_(added, [[1, 5], [2], [3, 6]])
+        eq_(fixture, [[1], [2]])
+        value += [[3]]
+        eq_(value, [[1], [2], [3]])
+        eq_(fixture, [[1], [2]])
+
+    def test_values_set_stay_private(self):
+        value = cow(self.fixture)
+        for i in range(100):
+            # freed values leave ids free for the next ones:
+            value['mine'] = [i]
+            assert isinstance(value['mine'], list)
+            del value['mine']
+        assert isinstance(value['groups'], CowList)
+        value['groups'][0]['name'] = 'staff'
+        eq_(self.fixture['groups'][0]['name'], 'admins')
+
+    def test_compare(self):
+        value = cow([[2], [1]])
+        value.sort()
+        eq_(value, [[1], [2]])
+        assert value[0] < value[1]
+
+class TestReturnsCopy(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_no_copy_by_default(self):
+        value = []
+        fake = Fake('db').provides('rows').returns(value)
+        assert fake.rows() is value
+
+    def test_shallow(self):
+        value = [[1]]
+        fake = Fake('db').provides('rows').returns(value, copy='shallow')
+        rows = fake.rows()
+        rows.append(2)
+        eq_(fake.rows(), [[1]])
+        assert rows[0] is value[0]
+
+    def test_deep(self):
+        value = [[1]]
+        fake = Fake('db').provides('rows').returns(value, copy='deep')
+        fake.rows()[0].append(2)
+        eq_(fake.rows(), [[1]])
+        eq_(value, [[1]])
+
+    def test_cow(self):
+        value = {'rows': [[1]]}
+        fake = Fake('db').provides('rows').returns(value, copy='cow')
+        fake.rows()['rows'][0].append(2)
+        eq_(fake.rows(), {'rows': [[1]]})
+        eq_(value, {'rows': [[1]]})
+
+    def test_replaces_static_value(self):
+        fake = Fake('db').provides('rows').returns(1)
+        fake = fake.returns([], copy='shallow')
+        eq_(fake.rows(), [])
+
+    @raises(FakeDeclarationError)
+    def test_unknown_strategy(self):
+        Fake('db').provides('rows').returns([], copy='quick')
@@ -0,0 +1,164 @@
+try:
+    import json
+except ImportError:
+    # Python 2.5
+    import simplejson as json
+import os
+import shutil
+import tempfile
+import thread
+import unittest
+from array import array
+from StringIO import StringIO
+
+from nose.tools import eq_
+
+import fudge
+from fudge import Fake
+from fudge.export import write_jsonl, write_columns
+from fudge.journal import CallJournal, JournalReader
+
+def read_lines(path):
+    f = open(path)
+    try:
+        return f.read().split('\n')[:-1]
+    finally:
+        f.close()
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = Fake('db').provides('insert').records()
+
+    def tearDown(self):
+        fudge.clear_expectations()
+        shutil.rmtree(self.dir)
+
+    def test_jsonl(self):
+        self.db.insert('users', name='Joe')
+        self.db.insert('groups')
+        out = StringIO()
+        eq_(self.db.insert.export_jsonl(out), 2)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        eq_([(r['number'], r['args'], r['kwargs']) for r in lines],
+            [(1, ['users'], {'name': 'Joe'}), (2, ['groups'], {})])
+        eq_(lines[0]['thread'], thread.get_ident())
+        assert lines[0]['time'] <= lines[1]['time']
+
+    def test_jsonl_fields(self):
+        self.db.insert(1)
+        out = StringIO()
+        self.db.insert.export_jsonl(out, fields=[])
+        eq_(out.getvalue(), '{"args": [1], "kwargs": {}}\n')
+
+    def test_jsonl_repr_of_other_values(self):
+        lock = thread.allocate_lock()
+        self.db.insert(lock, keys={(1, 2): 3}, tags=set([1]))
+        out = StringIO()
+        self.db.insert.export_jsonl(out)
+        line = json.loads(out.getvalue())
+        eq_(line['args'], [repr(lock)])
+        eq_(line['kwargs'], {'keys': repr({(1, 2): 3}),
+                             'tags': repr(set([1]))})
+
+    def test_jsonl_of_query(self):
+        self.db.insert(1)
+        self.db.insert(2)
+        out = StringIO()
+        write_jsonl(self.db.insert.query_calls().where(0, 2), out,
+                    fields=['number'])
+        eq_(out.getvalue(), '{"number": 2, "args": [2], "kwargs": {}}\n')
+
+    def test_columns(self):
+        self.db.insert('a', 1)
+        self.db.insert('b', name='Joe')
+        self.db.insert('c', 3, name=None)
+        directory = os.path.join(self.dir, 'columns')
+        eq_(self.db.insert.export_columns(directory), 3)
+        f = open(os.path.join(directory, 'columns.json'))
+        manifest = json.loads(f.read())
+        f.close()
+        eq_(manifest['rows'], 3)
+        eq_([c['name'] for c in manifest['columns']],
+            ['number', 'time', 'thread', 'args.0', 'args.1', 'kwargs.name'])
+        eq_(manifest['columns'][1]['type'], 'float64')
+
+        numbers = array('l')
+        f = open(os.path.join(directory, 'number.bin'), 'rb')
+        numbers.fromfile(f, 3)
+        f.close()
+        eq_(list(numbers), [1, 2, 3])
+
+        eq_(read_lines(os.path.join(directory, 'args.0.jsonl')),
+            ['"a"', '"b"', '"c"'])
+        eq_(read_lines(os.path.join(directory, 'args.1.jsonl')),
+            ['1', '', '3'])
+        eq_(read_lines(os.path.join(directory, 'kwargs.name.jsonl')),
+            ['', '"Joe"', 'null'])
+
+    def test_columns_in_chunks(self):
+        for i in range(5000):
+            self.db.insert(i)
+        directory = os.path.join(self.dir, 'columns')
+        self.db.insert.export_columns(directory)
+        numbers = array('l')
+        f = open(os.path.join(directory, 'number.bin'), 'rb')
+        numbers.fromfile(f, 1000)
+        self.assertRaises(EOFError, numbers.fromfile, f, 1)
+        f.close()
+        eq_(numbers[-1], 5000)
+
+    def test_nothing_recorded(self):
+        directory = os.path.join(self.dir, 'columns')
+        eq_(self.db.insert.export_columns(directory), 0)
+        f = open(os.path.join(directory, 'columns.json'))
+        eq_(json.loads(f.read())['columns'], [])
+        f.close()
+
+    def test_journal(self):
+        path = os.path.join(self.dir, 'calls.journal')
+        journal = CallJournal(path)
+        journal.append('db', 'insert', (1,), {})
+        journal.append('db', 'insert', (thread.allocate_lock(),), {})
+        journal.close()
+        reader = JournalReader(path)
+        out = StringIO()
+        eq_(write_jsonl(reader, out,
+                        fields=['sequence', 'fake_name', 'call_name']), 2)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        eq_(lines[0], {'sequence': 1, 'fake_name': 'db',
+                       'call_name': 'insert', 'args': [1], 'kwargs': {}})
+        assert lines[1]['args_repr'].startswith('(<'), lines[1]
+
+        directory = os.path.join(self.dir, 'columns')
+        write_columns(reader, directory)
+        reader.close()
+        eq_(read_lines(os.path.join(directory, 'call_name.jsonl')),
+            ['"insert"', '"insert"'])
+        eq_(read_lines(os.path.join(directory, 'args.0.jsonl')), ['1', ''])
+        eq_(read_lines(os.path.join(directory, 'args_repr.jsonl'))[0], '')
+
+    def test_sampled_calls(self):
+        feed = Fake('feed').samples(every=2).provides('push').records()
+        for i in range(5):
+            feed.push(i)
+        out = StringIO()
+        eq_(feed.push.export_jsonl(out, fields=['number']), 3)
+        eq_([json.loads(line)['number']
+             for line in out.getvalue().splitlines()], [1, 3, 5])
+
+    def test_reservoir_calls(self):
+        feed = Fake('feed').samples(reservoir=2, seed=1)
+        feed = feed.provides('push').records()
+        for i in range(100):
+            feed.push(i)
+        directory = os.path.join(self.dir, 'columns')
+        eq_(feed.push.export_columns(directory), 2)
+        numbers = array('l')
+        f = open(os.path.join(directory, 'number.bin'), 'rb')
+        numbers.fromfile(f, 2)
+        f.close()
+        eq_([n - 1 for n in numbers],
+            [json.loads(line) for line in
+             read_lines(os.path.join(directory, 'args.0.jsonl'))])
@@ -1,6 +1,16 @@
 from __future__ import with_statement
+import mmap
 import sys
+import tempfile
+import threading
 import unittest
+try:
+    from collections.abc import Iterable
+except ImportError:
+    try:
+        from collections import Iterable
+    except ImportError:
+        Iterable = None # Python 2.5
 
 from nose.tools import eq_, raises
 from nose.exc import SkipTest
@@ -9,6 +19,7 @@ import fudge
 from fudge.inspector import arg
 from fudge import (
     Fake, Registry, ExpectedCall, ExpectedCallOrder, Call, CallStack, FakeDeclarationError)
+from fudge.util import b
 
 def test_decorator_on_def():
     class holder:
@@ -922,6 +933,639 @@ class TestNextCall(unittest.TestCase):
         fudge.verify()
 
 
+class TestReturnsSequence(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_list(self):
+        fake = fudge.Fake('db').provides('fetch').returns_sequence([1, 2])
+        eq_(fake.fetch(), 1)
+        eq_(fake.fetch(), 2)
+
+    def test_values_are_taken_lazily(self):
+        taken = []
+        def values():
+            for i in range(3):
+                taken.append(i)
+                yield i
+        fake = fudge.Fake('db').provides('fetch').returns_sequence(values())
+        eq_(taken, [])
+        eq_(fake.fetch(), 0)
+        eq_(taken, [0])
+
+    def test_failed_call_takes_no_value(self):
+        fake = fudge.Fake('db').provides('fetch').with_arg_count(1)
+        fake = fake.returns_sequence([10, 20])
+        self.assertRaises(AssertionError, fake.fetch, 2, 3)
+        eq_(fake.fetch(1), 10)
+
+    def test_exhausted(self):
+        fake = fudge.Fake('db').provides('fetch').returns_sequence([1])
+        fake.fetch()
+        try:
+            fake.fetch()
+        except AssertionError, exc:
+            eq_(str(exc), "fake:db.fetch() was called after all 1 value(s) "
+                          "of its sequence were returned")
+        else:
+            raise RuntimeError("expected AssertionError")
+
+    def test_empty(self):
+        fake = fudge.Fake('db').provides('fetch').returns_sequence([])
+        self.assertRaises(AssertionError, fake.fetch)
+
+    def test_clear_calls_starts_over(self):
+        fake = fudge.Fake('db').provides('fetch').returns_sequence(
+                                                        xrange(1, 3))
+        eq_(fake.fetch(), 1)
+        fudge.clear_calls()
+        eq_(fake.fetch(), 1)
+        eq_(fake.fetch(), 2)
+
+    def test_clear_calls_continues_an_iterator(self):
+        fake = fudge.Fake('db').provides('fetch').returns_sequence(
+                                                        iter([1, 2]))
+        eq_(fake.fetch(), 1)
+        fudge.clear_calls()
+        eq_(fake.fetch(), 2)
+
+    def test_returns_wins(self):
+        fake = fudge.Fake('db').provides('fetch').returns_sequence([1])
+        fake = fake.returns(2)
+        eq_(fake.fetch(), 2)
+        eq_(fake.fetch(), 2)
+
+    def test_with_times_called_and_recording(self):
+        fake = fudge.Fake('db').expects('fetch').returns_sequence(
+                                                    [1, 2]).times_called(2)
+        fake = fake.records()
+        eq_(fake.fetch('a'), 1)
+        eq_(fake.fetch('b'), 2)
+        fudge.verify()
+        eq_(fake.fetch.recorded_calls(), [])
+
+    def test_many_values(self):
+        stacks = len(fudge.registry.call_stacks)
+        fake = fudge.Fake('db').provides('fetch').returns_sequence(
+                                                    xrange(100000))
+        for i in xrange(100000):
+            fake.fetch()
+        # no call is declared per value:
+        eq_(len(fudge.registry.call_stacks), stacks)
+
+    def test_clear_expectations_forgets_sequences(self):
+        fudge.Fake('db').provides('fetch').returns_sequence([1])
+        fudge.clear_expectations()
+        eq_(fudge.registry.return_sequences, [])
+
+
+class TestRaises(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def raised(self, fake):
+        try:
+            fake.connect()
+        except Exception, exc:
+            return exc
+        raise AssertionError("nothing was raised")
+
+    def test_instance_is_reused(self):
+        error = IOError('reset')
+        fake = fudge.Fake('db').provides('connect').raises(error)
+        assert self.raised(fake) is error
+        assert self.raised(fake) is error
+
+    def test_class_makes_new_instances(self):
+        fake = fudge.Fake('db').provides('connect').raises(IOError)
+        first = self.raised(fake)
+        assert isinstance(first, IOError)
+        assert self.raised(fake) is not first
+
+    def test_factory_makes_new_instances(self):
+        fake = fudge.Fake('db').provides('connect').raises(
+                                            lambda: IOError('reset'))
+        first = self.raised(fake)
+        eq_(str(first), 'reset')
+        assert self.raised(fake) is not first
+
+    def test_traceback_of_instance_does_not_grow(self):
+        error = IOError('reset')
+        fake = fudge.Fake('db').provides('connect').raises(error,
+                                                           traceback=False)
+        self.raised(fake)
+        if not hasattr(error, '__traceback__'):
+            raise SkipTest("exceptions do not keep tracebacks")
+        def depth():
+            tb, n = error.__traceback__, 0
+            while tb is not None:
+                tb, n = tb.tb_next, n + 1
+            return n
+        first = depth()
+        for i in range(5):
+            self.raised(fake)
+        eq_(depth(), first)
+
+
+class TestFromDict(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {'user': {'name': 'Joe', 'address': {'city': 'Paris'}},
+                     'groups': [{'id': 1}, {'id': 2}, 3],
+                     'count': 2}
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_attributes(self):
+        fake = Fake.from_dict(self.data, name='response')
+        eq_(fake.count, 2)
+        eq_(fake.user.name, 'Joe')
+        eq_(fake.user.address.city, 'Paris')
+
+    def test_lists(self):
+        fake = Fake.from_dict(self.data)
+        eq_([g.id for g in fake.groups[:2]], [1, 2])
+        eq_(fake.groups[2], 3)
+
+    def test_names(self):
+        fake = Fake.from_dict(self.data, name='response')
+        eq_(repr(fake), 'fake:response')
+        eq_(repr(fake.user.address), 'fake:response.user.address')
+        eq_(repr(fake.groups[1]), 'fake:response.groups[1]')
+
+    def test_nested_fakes_are_kept(self):
+        fake = Fake.from_dict(self.data)
+        assert fake.user is fake.user
+        assert fake.groups is fake.groups
+        assert fake.groups[0] is fake.groups[0]
+        assert fake.groups[-3] is fake.groups[0]
+
+    def test_list_items_are_converted_when_read(self):
+        fake = Fake.from_dict({'rows': [{'id': i} for i in range(50000)]})
+        rows = fake.rows
+        eq_(len(rows), 50000)
+        eq_(rows._wrapped, {})
+        eq_(rows[49999].id, 49999)
+        eq_(list(rows._wrapped.keys()), [49999])
+        eq_([row.id for row in rows[:2]], [0, 1])
+        eq_(sum([1 for row in rows]), 50000)
+
+    def test_nested_lists(self):
+        fake = Fake.from_dict({'grid': [[1, {'x': 2}], []]}, name='board')
+        eq_(fake.grid[0][1].x, 2)
+        eq_(repr(fake.grid[0][1]), 'fake:board.grid[0][1]')
+        eq_(fake.grid[1], [])
+        eq_(repr(fake.grid), '<list fake:board.grid of 2 item(s)>')
+        self.assertRaises(IndexError, lambda: fake.grid[2])
+
+    def test_mapping_is_not_copied(self):
+        fake = Fake.from_dict(self.data)
+        eq_(fake._wrapped, {})
+        self.data['count'] = 3
+        eq_(fake.count, 3)
+        fake.user
+        eq_(list(fake._wrapped.keys()), ['user'])
+
+    def test_missing_key(self):
+        fake = Fake.from_dict(self.data)
+        self.assertRaises(AttributeError, getattr, fake, 'missing')
+
+    def test_declarations_take_precedence(self):
+        fake = Fake.from_dict(self.data).has_attr(count=5)
+        eq_(fake.count, 5)
+        fake = Fake.from_dict(self.data).provides('count').returns(6)
+        eq_(fake.count(), 6)
+
+    def test_set_attribute(self):
+        fake = Fake.from_dict(self.data)
+        fake.count = 7
+        eq_(fake.count, 7)
+        eq_(self.data['count'], 2)
+
+    def test_keys_do_not_shadow_fake_methods(self):
+        data = {'calls': 1, 'returns': {'id': 2}, 'records': [3],
+                '_name': 'key', '_attributes': None}
+        fake = Fake.from_dict(data, name='response')
+        fake.provides('save').returns(True)
+        eq_(fake.save(), True)
+        eq_(repr(fake), 'fake:response')
+        eq_(fake['calls'], 1)
+        eq_(fake['returns'].id, 2)
+        eq_(fake['records'], [3])
+        eq_(fake['_name'], 'key')
+        assert isinstance(fake, fudge.DictFake)
+
+    def test_returns_fake(self):
+        fake = Fake.from_dict(self.data)
+        child = fake.provides('session').returns_fake()
+        child.provides('close')
+        eq_(type(child), Fake)
+        fake.session().close()
+        fake = Fake.from_dict(self.data).iterates_over([1])
+        eq_(type(fake.provides('session').returns_fake()), Fake)
+        eq_(list(fake), [1])
+        eq_(fake.count, 2)
+
+    def test_missing_item(self):
+        fake = Fake.from_dict(self.data)
+        self.assertRaises(KeyError, lambda: fake['missing'])
+
+
+class TestLazyReturnsFake(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_created_when_called(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        query = query.provides('one').returns(['object'])
+        assert isinstance(query, fudge.LazyFake)
+        eq_(query._fake, None)
+        eq_(session.query().one(), ['object'])
+        assert isinstance(query._fake, Fake)
+        assert session.query() is query._fake
+
+    def test_deep_graph_only_creates_used_paths(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        rows = query.provides('filter').returns_fake(lazy=True)
+        rows = rows.provides('all').returns(['row'])
+        count = query.provides('count').returns_fake(lazy=True)
+        count = count.provides('scalar').returns(1)
+        eq_(session.query().filter().all(), ['row'])
+        assert rows._fake is not None
+        eq_(count._fake, None)
+
+    def test_children_of_lazy_fakes_are_lazy(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        rows = query.provides('filter').returns_fake()
+        assert isinstance(rows, fudge.LazyFake)
+
+    def test_names(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        rows = query.provides('filter').returns_fake(lazy=True)
+        rows.provides('all')
+        eq_(repr(session.query().filter()), 'fake:session.query().filter()')
+
+    def test_expected_calls_are_verified(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        rows = query.provides('filter').returns_fake(lazy=True)
+        rows.expects('all')
+        self.assertRaises(AssertionError, fudge.verify)
+
+    def test_created_in_another_thread(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        query.expects('one').times_called(2)
+        worker = threading.Thread(target=lambda: session.query().one())
+        worker.start()
+        worker.join()
+        assert query._fake is not None
+        try:
+            fudge.verify()
+        except AssertionError, exc:
+            assert "Expected 2" in str(exc), str(exc)
+        else:
+            raise RuntimeError("expected AssertionError")
+
+    def test_expected_calls_made(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        query.expects('all').returns([])
+        session.query().all()
+        fudge.verify()
+
+    def test_using_it_creates_it(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        query = query.provides('all').returns([1]).records()
+        eq_(query.all(), [1])
+        eq_(query.all.recorded_calls(), [((), {})])
+        assert session.query() is query._fake
+
+    def test_declaring_after_creation(self):
+        session = Fake('session')
+        query = session.provides('query').returns_fake(lazy=True)
+        session.query()
+        query.provides('all').returns([2])
+        eq_(session.query().all(), [2])
+
+
+class TestReturnDeclarations(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_last_declaration_wins(self):
+        fake = fudge.Fake('db').provides('fetch').returns(1)
+        eq_(fake.returns_sequence([5, 6]).fetch(), 5)
+        eq_(fake.returns_cycle([7]).fetch(), 7)
+        eq_(fake.routes([((), {}, 8)]).fetch(), 8)
+        eq_(fake.returns_lazy(lambda: 9, cache_key=object()).fetch(), 9)
+        eq_(fake.returns([2], copy='shallow').fetch(), [2])
+        eq_(fake.returns(3).fetch(), 3)
+
+    def test_returns_none_clears_sources(self):
+        fake = fudge.Fake('db').provides('fetch').returns_cycle([1])
+        eq_(fake.returns(None).fetch(), None)
+
+
+class TestReturnsCycle(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_cycle(self):
+        fake = fudge.Fake('api').provides('status').returns_cycle([1, 2, 3])
+        eq_([fake.status() for i in range(7)], [1, 2, 3, 1, 2, 3, 1])
+
+    def test_one_value(self):
+        fake = fudge.Fake('api').provides('status').returns_cycle(iter([1]))
+        eq_([fake.status() for i in range(3)], [1, 1, 1])
+
+    @raises(FakeDeclarationError)
+    def test_no_values(self):
+        fudge.Fake('api').provides('status').returns_cycle([])
+
+    def test_clear_calls_starts_over(self):
+        fake = fudge.Fake('api').provides('status').returns_cycle([1, 2])
+        fake.status()
+        fudge.clear_calls()
+        eq_(fake.status(), 1)
+
+    def test_values_are_copied(self):
+        values = [1, 2]
+        fake = fudge.Fake('api').provides('status').returns_cycle(values)
+        values[0] = 3
+        eq_(fake.status(), 1)
+
+    def test_with_times_called(self):
+        fake = fudge.Fake('api').expects('status').returns_cycle([1, 2])
+        fake = fake.times_called(3)
+        fake.status()
+        fake.status()
+        eq_(fake.status(), 1)
+        self.assertRaises(AssertionError, fake.status)
+
+    def test_with_recording(self):
+        fake = fudge.Fake('api').provides('status').returns_cycle([1, 2])
+        fake = fake.records(maxlen=2)
+        for i in range(5):
+            fake.status(i)
+        eq_(fake.status.recorded_calls(), [((3,), {}), ((4,), {})])
+
+    def test_next_call(self):
+        fake = fudge.Fake('api').provides('status').returns(0)
+        fake = fake.next_call().returns_cycle([1, 2])
+        eq_(fake.status(), 0)
+        eq_(fake.status(), 1)
+        self.assertRaises(AssertionError, fake.status)
+
+
+class TestIteratesOver(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_list(self):
+        fake = fudge.Fake('rows').iterates_over([1, 2])
+        eq_(list(fake), [1, 2])
+        # starts over:
+        eq_(list(fake), [1, 2])
+
+    def test_generator_is_streamed(self):
+        taken = []
+        def rows():
+            for i in range(3):
+                taken.append(i)
+                yield i
+        fake = fudge.Fake('rows').iterates_over(rows())
+        items = iter(fake)
+        eq_(items.next(), 0)
+        eq_(taken, [0])
+        eq_(list(items), [1, 2])
+        eq_(list(fake), [])
+
+    def test_generator_function(self):
+        def rows():
+            yield 1
+            yield 2
+        fake = fudge.Fake('rows').iterates_over(rows)
+        eq_(list(fake), [1, 2])
+        eq_(list(fake), [1, 2])
+
+    def test_file(self):
+        f = tempfile.TemporaryFile()
+        f.write(b('a\nb\n'))
+        f.seek(0)
+        fake = fudge.Fake('file').iterates_over(f)
+        eq_([line for line in fake], [b('a\n'), b('b\n')])
+        f.close()
+
+    def test_mmap(self):
+        f = tempfile.TemporaryFile()
+        f.write(b('a\nbc\nd'))
+        f.flush()
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fake = fudge.Fake('file').iterates_over(m)
+        eq_(list(fake), [b('a\n'), b('bc\n'), b('d')])
+        eq_(list(fake), [b('a\n'), b('bc\n'), b('d')])
+        m.close()
+        f.close()
+
+    def test_not_iterable(self):
+        fake = fudge.Fake('rows')
+        self.assertRaises(TypeError, iter, fake)
+        assert not hasattr(fake, '__iter__')
+        if Iterable is not None:
+            assert not isinstance(fake, Iterable)
+
+    def test_iterable(self):
+        fake = fudge.Fake('rows').iterates_over([])
+        assert isinstance(fake, fudge.Fake)
+        if Iterable is not None:
+            assert isinstance(fake, Iterable)
+        eq_(type(fake).__name__, 'Fake')
+        assert type(fudge.Fake('other').iterates_over([])) is type(fake)
+
+    def test_returned_fakes_are_not_iterable(self):
+        fake = fudge.Fake('cursor').iterates_over([1])
+        child = fake.provides('sub').returns_fake()
+        assert not hasattr(child, '__iter__')
+        self.assertRaises(TypeError, iter, child)
+        lazy = fake.provides('lazy').returns_fake(lazy=True)
+        assert not hasattr(fake.lazy(), '__iter__')
+        eq_(list(fake), [1])
+
+    def test_no_source(self):
+        fake = fudge.Fake('rows').iterates_over([])
+        fake._iter_source = None
+        try:
+            iter(fake)
+        except TypeError, exc:
+            eq_(str(exc), "fake:rows object is not iterable "
+                          "(maybe you want Fake.iterates_over() ?)")
+        else:
+            raise RuntimeError("expected TypeError")
+
+    def test_with_declared_calls(self):
+        fake = fudge.Fake('cursor').provides('close').iterates_over('ab')
+        eq_(list(fake), ['a', 'b'])
+        fake.close()
+
+
+class TestRoutes(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_routes_by_args(self):
+        fake = Fake("cache").provides("get").routes({("a",): 1, ("b", 2): 2})
+        eq_(fake.get("a"), 1)
+        eq_(fake.get("b", 2), 2)
+
+    def test_single_arg_key(self):
+        fake = Fake("cache").provides("get").routes({"a": 1})
+        eq_(fake.get("a"), 1)
+
+    @raises(AssertionError)
+    def test_unrouted_call(self):
+        fake = Fake("cache").provides("get").routes({("a",): 1})
+        fake.get("b")
+
+    def test_default(self):
+        fake = Fake("cache").provides("get").routes({("a",): 1}, default=None)
+        eq_(fake.get("b"), None)
+
+    def test_routes_by_kwargs(self):
+        fake = Fake("db").provides("get").routes([
+            ((), {"id": 1}, "Joe"),
+            ((), {"id": 2}, "Frank")])
+        eq_(fake.get(id=2), "Frank")
+        eq_(fake.get(id=1), "Joe")
+
+    def test_inspectors_are_scanned_in_order(self):
+        fake = Fake("db").provides("get").routes([
+            ((arg.startswith("user"),), None, "user"),
+            ((arg.any(),), None, "anything"),
+            (("user_1",), None, "Joe")])
+        eq_(fake.get("user_1"), "Joe")
+        eq_(fake.get("user_2"), "user")
+        eq_(fake.get("group_1"), "anything")
+
+    def test_unhashable_args(self):
+        fake = Fake("db").provides("get").routes([(([1, 2],), None, "list")])
+        eq_(fake.get([1, 2]), "list")
+
+    def test_unhashable_call_falls_back_to_scan(self):
+        fake = Fake("db").provides("get").routes({("a",): 1}, default="none")
+        eq_(fake.get(["a"]), "none")
+
+    def test_returns_wins(self):
+        fake = Fake("cache").provides("get").routes({("a",): 1}).returns(2)
+        eq_(fake.get("a"), 2)
+
+    def test_many_routes(self):
+        routes = dict(((i,), i * 2) for i in range(5000))
+        fake = Fake("cache").provides("get").routes(routes)
+        eq_(fake.get(4999), 9998)
+
+
+class TestDeclareMany(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_provides(self):
+        fake = Fake("db").declare_many([
+            {"name": "get", "args": (1,), "returns": "one"},
+            {"name": "close"}])
+        eq_(fake.get(1), "one")
+        eq_(fake.close(), None)
+        fudge.verify()
+
+    @raises(AssertionError)
+    def test_args_are_checked(self):
+        fake = Fake("db").declare_many([{"name": "get", "args": (1,)}])
+        fake.get(2)
+
+    def test_single_arg_need_not_be_a_tuple(self):
+        fake = Fake("weather").declare_many([
+            {"name": "temp", "args": "Chicago", "returns": 12},
+            {"name": "temp", "args": ["Lisbon"], "returns": 24},
+            {"name": "temp", "args": 0, "returns": 0}])
+        eq_(fake.temp("Chicago"), 12)
+        eq_(fake.temp(["Lisbon"]), 24)
+        eq_(fake.temp(0), 0)
+
+    def test_kwargs_are_checked(self):
+        fake = Fake("db").declare_many([{"name": "get", "kwargs": {"id": 1}}])
+        fake.get(id=1)
+        try:
+            fake.get(id=2)
+        except AssertionError, exc:
+            eq_(str(exc),
+                "fake:db.get(id=1) was called unexpectedly with args (id=2)")
+        else:
+            raise RuntimeError("expected AssertionError")
+
+    @raises(AssertionError)
+    def test_expected(self):
+        fake = Fake("db").declare_many([{"name": "get", "expected": True}])
+        fudge.verify()
+
+    @raises(ValueError)
+    def test_raises(self):
+        fake = Fake("db").declare_many([{"name": "get", "raises": ValueError}])
+        fake.get()
+
+    @raises(AssertionError)
+    def test_times(self):
+        fake = Fake("db").declare_many([{"name": "get", "times": 1}])
+        fake.get()
+        fake.get()
+
+    def test_repeated_names_are_stacked(self):
+        fake = Fake("db").declare_many(
+            {"name": "get", "returns": i} for i in range(5000))
+        eq_(fake.get(), 0)
+        eq_(fake.get(), 1)
+        assert isinstance(fake._declared_calls["get"], CallStack)
+
+    def test_expected_order(self):
+        fake = Fake("db").remember_order().declare_many([
+            {"name": "open", "expected": True},
+            {"name": "close", "expected": True}])
+        fake.open()
+        fake.close()
+        fudge.verify()
+
+    def test_chained_declarations_apply_to_last_row(self):
+        fake = Fake("db").declare_many([{"name": "get"}]).returns(1)
+        eq_(fake.get(), 1)
+
+    @raises(FakeDeclarationError)
+    def test_times_with_repeated_names(self):
+        Fake("db").declare_many([
+            {"name": "get", "times": 1},
+            {"name": "get"}])
+
+    @raises(FakeDeclarationError)
+    def test_missing_name(self):
+        Fake("db").declare_many([{"returns": 1}])
+
+    @raises(FakeDeclarationError)
+    def test_unknown_key(self):
+        Fake("db").declare_many([{"name": "get", "return": 1}])
+
+
 class TestExpectsAndProvides(unittest.TestCase):
 
     def tearDown(self):
@@ -1004,6 +1648,118 @@ class TestExpectsAndProvides(unittest.TestCase):
         eq_(self.fake.polo(), 'A')
         eq_(self.fake.polo(), 'B')
 
+class TestExpectOrder(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = fudge.Fake('lock').provides('acquire').provides('release')
+        self.db = fudge.Fake('db').provides('write').provides('read')
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def expect(self):
+        return fudge.expect_order(self.lock.acquire, self.db.write,
+                                  self.lock.release)
+
+    def test_in_order(self):
+        self.expect()
+        self.lock.acquire()
+        self.db.read() # not part of the order
+        self.db.write()
+        self.lock.release()
+        fudge.verify()
+
+    def test_out_of_order(self):
+        self.expect()
+        self.lock.acquire()
+        try:
+            self.lock.release()
+        except AssertionError, exc:
+            assert str(exc).startswith(
+                "Call #2 was fake:lock.release() (call sequence "), str(exc)
+        else:
+            raise RuntimeError("expected AssertionError")
+
+    @raises(AssertionError)
+    def test_not_all_calls_made(self):
+        self.expect()
+        self.lock.acquire()
+        self.db.write()
+        fudge.verify()
+
+    def test_clear_calls_resets_the_order(self):
+        self.expect()
+        self.lock.acquire()
+        self.db.write()
+        self.lock.release()
+        fudge.clear_calls()
+        self.lock.acquire()
+        self.db.write()
+        self.lock.release()
+        fudge.verify()
+
+    def test_repeated_calls(self):
+        fudge.expect_order(self.lock.acquire, self.lock.release,
+                           self.lock.acquire, self.lock.release)
+        for i in range(2):
+            self.lock.acquire()
+            self.lock.release()
+        fudge.verify()
+
+    @raises(AssertionError)
+    def test_extra_call(self):
+        self.expect()
+        self.lock.acquire()
+        self.db.write()
+        self.lock.release()
+        self.lock.acquire()
+
+    def test_long_order(self):
+        calls = [self.lock.acquire, self.lock.release] * 5000
+        fudge.expect_order(*calls)
+        for i in range(5000):
+            self.lock.acquire()
+            self.lock.release()
+        fudge.verify()
+
+    def test_call_stack(self):
+        db = fudge.Fake('db').provides('get').returns(1)
+        db = db.next_call().returns(2)
+        fudge.expect_order(db.get, self.lock.acquire, db.get)
+        eq_(db.get(), 1)
+        self.lock.acquire()
+        eq_(db.get(), 2)
+        fudge.verify()
+
+    def test_callable_fake(self):
+        send = fudge.Fake('send').is_callable()
+        fudge.expect_order(self.lock.acquire, send)
+        self.lock.acquire()
+        send()
+        fudge.verify()
+
+    def test_works_with_recording(self):
+        self.lock = self.lock.records()
+        self.expect()
+        self.lock.acquire()
+        self.db.write()
+        self.lock.release()
+        eq_(self.lock.release.recorded_calls(), [((), {})])
+
+    def test_bad_declarations(self):
+        self.assertRaises(FakeDeclarationError, fudge.expect_order,
+                          fudge.Fake('lock'))
+        self.assertRaises(FakeDeclarationError, fudge.expect_order, len)
+
+    def test_call_sequence(self):
+        self.lock.acquire()
+        self.db.write()
+        first = self.lock.acquire.last_sequence
+        eq_(self.db.write.last_sequence, first + 1)
+        self.lock.acquire()
+        assert self.lock.acquire.last_sequence > first
+
+
 class TestOrderedCalls(unittest.TestCase):
 
     def tearDown(self):
@@ -1069,6 +1825,40 @@ class TestOrderedCalls(unittest.TestCase):
         # two() not called but assertion is not finalized:
         call_order.assert_order_met(finalize=False)
 
+    def test_first_order_error_is_remembered(self):
+        fake = Fake("db")
+        call_order = ExpectedCallOrder(fake)
+        one = ExpectedCall(fake, "one", call_order=call_order)
+        call_order.add_expected_call(one)
+        two = ExpectedCall(fake, "two", call_order=call_order)
+        call_order.add_expected_call(two)
+
+        call_order.add_actual_call(two)
+        call_order.add_actual_call(two)
+        try:
+            call_order.assert_order_met(finalize=True)
+        except AssertionError, exc:
+            eq_(str(exc),
+                "Call #1 was fake:db.two(); Expected: "
+                "#1 fake:db.one(), #2 fake:db.two(), end")
+        else:
+            raise RuntimeError("expected AssertionError")
+
+        call_order.reset_calls()
+        call_order.add_actual_call(one)
+        call_order.add_actual_call(two)
+        call_order.assert_order_met(finalize=True)
+
+    def test_long_order_does_not_keep_actual_calls(self):
+        db = Fake("db").remember_order()
+        for i in range(500):
+            db = db.expects("insert")
+        for i in range(500):
+            db.insert()
+        call_order = fudge.registry.get_expected_call_order()[db]
+        eq_(call_order._pointer, 500)
+        fudge.verify()
+
     def test_multiple_returns_affect_order(self):
         db = Fake("db")\
             .remember_order()\
@@ -0,0 +1,760 @@
+import array
+import thread
+import unittest
+
+from nose.tools import eq_, raises
+
+import fudge
+from fudge import Fake, FakeDeclarationError
+from fudge.history import (
+    CallHistory, CallReservoir, ArgColumns, ArgCounter, ArgSummary, ArgDigest, RecordedCall)
+from fudge.inspector import arg
+from fudge.util import fmt_args
+
+class Payload(object):
+
+    def __init__(self, items):
+        self.items = items
+
+class Point(object):
+    __hash__ = None
+
+    def __init__(self, x):
+        self.x = x
+
+    def __eq__(self, other):
+        return self.x == other.x
+
+class TestCallHistory(unittest.TestCase):
+
+    def test_entries(self):
+        h = CallHistory(maxlen=3)
+        eq_(h.entries(), [])
+        h.record((1,), {})
+        h.record((2,), {'a': 1})
+        eq_(h.entries(), [((1,), {}), ((2,), {'a': 1})])
+        eq_(len(h), 2)
+
+    def test_oldest_entries_are_overwritten(self):
+        h = CallHistory(maxlen=3)
+        for i in range(10):
+            h.record((i,), {})
+        eq_(h.entries(), [((7,), {}), ((8,), {}), ((9,), {})])
+        eq_(h.numbered_entries(),
+            [(8, (7,), {}), (9, (8,), {}), (10, (9,), {})])
+        eq_(len(h), 3)
+        eq_(h.calls_made, 10)
+
+    def test_memory_is_fixed(self):
+        h = CallHistory(maxlen=5)
+        for i in range(10000):
+            h.record((i,), {})
+        eq_(len(h._entries), 5)
+
+    def test_reset(self):
+        h = CallHistory(maxlen=3)
+        h.record((1,), {})
+        h.reset()
+        eq_(h.entries(), [])
+        eq_(h.calls_made, 0)
+
+    def test_describe(self):
+        h = CallHistory(maxlen=3)
+        eq_(h.describe(), None)
+        for i in range(5):
+            h.record((i,), {'x': 'y'})
+        eq_(h.describe(),
+            "Recorded calls (by reference): #3 (2, x='y'), #4 (3, x='y'), #5 (4, x='y'), end")
+
+    @raises(FakeDeclarationError)
+    def test_maxlen_must_be_positive(self):
+        CallHistory(maxlen=0)
+
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        fudge.clear_expectations()
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_records(self):
+        db = Fake("db").provides("insert").records()
+        db.insert("users", name="Joe")
+        eq_(db.insert.recorded_calls(), [(("users",), {"name": "Joe"})])
+        eq_(db.recorded_calls("insert"), [(("users",), {"name": "Joe"})])
+
+    def test_records_callable(self):
+        remove = Fake("remove").expects_call().records()
+        remove("/tmp")
+        eq_(remove.recorded_calls(), [(("/tmp",), {})])
+
+    @raises(FakeDeclarationError)
+    def test_not_recorded(self):
+        db = Fake("db").provides("insert")
+        db.insert.recorded_calls()
+
+    @raises(FakeDeclarationError)
+    def test_undeclared_call(self):
+        Fake("db").recorded_calls("insert")
+
+    @raises(FakeDeclarationError)
+    def test_records_requires_a_call(self):
+        Fake("db").records()
+
+    def test_calls_are_recorded_before_they_fail(self):
+        db = Fake("db").provides("insert").with_args(1).records()
+        try:
+            db.insert(2)
+        except AssertionError, exc:
+            eq_(str(exc),
+                "fake:db.insert(1) was called unexpectedly with args (2); "
+                "Recorded calls (by reference): #1 (2), end")
+        else:
+            raise RuntimeError("expected AssertionError")
+        eq_(db.insert.recorded_calls(), [((2,), {})])
+
+    def test_verify_shows_recorded_calls(self):
+        db = Fake("db").expects("insert").times_called(2).records()
+        db.insert(1)
+        try:
+            fudge.verify()
+        except AssertionError, exc:
+            eq_(str(exc),
+                "fake:db.insert() was called 1 time(s). Expected 2.; "
+                "Recorded calls (by reference): #1 (1), end")
+        else:
+            raise RuntimeError("expected AssertionError")
+
+    def test_clear_calls_resets_recorded_calls(self):
+        db = Fake("db").provides("insert").records()
+        db.insert(1)
+        fudge.clear_calls()
+        eq_(db.insert.recorded_calls(), [])
+
+    def test_next_call_shares_recorded_calls(self):
+        db = Fake("db").provides("get").records().returns(1)
+        db = db.next_call().returns(2)
+        eq_(db.get("a"), 1)
+        eq_(db.get("b"), 2)
+        eq_(db.get.recorded_calls(), [(("a",), {}), (("b",), {})])
+
+    def test_records_after_next_call(self):
+        db = Fake("db").provides("get").returns(1).next_call().returns(2)
+        db = db.records()
+        db.get("a")
+        db.get("b")
+        eq_(db.get.recorded_calls(), [(("a",), {}), (("b",), {})])
+
+    def test_stack_end_shows_recorded_calls(self):
+        db = Fake("db").provides("get").records()
+        db = db.next_call()
+        db.get("a")
+        db.get("b")
+        try:
+            db.get("c")
+        except AssertionError, exc:
+            assert str(exc).endswith(
+                "Recorded calls (by reference): #1 ('a'), #2 ('b'), end"), str(exc)
+        else:
+            raise RuntimeError("expected AssertionError")
+
+    def test_clear_expectations_forgets_recorders(self):
+        Fake("db").provides("insert").records()
+        assert len(fudge.registry.get_recorders())
+        fudge.clear_expectations()
+        eq_(fudge.registry.get_recorders(), [])
+
+
+class TestCapture(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_reference(self):
+        h = CallHistory()
+        job = {'status': 'new'}
+        h.record((job,), {})
+        job['status'] = 'done'
+        eq_(h.entries(), [(({'status': 'done'},), {})])
+
+    def test_shallow(self):
+        h = CallHistory(capture='shallow')
+        job = {'status': 'new', 'tags': []}
+        h.record((job,), {'also': job})
+        job['status'] = 'done'
+        job['tags'].append('x')
+        eq_(h.entries(), [(({'status': 'new', 'tags': ['x']},),
+                           {'also': {'status': 'new', 'tags': ['x']}})])
+
+    def test_deep(self):
+        h = CallHistory(capture='deep')
+        job = {'tags': []}
+        h.record((job,), {'also': job})
+        job['tags'].append('x')
+        (args, kwargs), = h.entries()
+        eq_(args, ({'tags': []},))
+        # references between arguments are kept
+        assert args[0] is kwargs['also']
+
+    def test_not_copyable_is_kept_by_reference(self):
+        lock = thread.allocate_lock()
+        for capture in ('shallow', 'deep'):
+            h = CallHistory(capture=capture)
+            h.record((lock,), {})
+            assert h.entries()[0][0][0] is lock
+
+    def test_digest(self):
+        h = CallHistory(capture='digest')
+        h.record(('x' * 10000,), {'n': 1})
+        (args, kwargs), = h.entries()
+        eq_(args, (ArgDigest('x' * 10000),))
+        eq_(args[0].size, 10000)
+        eq_(kwargs, {'n': ArgDigest(1)})
+        eq_(kwargs['n'].size, None)
+        assert ArgDigest('x') != ArgDigest('y')
+
+    def test_digest_of_objects_is_by_content(self):
+        eq_(ArgDigest(Payload([1])), ArgDigest(Payload([1])))
+        payload = Payload([1])
+        before = ArgDigest(payload)
+        payload.items.append(2)
+        assert ArgDigest(payload) != before
+
+    def test_digest_of_containers(self):
+        eq_(ArgDigest({'a': 1, 'b': [2]}), ArgDigest({'b': [2], 'a': 1}))
+        assert ArgDigest([1, 2]) != ArgDigest((1, 2))
+        assert ArgDigest(['ab']) != ArgDigest(['a', 'b'])
+        recursive = [1]
+        recursive.append(recursive)
+        eq_(ArgDigest(recursive), ArgDigest(recursive))
+
+    def test_digest_of_arrays_covers_all_items(self):
+        a = array.array('d', range(10000))
+        b = array.array('d', range(10000))
+        b[5000] = -1
+        assert ArgDigest(a) != ArgDigest(b)
+        eq_(ArgDigest(a), ArgDigest(array.array('d', range(10000))))
+
+    def test_unstable_digest_of_what_cannot_be_pickled(self):
+        lock = thread.allocate_lock()
+        digest = ArgDigest(lock)
+        assert not digest.stable
+        assert repr(digest).startswith('<unstable digest '), repr(digest)
+        eq_(ArgDigest(lock), digest)
+        assert ArgDigest(thread.allocate_lock()) != digest
+        assert ArgDigest('abc').stable
+        h = CallHistory(capture='digest')
+        h.record((lock,), {})
+        eq_(h.entries(), [((digest,), {})])
+
+    def test_unknown_policy(self):
+        self.assertRaises(FakeDeclarationError, CallHistory, capture='nope')
+        self.assertRaises(FakeDeclarationError, Fake('db').captures, 'nope')
+
+    def test_describe_names_the_policy(self):
+        h = CallHistory(capture='digest')
+        h.record(('abc',), {})
+        eq_(h.describe(), "Recorded calls (digests): #1 (%r), end"
+                          % ArgDigest('abc'))
+
+    def test_per_fake_and_per_call(self):
+        job = ['new']
+        db = Fake('db').captures('deep')
+        db = db.provides('insert').records()
+        db = db.provides('update').records(capture='reference')
+        db.insert(job)
+        db.update(job)
+        job[0] = 'done'
+        eq_(db.insert.recorded_calls(), [((['new'],), {})])
+        eq_(db.update.recorded_calls(), [((['done'],), {})])
+
+
+class TestSampling(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_every(self):
+        h = CallHistory(maxlen=3, every=10)
+        for i in range(95):
+            h.record((i,), {})
+        eq_(h.calls_made, 95)
+        eq_(h.numbered_entries(),
+            [(71, (70,), {}), (81, (80,), {}), (91, (90,), {})])
+        eq_(h.first_number, 71)
+        eq_(h.get(81).args, (80,))
+        eq_(h.get(82), None)
+        eq_(h.get(61), None)
+        eq_(h.describe(), "Recorded calls (by reference, 1 in 10 of 95 "
+                          "calls): #71 (70), #81 (80), #91 (90), end")
+
+    def test_every_query(self):
+        h = CallHistory(every=2)
+        for name in ["a", "b", "a", "b", "a"]:
+            h.record((name,), {})
+        eq_([c.number for c in h.query().where(0, "a")], [1, 3, 5])
+        eq_(len(h.query().where(0, "b")), 0)
+        eq_([c.number for c in h.query().between(0, 2 ** 40)], [1, 3, 5])
+
+    def test_reservoir(self):
+        h = CallReservoir(size=10, seed=1)
+        for i in range(10000):
+            h.record((i,), {})
+        eq_(h.calls_made, 10000)
+        eq_(len(h), 10)
+        numbers = [n for n, args, kwargs in h.numbered_entries()]
+        eq_(numbers, sorted(numbers))
+        eq_([args for args, kwargs in h.entries()],
+            [(n - 1,) for n in numbers])
+        eq_(h.get(numbers[3]).args, (numbers[3] - 1,))
+        eq_(h.first_number, numbers[0])
+        # with this many calls, some are sampled late:
+        assert numbers[-1] > 5000, numbers
+
+    def test_reservoir_is_seeded(self):
+        samples = []
+        for run in range(2):
+            h = CallReservoir(size=5, seed=42)
+            for i in range(1000):
+                h.record((i,), {})
+            samples.append(h.entries())
+        eq_(samples[0], samples[1])
+
+    def test_reservoir_is_uniform(self):
+        hits = [0] * 10
+        for seed in range(500):
+            h = CallReservoir(size=2, seed=seed)
+            for i in range(10):
+                h.record((i,), {})
+            for args, kwargs in h.entries():
+                hits[args[0]] += 1
+        # each call is kept 100 times out of 500 on average
+        assert min(hits) > 60 and max(hits) < 140, hits
+
+    def test_reservoir_before_full(self):
+        h = CallReservoir(size=5)
+        h.record((1,), {})
+        h.record((2,), {})
+        eq_(h.entries(), [((1,), {}), ((2,), {})])
+        h.reset()
+        eq_(h.entries(), [])
+        eq_(h.first_number, None)
+
+    def test_reservoir_describe(self):
+        h = CallReservoir(size=2, seed=1)
+        eq_(h.describe(), None)
+        for i in range(3):
+            h.record((i,), {})
+        (n1, a1, k1), (n2, a2, k2) = h.numbered_entries()
+        eq_(h.describe(),
+            "Recorded calls (by reference, 2 sampled of 3 calls): "
+            "#%s %s, #%s %s, end" % (n1, fmt_args(a1, k1),
+                                     n2, fmt_args(a2, k2)))
+
+    @raises(FakeDeclarationError)
+    def test_reservoir_cannot_be_queried(self):
+        CallReservoir().query()
+
+    def test_samples(self):
+        feed = Fake('feed').samples(reservoir=3, seed=1)
+        feed = feed.provides('push').times_called(50).records()
+        for i in range(50):
+            feed.push(i)
+        eq_(len(feed.push.recorded_calls()), 3)
+        fudge.verify()
+
+    def test_samples_every(self):
+        feed = Fake('feed').samples(every=3).provides('push').records()
+        for i in range(7):
+            feed.push(i)
+        eq_(feed.push.recorded_calls(),
+            [((0,), {}), ((3,), {}), ((6,), {})])
+
+    def test_samples_in_errors(self):
+        feed = Fake('feed').samples(every=2)
+        feed = feed.provides('push').times_called(2).records()
+        feed.push(1)
+        feed.push(2)
+        try:
+            feed.push(3)
+        except AssertionError, exc:
+            assert str(exc).endswith(
+                "Recorded calls (by reference, 1 in 2 of 3 calls): "
+                "#1 (1), #3 (3), end"), str(exc)
+        else:
+            raise RuntimeError("expected AssertionError")
+
+    def test_bad_samples(self):
+        fake = Fake('feed')
+        self.assertRaises(FakeDeclarationError, fake.samples)
+        self.assertRaises(FakeDeclarationError, fake.samples,
+                          every=2, reservoir=2)
+        self.assertRaises(FakeDeclarationError, fake.samples,
+                          every=2, seed=1)
+        self.assertRaises(FakeDeclarationError, fake.samples, every=0)
+        self.assertRaises(FakeDeclarationError, fake.samples, reservoir=0)
+
+
+class TestArgColumns(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_columns(self):
+        c = ArgColumns(name=(0, str), value=1, count=('count', 'l'))
+        c.record(("latency", 0.5), {"count": 2})
+        c.record(("errors", 1.0), {})
+        c.record(("latency", 0.25), {"count": 3})
+        eq_(c.keys(), ["count", "name", "value"])
+        eq_(len(c), 3)
+        eq_(c["value"], array.array('d', [0.5, 1.0, 0.25]))
+        eq_(c["count"], array.array('l', [2, 0, 3]))
+        eq_(c["name"], array.array('l', [0, 1, 0]))
+        eq_(c.names("name"), ["latency", "errors"])
+
+    def test_missing_values(self):
+        c = ArgColumns(name=(0, str), value=1)
+        c.record((), {})
+        eq_(c["name"], array.array('l', [-1]))
+        value = c["value"][0]
+        assert value != value # NaN; math.isnan() is new in Python 2.6
+
+    def test_name_that_looks_like_missing(self):
+        c = ArgColumns(name=(0, str))
+        c.record((-1,), {})
+        eq_(c["name"], array.array('l', [0]))
+        eq_(c.names("name"), [-1])
+
+    def test_wrong_type_records_nothing(self):
+        c = ArgColumns(name=(0, str), value=1)
+        c.record(("latency", 0.5), {})
+        try:
+            c.record(("errors", "not a number"), {})
+        except AssertionError, exc:
+            assert "'not a number' in column 'value'" in str(exc), str(exc)
+        else:
+            raise RuntimeError("expected AssertionError")
+        eq_(len(c), 1)
+        eq_(c["name"], array.array('l', [0]))
+        eq_(c["value"], array.array('d', [0.5]))
+        eq_(c.names("name"), ["latency"])
+        c.record(("errors", 1.0), {})
+        eq_(c["name"], array.array('l', [0, 1]))
+        eq_(c.names("name"), ["latency", "errors"])
+
+    @raises(AssertionError)
+    def test_unhashable_name(self):
+        ArgColumns(name=(0, str)).record(([],), {})
+
+    def test_reset(self):
+        c = ArgColumns(value=0)
+        column = c["value"]
+        c.record((1.0,), {})
+        c.reset()
+        eq_(len(c), 0)
+        eq_(len(c["value"]), 0)
+        assert c["value"] is not column
+
+    @raises(FakeDeclarationError)
+    def test_unknown_typecode(self):
+        ArgColumns(value=(0, 'Z'))
+
+    @raises(FakeDeclarationError)
+    def test_no_columns(self):
+        ArgColumns()
+
+    def test_records_columns(self):
+        statsd = Fake("statsd").provides("gauge").records_columns(
+                                        name=(0, str), value=(1, 'd'))
+        for i in range(1000):
+            statsd.gauge("latency", float(i))
+        columns = statsd.gauge.recorded_columns()
+        eq_(len(columns), 1000)
+        eq_(columns["value"][999], 999.0)
+        eq_(columns.names("name"), ["latency"])
+        fudge.clear_calls()
+        eq_(len(statsd.gauge.recorded_columns()), 0)
+
+    def test_describe(self):
+        statsd = Fake("statsd").provides("gauge").with_args(
+                                "latency", 1.0).records_columns(value=1)
+        try:
+            statsd.gauge("errors", 2.0)
+        except AssertionError, exc:
+            assert str(exc).endswith(
+                "Recorded columns value of 1 call(s)"), str(exc)
+        else:
+            raise RuntimeError("expected AssertionError")
+
+
+class TestCallQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.history = CallHistory(maxlen=10)
+        for table, name in [("users", "Joe"), ("groups", "admins"),
+                            ("users", "Frank")]:
+            self.history.record((table,), {"name": name})
+
+    def numbers(self, query):
+        return [c.number for c in query]
+
+    def test_all(self):
+        eq_(self.numbers(self.history.query()), [1, 2, 3])
+
+    def test_where_position(self):
+        eq_(self.numbers(self.history.query().where(0, "users")), [1, 3])
+
+    def test_where_keyword(self):
+        eq_(self.numbers(self.history.query().where("name", "admins")), [2])
+
+    def test_where_nothing(self):
+        eq_(len(self.history.query().where("name", "Bob")), 0)
+        eq_(len(self.history.query().where(5, "users")), 0)
+
+    def test_chained(self):
+        q = self.history.query().where(0, "users").where("name", "Frank")
+        eq_(q.calls(), [RecordedCall(3, ("users",), {"name": "Frank"}, 0, 0)])
+
+    def test_inspector(self):
+        q = self.history.query().where("name", arg.endswith("k"))
+        eq_(self.numbers(q), [3])
+
+    def test_inspector_does_not_match_missing_args(self):
+        eq_(len(self.history.query().where(1, arg.any())), 0)
+
+    def test_index_is_reused_and_updated(self):
+        self.history.query().where(0, "users")
+        index = self.history._indexes[0]
+        self.history.record(("users",), {})
+        eq_(self.numbers(self.history.query().where(0, "users")), [1, 3, 4])
+        assert self.history._indexes[0] is index
+
+    def test_overwritten_calls_are_not_found(self):
+        q = self.history.query().where(0, "users")
+        for i in range(9):
+            self.history.record(("groups",), {})
+        eq_(self.numbers(q), [3])
+        eq_(self.numbers(self.history.query().where(0, "users")), [3])
+
+    def test_index_is_rebuilt_when_too_stale(self):
+        self.history.query().where(0, "users")
+        index = self.history._indexes[0]
+        for i in range(20):
+            self.history.record(("groups",), {})
+        eq_(len(self.history.query().where(0, "groups")), 10)
+        assert self.history._indexes[0] is not index
+
+    def test_unhashable_values(self):
+        self.history.record(([1],), {})
+        eq_(self.numbers(self.history.query().where(0, [1])), [4])
+        eq_(self.numbers(self.history.query().where(0, "users")), [1, 3])
+
+    def test_from_thread(self):
+        eq_(len(self.history.query().from_thread(thread.get_ident())), 3)
+        eq_(len(self.history.query().from_thread(-1)), 0)
+
+    def test_between(self):
+        h = CallHistory(maxlen=3)
+        for i in range(5):
+            h.record((i,), {})
+            h._entries[i % 3] = h._entries[i % 3][:2] + (float(i), 0)
+        eq_([c.args for c in h.query().between(2.0, 3.0)], [(2,), (3,)])
+        eq_([c.args for c in h.query().between(0.0, 10.0)],
+            [(2,), (3,), (4,)])
+        eq_(len(h.query().between(5.0, 10.0)), 0)
+
+    def test_get(self):
+        eq_(self.history.get(2).kwargs, {"name": "admins"})
+        eq_(self.history.get(4), None)
+        eq_(self.history.get(0), None)
+
+    def test_reset_forgets_indexes(self):
+        self.history.query().where(0, "users")
+        self.history.reset()
+        eq_(self.history._indexes, {})
+
+    def test_query_calls(self):
+        db = Fake("db").provides("insert").records()
+        db.insert("users")
+        eq_(len(db.insert.query_calls().where(0, "users")), 1)
+        fudge.clear_expectations()
+
+
+class TestArgCounter(unittest.TestCase):
+
+    def test_count_for(self):
+        c = ArgCounter()
+        for key in ["x", "y", "x"]:
+            c.record((key,), {})
+        c.record(("x",), {"fresh": True})
+        eq_(c.count_for("x"), 2)
+        eq_(c.count_for("y"), 1)
+        eq_(c.count_for("x", fresh=True), 1)
+        eq_(c.count_for("z"), 0)
+        eq_(len(c), 3)
+        eq_(c.calls_made, 4)
+
+    def test_unhashable_args(self):
+        c = ArgCounter()
+        c.record(([1, 2], {"a": [3]}), {"b": set([4])})
+        c.record(([1, 2], {"a": [3]}), {"b": set([4])})
+        c.record(((1, 2), {"a": [3]}), {"b": set([4])})
+        eq_(c.count_for([1, 2], {"a": [3]}, b=set([4])), 2)
+        eq_(c.count_for((1, 2), {"a": [3]}, b=set([4])), 1)
+        eq_(c.count_for([1, 2], {"a": [4]}, b=set([4])), 0)
+
+    def test_unhashable_objects_are_digested(self):
+        class Unhashable(object):
+            __hash__ = None
+            def __init__(self, value):
+                self.value = value
+            def __repr__(self):
+                return "Unhashable(%r)" % self.value
+        c = ArgCounter()
+        c.record((Unhashable(1),), {})
+        eq_(c.count_for(Unhashable(1)), 1)
+        eq_(c.count_for(Unhashable(2)), 0)
+
+    def test_unhashable_objects_are_digested_by_content(self):
+        c = ArgCounter()
+        c.record((Point(1),), {})
+        c.record((Point(1),), {})
+        eq_(c.count_for(Point(1)), 2)
+        eq_(c.count_for(Point(2)), 0)
+        c.record((array.array('d', [0.0] * 1000),), {})
+        c.record((array.array('d', [0.0] * 999 + [1.0]),), {})
+        eq_(len(c), 3)
+
+    def test_most_common(self):
+        c = ArgCounter()
+        for key in ["x", "y", "x"]:
+            c.record((key,), {})
+        eq_(c.most_common(), [(("x",), {}, 2), (("y",), {}, 1)])
+        eq_(c.most_common(1), [(("x",), {}, 2)])
+
+    def test_describe(self):
+        c = ArgCounter()
+        eq_(c.describe(), None)
+        for key in ["x", "y", "x"]:
+            c.record((key,), {})
+        eq_(c.describe(), "Counted calls: ('x') x2, ('y') x1")
+
+    def test_reset(self):
+        c = ArgCounter()
+        c.record(("x",), {})
+        c.reset()
+        eq_(c.count_for("x"), 0)
+        eq_(len(c), 0)
+
+    def test_records_counts(self):
+        cache = Fake("cache").provides("get").records_counts()
+        for i in range(1000):
+            cache.get(i % 10)
+        eq_(cache.get.count_for(3), 100)
+        fudge.clear_calls()
+        eq_(cache.get.count_for(3), 0)
+        fudge.clear_expectations()
+
+    @raises(FakeDeclarationError)
+    def test_not_counted(self):
+        cache = Fake("cache").provides("get").records()
+        cache.get.count_for(3)
+
+
+class TestArgSummary(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_exact_when_few_args(self):
+        s = ArgSummary(top=3)
+        for key in "abacab":
+            s.record((key,), {})
+        eq_(s.top(), [(("a",), {}, 3, 0), (("b",), {}, 2, 0),
+                      (("c",), {}, 1, 0)])
+        eq_(s.distinct(), 3)
+
+    def test_heavy_hitters_are_found(self):
+        s = ArgSummary(top=5)
+        for i in range(5000):
+            s.record((i,), {})
+            if i % 3 == 0:
+                s.record(("hot",), {})
+        args, kwargs, count, error = s.top(1)[0]
+        eq_(args, ("hot",))
+        assert count - error <= 1667 <= count, (count, error)
+        eq_(len(s._entries), 5)
+        # space-saving keeps the sum of counts equal to the calls made:
+        eq_(sum([e[0] for e in s._entries.values()]), s.calls_made)
+        eq_(s._min_count, min([e[0] for e in s._entries.values()]))
+
+    def test_distinct_estimate(self):
+        s = ArgSummary(precision=12)
+        for i in range(20000):
+            s.record((i,), {})
+            s.record((i,), {})
+        assert 18000 < s.distinct() < 22000, s.distinct()
+
+    def test_distinct_is_exact_until_args_are_evicted(self):
+        s = ArgSummary(top=1000)
+        for i in range(700):
+            s.record((i,), {})
+        eq_(s.distinct(), 700)
+
+    def test_unhashable_args(self):
+        s = ArgSummary()
+        s.record(([1],), {})
+        s.record(([1],), {})
+        eq_(s.top(), [(([1],), {}, 2, 0)])
+
+    def test_describe(self):
+        s = ArgSummary(top=1)
+        eq_(s.describe(), None)
+        for key in "aab":
+            s.record((key,), {})
+        eq_(s.describe(),
+            "Summary of 3 call(s) with about 2 distinct args: ('b') x1-3")
+
+    def test_reset(self):
+        s = ArgSummary()
+        s.record(("a",), {})
+        s.reset()
+        eq_(s.top(), [])
+        eq_(s.distinct(), 0)
+        eq_(s.calls_made, 0)
+
+    @raises(FakeDeclarationError)
+    def test_bad_top(self):
+        ArgSummary(top=0)
+
+    @raises(FakeDeclarationError)
+    def test_bad_precision(self):
+        ArgSummary(precision=30)
+
+    def test_verify(self):
+        cache = Fake("cache").provides("get").records_summary(max_per_args=2)
+        cache.get("x")
+        cache.get("x")
+        fudge.verify()
+
+    @raises(AssertionError)
+    def test_verify_fails(self):
+        cache = Fake("cache").provides("get").records_summary(max_per_args=2)
+        for i in range(3):
+            cache.get("x")
+        fudge.verify()
+
+    def test_summary_in_failure_messages(self):
+        cache = Fake("cache").provides("get").with_args("x").records_summary()
+        cache.get("x")
+        try:
+            cache.get("y")
+        except AssertionError, exc:
+            assert str(exc).endswith(
+                "Summary of 2 call(s) with about 2 distinct args: "
+                "('x') x1, ('y') x1") or str(exc).endswith(
+                "('y') x1, ('x') x1"), str(exc)
+        else:
+            raise RuntimeError("expected AssertionError")
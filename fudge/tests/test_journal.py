@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+import thread
+import unittest
+
+from nose.tools import eq_, raises
+
+import fudge
+from fudge import Fake
+from fudge.journal import CallJournal, JournalReader
+from fudge.util import b
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'calls.journal')
+
+    def tearDown(self):
+        fudge.clear_expectations()
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        reader = JournalReader(self.path)
+        try:
+            return [(r.sequence, r.fake_name, r.call_name, r.args, r.kwargs)
+                    for r in reader]
+        finally:
+            reader.close()
+
+    def test_empty(self):
+        CallJournal(self.path).close()
+        eq_(self.read(), [])
+
+    def test_records(self):
+        journal = CallJournal(self.path)
+        eq_(journal.append('db', 'insert', (1,), {'a': [2]}), 1)
+        eq_(journal.append('db', 'commit', (), {}), 2)
+        journal.close()
+        eq_(self.read(), [(1, 'db', 'insert', (1,), {'a': [2]}),
+                          (2, 'db', 'commit', (), {})])
+
+    def test_random_access(self):
+        journal = CallJournal(self.path)
+        for i in range(5):
+            journal.append('db', 'get', (i,), {})
+        journal.close()
+        reader = JournalReader(self.path)
+        eq_(len(reader), 5)
+        eq_(reader[3].args, (3,))
+        eq_(reader[-1].sequence, 5)
+        reader.close()
+
+    def test_record_fields(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (), {})
+        journal.close()
+        reader = JournalReader(self.path)
+        record = reader[0]
+        eq_(record.thread, thread.get_ident())
+        assert record.time > 0
+        eq_(repr(record), "<JournalRecord #1 db.get()>")
+        reader.close()
+
+    def test_not_picklable_args_are_kept_as_repr(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (thread.allocate_lock(),), {'n': 1})
+        journal.close()
+        reader = JournalReader(self.path)
+        record = reader[0]
+        eq_(record.args, None)
+        eq_(record.kwargs, None)
+        assert record.args_repr.startswith("(<"), record.args_repr
+        assert record.args_repr.endswith(", n=1)"), record.args_repr
+        reader.close()
+
+    def test_appending_continues_the_sequence(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (1,), {})
+        journal.close()
+        journal = CallJournal(self.path)
+        eq_(journal.append('db', 'get', (2,), {}), 2)
+        journal.close()
+        eq_([r[0] for r in self.read()], [1, 2])
+
+    def test_partial_record_is_ignored(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (1,), {})
+        journal.append('db', 'get', (2,), {})
+        journal.close()
+        size = os.path.getsize(self.path)
+        f = open(self.path, 'r+b')
+        f.truncate(size - 3)
+        f.close()
+        eq_(self.read(), [(1, 'db', 'get', (1,), {})])
+        # and is overwritten when appending:
+        journal = CallJournal(self.path)
+        eq_(journal.append('db', 'get', (3,), {}), 2)
+        journal.close()
+        eq_(self.read(), [(1, 'db', 'get', (1,), {}),
+                          (2, 'db', 'get', (3,), {})])
+
+    def test_zero_padded_tail_is_ignored(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (1,), {})
+        journal.close()
+        f = open(self.path, 'ab')
+        f.write(b('\0') * 100)
+        f.close()
+        eq_(self.read(), [(1, 'db', 'get', (1,), {})])
+        journal = CallJournal(self.path)
+        eq_(journal.append('db', 'get', (2,), {}), 2)
+        journal.close()
+        eq_(self.read(), [(1, 'db', 'get', (1,), {}),
+                          (2, 'db', 'get', (2,), {})])
+
+    def test_truncated_header_is_ignored(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (1,), {})
+        journal.close()
+        size = os.path.getsize(self.path)
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (2,), {})
+        journal.close()
+        f = open(self.path, 'r+b')
+        f.truncate(size + 10)
+        f.close()
+        eq_(self.read(), [(1, 'db', 'get', (1,), {})])
+
+    @raises(ValueError)
+    def test_not_a_journal(self):
+        f = open(self.path, 'wb')
+        f.write(b('something else'))
+        f.close()
+        JournalReader(self.path)
+
+    def test_where(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (1,), {})
+        journal.append('cache', 'get', (2,), {})
+        journal.append('db', 'put', (3,), {})
+        journal.close()
+        reader = JournalReader(self.path)
+        eq_([r.sequence for r in reader.where(fake_name='db')], [1, 3])
+        eq_([r.sequence for r in reader.where(call_name='get')], [1, 2])
+        eq_([r.sequence for r in reader.where(fake_name='db',
+                                              call_name='get')], [1])
+        eq_([r.sequence for r in reader.where(thread=thread.get_ident())],
+            [1, 2, 3])
+        reader.close()
+
+    def test_flush(self):
+        journal = CallJournal(self.path)
+        journal.append('db', 'get', (1,), {})
+        journal.flush()
+        eq_(len(self.read()), 1)
+        journal.close()
+
+    def test_records_journal(self):
+        journal = CallJournal(self.path)
+        db = Fake('db').expects('insert').records_journal(journal)
+        db = db.next_call().returns(2)
+        db = db.provides('commit').records_journal(journal)
+        db.insert('a')
+        db.commit()
+        eq_(db.insert('b'), 2)
+        journal.close()
+        eq_(self.read(), [(1, 'db', 'insert', ('a',), {}),
+                          (2, 'db', 'commit', (), {}),
+                          (3, 'db', 'insert', ('b',), {})])
+
+    def test_records_journal_callable(self):
+        journal = CallJournal(self.path)
+        send = Fake('send').is_callable().records_journal(journal)
+        send('hi')
+        journal.close()
+        eq_(self.read(), [(1, 'send', '', ('hi',), {})])
+
+    def test_errors_mention_the_journal(self):
+        journal = CallJournal(self.path)
+        db = Fake('db').provides('insert').times_called(1)
+        db = db.records_journal(journal)
+        db.insert(1)
+        try:
+            db.insert(2)
+        except AssertionError, exc:
+            assert str(exc).endswith(
+                "Journaled 2 call(s) to %s, last one is #2" % self.path), (
+                str(exc))
+        else:
+            raise RuntimeError("expected AssertionError")
+        journal.close()
+
+    def test_clear_calls_keeps_the_journal(self):
+        journal = CallJournal(self.path)
+        db = Fake('db').provides('insert').records_journal(journal)
+        db.insert(1)
+        fudge.clear_calls()
+        db.insert(2)
+        journal.close()
+        eq_([r[0] for r in self.read()], [1, 2])
@@ -1,5 +1,6 @@
 
 import thread
+import threading
 import sys
 import unittest
 import fudge
@@ -41,10 +42,10 @@ class TestRegistry(unittest.TestCase):
         self.reg.remember_expected_call_order(exp_order)
         
         exp()
-        eq_(exp_order._actual_calls, [exp])
+        eq_(exp_order._pointer, 1)
         
         self.reg.clear_calls()
-        eq_(exp_order._actual_calls, [], "call order calls were not reset by clear_calls()")
+        eq_(exp_order._pointer, 0, "call order calls were not reset by clear_calls()")
     
     def test_verify_resets_calls(self):
         exp = ExpectedCall(self.fake, 'callMe')
@@ -63,10 +64,10 @@ class TestRegistry(unittest.TestCase):
         self.reg.remember_expected_call_order(exp_order)
         
         exp()
-        eq_(exp_order._actual_calls, [exp])
+        eq_(exp_order._pointer, 1)
         
         self.reg.verify()
-        eq_(exp_order._actual_calls, [], "call order calls were not reset by verify()")
+        eq_(exp_order._pointer, 0, "call order calls were not reset by verify()")
     
     def test_global_verify(self):
         exp = ExpectedCall(self.fake, 'callMe')
@@ -94,6 +95,22 @@ class TestRegistry(unittest.TestCase):
         eq_(len(self.reg.get_expected_call_order().keys()), 0,
             "clear_expectations() should reset expected call order")
     
+    def test_recorders_of_other_threads_are_not_verified(self):
+        declared = []
+        def declare():
+            lock = fudge.Fake('lock').provides('acquire').provides('release')
+            fudge.expect_order(lock.acquire, lock.release)
+            declared.append(thread.get_ident())
+        worker = threading.Thread(target=declare)
+        worker.start()
+        worker.join()
+        try:
+            eq_(len(self.reg.recorders[declared[0]]), 1)
+            eq_(self.reg.get_recorders(), [])
+            fudge.verify()
+        finally:
+            del self.reg.recorders[declared[0]]
+
     def test_multithreading(self):
         if sys.platform.startswith('java'):
             raise SkipTest('this test is flaky in Jython')
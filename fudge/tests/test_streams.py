@@ -0,0 +1,164 @@
+import array
+import mmap
+import tempfile
+import unittest
+
+from nose.exc import SkipTest
+from nose.tools import eq_, raises
+
+import fudge
+from fudge import Fake
+from fudge.streams import ScriptedStream
+from fudge.util import b
+
+try:
+    bytearray
+except NameError:
+    bytearray = None # Python 2.5
+try:
+    memoryview
+except NameError:
+    memoryview = None # Python < 2.7
+
+def skip_without_bytearray():
+    if bytearray is None:
+        raise SkipTest('bytearray is new in Python 2.6')
+
+def skip_without_memoryview():
+    if memoryview is None:
+        raise SkipTest('memoryview is new in Python 2.7')
+
+class TestScriptedStream(unittest.TestCase):
+
+    def test_read(self):
+        stream = ScriptedStream(b('abcdef'))
+        eq_(stream.read(2), b('ab'))
+        eq_(stream.read(), b('cdef'))
+        eq_(stream.read(), b(''))
+        eq_(stream.position, 6)
+
+    def test_short_reads(self):
+        stream = ScriptedStream(b('abcdef'), chunks=[1, 0, 2])
+        eq_(stream.read(4), b('a'))
+        eq_(stream.read(4), b(''))
+        eq_(stream.read(4), b('bc'))
+        eq_(stream.read(4), b('def'))
+
+    @raises(IOError)
+    def test_errors(self):
+        stream = ScriptedStream(b('abcdef'), chunks=[2, IOError('reset')])
+        eq_(stream.read(), b('ab'))
+        stream.read()
+
+    def test_error_takes_a_read(self):
+        stream = ScriptedStream(b('abcdef'), chunks=[ValueError, 1])
+        self.assertRaises(ValueError, stream.read)
+        eq_(stream.read(), b('a'))
+        eq_(stream.position, 1)
+
+    def test_memoryview_is_read_as_bytes(self):
+        skip_without_memoryview()
+        stream = ScriptedStream(memoryview(b('ab\ncd')))
+        eq_(stream.readline(), b('ab\n'))
+        items = array.array('i', [1, 2])
+        try:
+            view = memoryview(items)
+        except TypeError:
+            raise SkipTest('arrays have no memoryview in Python 2')
+        size = items.itemsize * len(items)
+        stream = ScriptedStream(view)
+        eq_(len(stream.read(size // 2)), size // 2)
+        eq_(len(stream.read()), size // 2)
+
+    def test_readinto(self):
+        skip_without_bytearray()
+        stream = ScriptedStream(b('abcdef'), chunks=[4])
+        buffer = bytearray(3)
+        eq_(stream.readinto(buffer), 3)
+        eq_(buffer, bytearray(b('abc')))
+        eq_(stream.readinto(buffer), 3)
+        eq_(buffer, bytearray(b('def')))
+        eq_(stream.readinto(buffer), 0)
+
+    def test_readinto_short_read(self):
+        skip_without_memoryview()
+        stream = ScriptedStream(b('abcdef'), chunks=[2])
+        buffer = bytearray(b('xxxx'))
+        eq_(stream.readinto(memoryview(buffer)[1:]), 2)
+        eq_(buffer, bytearray(b('xabx')))
+
+    def test_readline(self):
+        stream = ScriptedStream(b('one\ntwo\nthree'), chunks=[2])
+        eq_(stream.readline(), b('on'))
+        eq_(stream.readline(), b('e\n'))
+        eq_(stream.readline(2), b('tw'))
+        eq_(stream.readline(), b('o\n'))
+        eq_(stream.readline(), b('three'))
+        eq_(stream.readline(), b(''))
+
+    def test_bytearray_can_grow(self):
+        skip_without_bytearray()
+        data = bytearray(b('ab'))
+        stream = ScriptedStream(data)
+        eq_(stream.read(), b('ab'))
+        data.extend(b('cd'))
+        eq_(stream.read(), b('cd'))
+
+    def test_mmap(self):
+        skip_without_bytearray()
+        f = tempfile.TemporaryFile()
+        f.write(b('line\nrest'))
+        f.flush()
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            stream = ScriptedStream(source)
+            eq_(stream.readline(), b('line\n'))
+            buffer = bytearray(4)
+            eq_(stream.readinto(buffer), 4)
+            eq_(buffer, bytearray(b('rest')))
+        finally:
+            source.close()
+            f.close()
+
+class TestReadsFrom(unittest.TestCase):
+
+    def tearDown(self):
+        fudge.clear_expectations()
+
+    def test_reads(self):
+        skip_without_bytearray()
+        sock = Fake('sock').reads_from(b('abc\ndef'), chunks=[2])
+        eq_(sock.read(), b('ab'))
+        eq_(sock.readline(), b('c\n'))
+        buffer = bytearray(10)
+        eq_(sock.readinto(buffer), 3)
+        eq_(buffer[:3], bytearray(b('def')))
+
+    def test_other_declarations(self):
+        sock = Fake('sock').provides('close').reads_from(b('abc'))
+        sock = sock.returns(True)
+        eq_(sock.close(), True)
+        eq_(sock.read(), b('abc'))
+
+    def test_lazy_fake(self):
+        session = Fake('session')
+        sock = session.provides('connect').returns_fake(lazy=True)
+        sock = sock.reads_from(b('abc'), chunks=[1])
+        assert isinstance(sock, fudge.LazyFake)
+        eq_(sock._fake, None)
+        conn = session.connect()
+        eq_(conn.read(), b('a'))
+        eq_(conn.read(), b('bc'))
+
+    def test_declared_again(self):
+        sock = Fake('sock').provides('read').returns(b('old'))
+        sock = sock.reads_from(b('first')).reads_from(b('second'))
+        eq_(sock.read(), b('second'))
+        eq_(sock.read(), b(''))
+        eq_(sock.read(), b(''))
+
+    def test_expected_reads(self):
+        sock = Fake('sock').reads_from(b('abc'))
+        sock = sock.next_call(for_method='read').raises(IOError)
+        eq_(sock.read(), b('abc'))
+        self.assertRaises(IOError, sock.read)
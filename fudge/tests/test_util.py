@@ -0,0 +1,74 @@
+import array
+import sys
+import unittest
+
+from nose.tools import eq_
+
+from fudge.util import BoundedRepr, fmt_val, fmt_dict_vals
+
+class TestBoundedRepr(unittest.TestCase):
+
+    def test_small_values_are_not_changed(self):
+        r = BoundedRepr(100)
+        values = ["abc", u"abc", (1,), (1, 2), [1, [2, 3]], {'a': [1]},
+                  set([1]), frozenset([1]), set(), array.array('i', [1, 2]),
+                  44, None, object]
+        try:
+            values.append(bytearray([97, 98, 99]))
+        except NameError:
+            pass # Python 2.5
+        for val in values:
+            eq_(r.repr(val), repr(val))
+
+    def test_long_str_is_cut(self):
+        eq_(BoundedRepr(5).repr("a" * 1000), "'aaaaa'")
+
+    def test_long_list_is_cut(self):
+        eq_(BoundedRepr(5).repr(range(1000)), "[0, 1]")
+
+    def test_long_nested_value_is_cut(self):
+        eq_(BoundedRepr(10).repr([("a" * 1000,)]), "[('aaaaaaaa',)]")
+
+    def test_long_dict_is_cut(self):
+        val = dict((i, "a" * 1000) for i in range(1000))
+        assert len(BoundedRepr(10).repr(val)) < 20
+
+    def test_dict_key_longer_than_the_limit(self):
+        val = {'a' * 20: 'b' * 100000}
+        eq_(BoundedRepr(10).repr(val), "{'aaaaaaaaa': ...}")
+        assert len(fmt_val({'a' * 60: 'b' * 100000})) <= 50
+
+    def test_long_array_is_cut(self):
+        eq_(BoundedRepr(5).repr(array.array('i', range(1000))),
+            "array('i', [0, 1, 2, 3, 4])")
+
+    def test_recursive_list(self):
+        val = [1]
+        val.append(val)
+        eq_(BoundedRepr(100).repr(val), repr(val))
+
+
+class TestFmtVal(unittest.TestCase):
+
+    def test_short(self):
+        eq_(fmt_val("abc"), "'abc'")
+
+    def test_shortened(self):
+        eq_(fmt_val("a" * 100), "'%s...'" % ("a" * 45))
+
+    def test_large_values_are_shortened_like_their_repr(self):
+        for val in ("a" * 10000, range(10000), tuple(range(10000)),
+                    {'key': "a" * 10000}):
+            full = repr(val)
+            eq_(fmt_val(val), full[:46] + "..." + full[-1])
+
+    def test_not_shortened(self):
+        val = "a" * 100
+        eq_(fmt_val(val, shorten=False), repr(val))
+
+    def test_not_shortened_is_still_bounded(self):
+        val = "a" * 100000
+        eq_(len(fmt_val(val, shorten=False)), 4096)
+
+    def test_fmt_dict_vals(self):
+        eq_(fmt_dict_vals({'a': "b" * 100}), ["a='%s...'" % ("b" * 45)])
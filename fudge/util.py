@@ -1,3 +1,5 @@
+import array
+import sys
 
 try:
     from functools import wraps
@@ -12,18 +14,132 @@ except ImportError:
             return new_f
         return wrap_with_f
 
+# b'' literals are new in Python 2.6:
+if sys.version_info >= (3,):
+    def b(s):
+        """Returns the bytes of the str *s*, like b'...' would."""
+        return s.encode('latin-1')
+else:
+    def b(s):
+        """Returns the bytes of the str *s*, like b'...' would."""
+        return s
+
+class BoundedRepr(object):
+    """Builds the repr of a value without building much more
+    than *limit* characters of it.
+
+    Like the reprlib module, handlers are looked up by type name.  When a
+    value is too long its repr is cut short but still ends with the
+    closing quote or bracket of the whole value.  Values of any other
+    type fall back to repr().
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def repr(self, val):
+        return self.repr1(val, self.limit, set())
+
+    def repr1(self, val, budget, active):
+        handler = getattr(self, 'repr_' + type(val).__name__, None)
+        if handler is None:
+            return repr(val)
+        return handler(val, budget, active)
+
+    def repr_str(self, val, budget, active):
+        if len(val) > budget:
+            val = val[:max(budget, 0)]
+        return repr(val)
+
+    repr_unicode = repr_bytes = repr_bytearray = repr_str
+
+    def repr_array(self, val, budget, active):
+        if not isinstance(val, array.array):
+            return repr(val)
+        return self.repr_str(val, budget, active)
+
+    def _repr_items(self, val, items, budget, active, left, right, repr_item):
+        if id(val) in active:
+            # recursive container:
+            return left + "..." + right
+        active.add(id(val))
+        try:
+            parts = [left]
+            written = len(left)
+            for item in items:
+                if written >= budget:
+                    break
+                if len(parts) > 1:
+                    parts.append(", ")
+                    written += 2
+                text = repr_item(item, budget - written, active)
+                parts.append(text)
+                written += len(text)
+            parts.append(right)
+            return "".join(parts)
+        finally:
+            active.discard(id(val))
+
+    def repr_list(self, val, budget, active):
+        return self._repr_items(val, val, budget, active, "[", "]", self.repr1)
+
+    def repr_tuple(self, val, budget, active):
+        if len(val) == 1:
+            right = ",)"
+        else:
+            right = ")"
+        return self._repr_items(val, val, budget, active, "(", right, self.repr1)
+
+    def repr_dict(self, val, budget, active):
+        def repr_pair(pair, budget, active):
+            key = self.repr1(pair[0], budget, active)
+            budget = budget - len(key) - 2
+            if budget <= 0:
+                # the key used up the budget
+                return "%s: ..." % key
+            return "%s: %s" % (key, self.repr1(pair[1], budget, active))
+        return self._repr_items(val, val.iteritems(), budget, active,
+                                "{", "}", repr_pair)
+
+    def repr_set(self, val, budget, active):
+        if not val:
+            return repr(val)
+        name = type(val).__name__
+        if sys.version_info >= (3,):
+            if name == 'set':
+                left, right = "{", "}"
+            else:
+                left, right = name + "({", "})"
+        else:
+            left, right = name + "([", "])"
+        return self._repr_items(val, val, budget, active, left, right, self.repr1)
+
+    repr_frozenset = repr_set
+
+MAX_LEN_SHORTENED = 50
+MAX_LEN = 4096 # even when not shortened
+
+_shortened_repr = BoundedRepr(MAX_LEN_SHORTENED + 1)
+_repr = BoundedRepr(MAX_LEN + 1)
+
 def fmt_val(val, shorten=True):
     """Format a value for inclusion in an 
     informative text string.
+
+    The repr of large values is never fully built, see
+    :class:`BoundedRepr`.
     """
-    val = repr(val)
-    max = 50
     if shorten:
-        if len(val) > max:
-            close = val[-1]
-            val = val[0:max-4] + "..."
-            if close in (">", "'", '"', ']', '}', ')'):
-                val = val + close
+        max = MAX_LEN_SHORTENED
+        val = _shortened_repr.repr(val)
+    else:
+        max = MAX_LEN
+        val = _repr.repr(val)
+    if len(val) > max:
+        close = val[-1]
+        val = val[0:max-4] + "..."
+        if close in (">", "'", '"', ']', '}', ')'):
+            val = val + close
     return val
 
 def fmt_dict_vals(dict_vals, shorten=True):
@@ -34,3 +150,39 @@ def fmt_dict_vals(dict_vals, shorten=True):
     if not items:
         return [fmt_val(None, shorten=shorten)]
     return ["%s=%s" % (k, fmt_val(v, shorten=shorten)) for k,v in items]
+
+def call_key(args, kwargs):
+    """Returns a key for a dict from the args and keyword args of a call.
+
+    Looking up the key raises TypeError if an arg is unhashable.
+    """
+    if kwargs:
+        return (args, frozenset(kwargs.items()))
+    return (args, None)
+
+def fmt_args(args, kwargs, shorten=True):
+    """Returns args and keyword args formatted like a call,
+    for inclusion in an informative text string.
+    """
+    parts = []
+    if args:
+        parts.extend([fmt_val(a, shorten=shorten) for a in args])
+    if kwargs:
+        parts.extend(fmt_dict_vals(kwargs, shorten=shorten))
+    if parts:
+        return "(%s)" % ", ".join(parts)
+    else:
+        return "()"
+
+def mmap_lines(m):
+    """Yields the lines of a memory-mapped file, with their line ends."""
+    start = 0
+    end = len(m)
+    while start < end:
+        stop = m.find(b('\n'), start)
+        if stop == -1:
+            stop = end
+        else:
+            stop += 1
+        yield m[start:stop]
+        start = stop